@@ -0,0 +1,139 @@
+"""
+A multi-step edit of a contact sent as separate requests and as one POST /api/batch, over a network
+with --rtt-ms of round trip time.
+
+The edit changes the first name, last name, email and phone of a contact and reads it back: five round trips
+one request at a time, one as a batch. The app runs in process on a temporary SQLite database, with LocalRedis,
+and every HTTP round trip is delayed by the round trip time, as a mobile client far from the server would see it.
+
+    python benchmarks/bench_batch.py --rtt-ms 0 20 100 --edits 50
+    python benchmarks/bench_batch.py --rtt-ms 50 --json
+"""
+import sys
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import httpx
+from sqlalchemy import create_engine
+
+from benchmarks.generate_data import generate
+from benchmarks.load_test import in_process_app
+from src.database.models import Base
+from src.services.auth import service_auth
+
+MODES = ('sequential', 'batch', 'atomic batch')
+
+
+class DelayedTransport(httpx.AsyncBaseTransport):
+    """
+    Adds a round trip time to every request sent through the wrapped transport.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, rtt: float):
+        self.transport = transport
+        self.rtt = rtt
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return await self.transport.handle_async_request(request)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def edit(contact_id: int, n: int) -> list:
+    return [
+        {'method': 'PATCH', 'path': f'/api/contacts/first_name/{contact_id}', 'body': {'first_name': f'edited{n}'}},
+        {'method': 'PATCH', 'path': f'/api/contacts/last_name/{contact_id}', 'body': {'last_name': f'edited{n}'}},
+        {'method': 'PATCH', 'path': f'/api/contacts/email/{contact_id}', 'body': {'email': f'edited{n}@example.com'}},
+        {'method': 'PATCH', 'path': f'/api/contacts/phone/{contact_id}', 'body': {'phone_number': f'+38050{n:07d}'}},
+        {'method': 'GET', 'path': f'/api/contacts/{contact_id}'},
+    ]
+
+
+async def run_edit(client: httpx.AsyncClient, mode: str, requests: list) -> int:
+    """
+    Send one edit and return the number of round trips it took.
+    """
+    if mode == 'sequential':
+        for item in requests:
+            response = await client.request(item['method'], item['path'], json=item.get('body'))
+            response.raise_for_status()
+        return len(requests)
+    response = await client.post('/api/batch', json={'requests': requests, 'atomic': mode == 'atomic batch'})
+    response.raise_for_status()
+    statuses = [item['status'] for item in response.json()['responses']]
+    if any(status >= 400 for status in statuses):
+        raise RuntimeError(f'batch failed: {statuses}')
+    return 1
+
+
+async def run(args) -> list:
+    workdir = tempfile.TemporaryDirectory(prefix='bench_batch_')
+    engine = create_engine(f'sqlite:///{workdir.name}/bench_batch.db', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    summary = generate(engine, 1, args.contacts, prefix='bench_batch', password_hash='x')
+    token = await service_auth.create_access_token({'sub': summary['users'][0]['email']})
+    app = in_process_app(engine)
+    results = []
+    try:
+        for rtt_ms in args.rtt_ms:
+            transport = DelayedTransport(httpx.ASGITransport(app=app), rtt_ms / 1000)
+            async with httpx.AsyncClient(transport=transport, base_url='http://bench',
+                                         headers={'Authorization': f'Bearer {token}'}) as client:
+                contact_id = (await client.get('/api/contacts/', params={'limit': 1})).json()[0]['id']
+                for mode in MODES:
+                    await run_edit(client, mode, edit(contact_id, 0))
+                    latencies = []
+                    round_trips = 0
+                    for n in range(args.edits):
+                        started = time.perf_counter()
+                        round_trips += await run_edit(client, mode, edit(contact_id, n))
+                        latencies.append(time.perf_counter() - started)
+                    results.append({
+                        'rtt_ms': rtt_ms,
+                        'mode': mode,
+                        'edits': args.edits,
+                        'round_trips_per_edit': round_trips / args.edits,
+                        'mean_ms': sum(latencies) / len(latencies) * 1000,
+                        'p50_ms': percentile(latencies, 0.5) * 1000,
+                        'p95_ms': percentile(latencies, 0.95) * 1000,
+                    })
+    finally:
+        engine.dispose()
+        workdir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rtt-ms', type=float, nargs='+', default=[0, 20, 100], help='round trip times to try')
+    parser.add_argument('--edits', type=int, default=30, help='edits measured per round trip time and mode')
+    parser.add_argument('--contacts', type=int, default=20, help='contacts of the generated user')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'rtt ms':>7} {'mode':<13} {'round trips':>12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for r in results:
+        print(f"{r['rtt_ms']:>7.0f} {r['mode']:<13} {r['round_trips_per_edit']:>12.0f} {r['mean_ms']:>9.2f} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Birthdays of the next days for every user: one query per user, as /api/contacts/birthdays runs it on a cache miss,
+against the daily digest job that computes them for all users with one query and stores them in Redis.
+
+For each --users count the script reports the time and SQL statements of both ways, and the latency of a request
+that finds the digest's page in the cache. The data lives in a temporary SQLite database, LocalRedis stands in
+for Redis, and --db-latency-ms adds a network round trip to every statement.
+
+    python benchmarks/bench_birthday_digest.py --users 100 1000 --contacts 50
+    python benchmarks/bench_birthday_digest.py --users 1000 --db-latency-ms 1 --json
+"""
+import sys
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.generate_data import generate
+from src.database.models import Base, User
+from src.repository import contacts as repository_contacts
+from src.services.birthdays import birthdays_page, run_digest
+from src.services.cache import service_cache
+from src.services.local_redis import LocalRedis
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def per_user(users: list, session) -> int:
+    contacts = 0
+    for user in users:
+        contacts += len(await repository_contacts.get_birthdays_rows(user, session))
+    return contacts
+
+
+async def cached_reads(users: list, today: date) -> list:
+    async def missing():
+        raise RuntimeError('the digest did not store the page')
+
+    latencies = []
+    for user in users:
+        started = time.perf_counter()
+        generation = await service_cache.get_generation(user.id)
+        await service_cache.read_through(user.id, generation, birthdays_page(today), missing)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(args) -> list:
+    results = []
+    service_cache.r_cashe = LocalRedis()
+    today = date.today()
+    for users_count in args.users:
+        workdir = tempfile.TemporaryDirectory(prefix='bench_birthday_digest_')
+        engine = create_engine(f'sqlite:///{workdir.name}/digest.db')
+        Base.metadata.create_all(engine)
+        generate(engine, users_count, args.contacts, prefix='digest', password_hash='x')
+        statements = 0
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count(*_):
+            nonlocal statements
+            statements += 1
+            if args.db_latency_ms:
+                time.sleep(args.db_latency_ms / 1000)
+
+        session = sessionmaker(bind=engine)()
+        try:
+            users = session.query(User).all()
+            statements = 0
+            started = time.perf_counter()
+            contacts = await per_user(users, session)
+            results.append({'users': users_count, 'mode': 'query per user', 'statements': statements,
+                            'contacts': contacts, 'total_ms': (time.perf_counter() - started) * 1000})
+
+            await service_cache.r_cashe.flushdb()
+            statements = 0
+            started = time.perf_counter()
+            summary = await run_digest(session, today)
+            results.append({'users': users_count, 'mode': 'digest job', 'statements': statements,
+                            'contacts': summary['contacts'], 'total_ms': (time.perf_counter() - started) * 1000})
+
+            statements = 0
+            latencies = await cached_reads(users, today)
+            results.append({'users': users_count, 'mode': 'cached reads', 'statements': statements,
+                            'contacts': summary['contacts'], 'total_ms': sum(latencies) * 1000,
+                            'p50_us': percentile(latencies, 0.5) * 1e6, 'p99_us': percentile(latencies, 0.99) * 1e6})
+        finally:
+            session.close()
+            engine.dispose()
+            workdir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[100, 1000], help='numbers of users to try')
+    parser.add_argument('--contacts', type=int, default=50, help='contacts of every user')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='added to every SQL statement')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'users':>6} {'mode':<15} {'statements':>11} {'contacts':>9} {'total ms':>10} {'p50 us':>8} {'p99 us':>8}")
+    for r in results:
+        print(f"{r['users']:>6} {r['mode']:<15} {r['statements']:>11} {r['contacts']:>9} {r['total_ms']:>10.1f} "
+              f"{r.get('p50_us', 0):>8.1f} {r.get('p99_us', 0):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
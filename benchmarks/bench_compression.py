@@ -0,0 +1,123 @@
+"""
+Bytes on the wire and CPU cost of compressing contact list responses with gzip and brotli
+at different levels, plus the overhead of CompressionMiddleware on a streamed response.
+
+    python benchmarks/bench_compression.py --sizes 10 100 1000 10000
+"""
+import sys
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from src.middleware import compression
+from src.middleware.compression import CompressionMiddleware
+from src.services.serializers import dump_rows
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 11)
+LOOP = asyncio.new_event_loop()
+
+
+def contacts_page(size: int) -> bytes:
+    rows = [
+        (i, f'first{i:05d}', f'last{i:05d}', f'contact{i}@example.com', '+380000000000',
+         date(1990, 1, 1) + timedelta(days=i % 10000), 'some additional info, not required')
+        for i in range(1, size + 1)
+    ]
+    return dump_rows(rows)
+
+
+def measure(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def encoders():
+    for level in GZIP_LEVELS:
+        yield f'gzip-{level}', lambda level=level: compression.GzipEncoder(level)
+    if compression.brotli is not None:
+        for quality in BROTLI_QUALITIES:
+            yield f'br-{quality}', lambda quality=quality: compression.BrotliEncoder(quality)
+
+
+def through_middleware(body: bytes, chunk_size: int, encoding: str) -> int:
+    """
+    Stream body through CompressionMiddleware in chunks and return the number of bytes sent.
+    """
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+        for i in range(0, len(body), chunk_size):
+            await send({'type': 'http.response.body', 'body': body[i:i + chunk_size],
+                        'more_body': i + chunk_size < len(body)})
+
+    sent = 0
+
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get('body', b''))
+
+    scope = {'type': 'http', 'headers': [(b'accept-encoding', encoding.encode())]}
+    LOOP.run_until_complete(CompressionMiddleware(app, minimum_size=1024)(scope, None, send))
+    return sent
+
+
+def run(sizes, repeat: int, chunk_size: int) -> list:
+    results = []
+    for size in sizes:
+        body = contacts_page(size)
+        for name, make_encoder in encoders():
+            compressed = make_encoder().finish(body)
+            results.append({
+                'page_size': size,
+                'codec': name,
+                'raw_bytes': len(body),
+                'wire_bytes': len(compressed),
+                'ratio': len(body) / len(compressed),
+                'compress_ms': measure(lambda: make_encoder().finish(body), repeat) * 1000,
+            })
+        for encoding in ('gzip', 'br') if compression.brotli is not None else ('gzip',):
+            wire_bytes = through_middleware(body, chunk_size, encoding)
+            results.append({
+                'page_size': size,
+                'codec': f'middleware-{encoding}-stream',
+                'raw_bytes': len(body),
+                'wire_bytes': wire_bytes,
+                'ratio': len(body) / wire_bytes,
+                'compress_ms': measure(lambda: through_middleware(body, chunk_size, encoding), repeat) * 1000,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=4096, help='chunk size of the streamed response')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.chunk_size)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    if compression.brotli is None:
+        print('brotli is not installed, only gzip is measured')
+    print(f"{'page':>6} {'codec':<24} {'raw bytes':>10} {'wire bytes':>11} {'ratio':>6} {'ms':>8}")
+    for r in results:
+        print(f"{r['page_size']:>6} {r['codec']:<24} {r['raw_bytes']:>10} {r['wire_bytes']:>11} "
+              f"{r['ratio']:>6.1f} {r['compress_ms']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Peak memory allocated by the contact read paths for different result sizes, measured with tracemalloc:
+a page of contacts as ORM objects and as rows, and the birthdays of the week, which loads all contacts of a user.
+
+    python benchmarks/bench_memory.py --sizes 1000 10000 --max-peak-mb 50
+
+With --max-peak-mb the script exits with status 1 when any measurement goes over the limit, so it can run in CI.
+"""
+import sys
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from datetime import date, timedelta
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_serialization import seed, encode_default
+from src.database.models import Base, Contact
+from src.repository import contacts as repository_contacts
+from src.services.memory import rss_bytes
+from src.services.serializers import dump_rows
+
+LOOP = asyncio.new_event_loop()
+
+
+def peak_allocated(func) -> int:
+    """
+    Run func with tracemalloc tracing and return the highest number of bytes it had allocated at once.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes) -> list:
+    results = []
+    for size in sizes:
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        # the repository only reads user.id; a detached User would try to refresh itself after expunge_all
+        user = SimpleNamespace(id=seed(session, size).id)
+        # get_birthdays cannot move 29 February to a year that is not a leap year
+        leap_days = [date(year, 2, 29) for year in range(1990, 2030) if year % 4 == 0]
+        for contact in session.query(Contact).filter(Contact.birth_date.in_(leap_days)):
+            contact.birth_date -= timedelta(days=1)
+        session.commit()
+        paths = {
+            'contacts_orm': lambda: encode_default(
+                LOOP.run_until_complete(repository_contacts.get_contacts(user, 0, size, session))),
+            'contacts_rows': lambda: dump_rows(
+                LOOP.run_until_complete(repository_contacts.get_contacts_rows(user, 0, size, session))),
+            'birthdays_orm': lambda: encode_default(
+                LOOP.run_until_complete(repository_contacts.get_birthdays(user, session))),
+            'birthdays_rows': lambda: dump_rows(
+                LOOP.run_until_complete(repository_contacts.get_birthdays_rows(user, session))),
+        }
+        for name, func in paths.items():
+            session.expunge_all()
+            func()  # warm up caches of compiled statements
+            session.expunge_all()
+            peak = peak_allocated(func)
+            results.append({'contacts': size, 'path': name, 'peak_bytes': peak, 'peak_bytes_per_contact': peak / size})
+        session.close()
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--max-peak-mb', type=float, help='fail when a path allocates more than this at its peak')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes)
+    if args.json:
+        print(json.dumps({'rss_bytes': rss_bytes(), 'results': results}, indent=2))
+    else:
+        print(f"{'contacts':>9} {'path':<16} {'peak MB':>9} {'bytes/contact':>14}")
+        for r in results:
+            print(f"{r['contacts']:>9} {r['path']:<16} {r['peak_bytes'] / 2 ** 20:>9.2f} "
+                  f"{r['peak_bytes_per_contact']:>14.0f}")
+        print(f'RSS after the run: {rss_bytes() / 2 ** 20:.1f} MB')
+    if args.max_peak_mb is not None:
+        over = [r for r in results if r['peak_bytes'] > args.max_peak_mb * 2 ** 20]
+        for r in over:
+            print(f"{r['path']} with {r['contacts']} contacts peaked at {r['peak_bytes'] / 2 ** 20:.2f} MB, "
+                  f"over the limit of {args.max_peak_mb} MB", file=sys.stderr)
+        sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
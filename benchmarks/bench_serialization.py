@@ -0,0 +1,119 @@
+"""
+Serialization cost of a page of contacts: the default path (ORM objects validated through
+ContactResponce and encoded with the stdlib json encoder) against the fast path
+(rows fetched as tuples and encoded straight to bytes with orjson).
+
+    python benchmarks/bench_serialization.py --sizes 10 100 1000
+"""
+import sys
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from typing import List
+
+from src.database.models import Base, Contact, User
+from src.repository.contacts import contact_columns
+from src.schemas.contacts import ContactResponce
+from src.services.serializers import dump_rows
+
+RESPONSE_FIELD = create_response_field(name='response', type_=List[ContactResponce])
+LOOP = asyncio.new_event_loop()
+
+
+def seed(session, count: int) -> User:
+    user = User(username='benchmark', email='benchmark@example.com', password='x', confirmed=True)
+    session.add(user)
+    session.flush()
+    session.add_all(
+        Contact(
+            first_name=f'first{i:05d}',
+            last_name=f'last{i:05d}',
+            email=f'contact{i}@example.com',
+            phone_number='+380000000000',
+            birth_date=date(1990, 1, 1) + timedelta(days=i),
+            description='some additional info, not required ' * 4,
+            user_id=user.id,
+        )
+        for i in range(count)
+    )
+    session.commit()
+    return user
+
+
+def encode_default(contacts, response_class=JSONResponse) -> bytes:
+    content = LOOP.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=contacts))
+    return response_class(content).body
+
+
+def measure(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, repeat: int) -> list:
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    user_id = seed(session, max(sizes)).id
+    columns = contact_columns()
+    results = []
+    for size in sizes:
+        def fetch_orm():
+            session.expunge_all()
+            return session.query(Contact).filter(Contact.user_id == user_id).limit(size).all()
+
+        def fetch_rows():
+            return session.query(*columns).filter(Contact.user_id == user_id).limit(size).all()
+
+        contacts = fetch_orm()
+        rows = fetch_rows()
+        assert json.loads(encode_default(contacts)) == json.loads(dump_rows(rows))
+        results.append({
+            'page_size': size,
+            'serialize_json_ms': measure(lambda: encode_default(contacts), repeat) * 1000,
+            'serialize_orjson_ms': measure(lambda: encode_default(contacts, ORJSONResponse), repeat) * 1000,
+            'serialize_rows_ms': measure(lambda: dump_rows(rows), repeat) * 1000,
+            'fetch_and_serialize_json_ms': measure(lambda: encode_default(fetch_orm()), repeat) * 1000,
+            'fetch_and_serialize_rows_ms': measure(lambda: dump_rows(fetch_rows()), repeat) * 1000,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'page':>6} {'json ms':>9} {'orjson ms':>10} {'rows ms':>9} {'speedup':>8} "
+          f"{'fetch+json ms':>14} {'fetch+rows ms':>14} {'speedup':>8}")
+    for r in results:
+        print(f"{r['page_size']:>6} {r['serialize_json_ms']:>9.3f} {r['serialize_orjson_ms']:>10.3f} "
+              f"{r['serialize_rows_ms']:>9.3f} {r['serialize_json_ms'] / r['serialize_rows_ms']:>7.1f}x "
+              f"{r['fetch_and_serialize_json_ms']:>14.3f} {r['fetch_and_serialize_rows_ms']:>14.3f} "
+              f"{r['fetch_and_serialize_json_ms'] / r['fetch_and_serialize_rows_ms']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Cache stampede on the current user lookup of get_current_user, with and without single-flight
+coalescing and probabilistic early refresh.
+
+burst:  the user's cache entry is missing and --concurrency requests arrive at once, as when a dashboard
+        opens many requests right after the entry expired. Reports how many database reads they caused.
+steady: --concurrency clients call get_current_user back to back for --duration seconds while the entry
+        expires every --ttl seconds. Reports how many requests found no entry and had to wait for the database,
+        and how many refreshed the entry before it expired.
+
+    python benchmarks/bench_stampede.py --concurrency 200 --db-latency-ms 5
+    python benchmarks/bench_stampede.py --scenarios steady --duration 5 --ttl 1 --json
+
+The users live in a temporary SQLite database; --db-latency-ms adds a network round trip to every read,
+since a database on another host is where a stampede hurts. LocalRedis stands in for Redis unless --redis-url is given.
+"""
+import sys
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.generate_data import generate
+from src.conf.config import settings
+from src.database.models import Base
+from src.repository import users as repository_users
+from src.services.auth import Auth
+from src.services.local_redis import LocalRedis
+from src.services.metrics import USER_CACHE
+from src.services.singleflight import CACHE_EARLY_REFRESH, SingleFlight
+
+MODES = {
+    'cache-aside': {'cache_single_flight': False, 'cache_early_refresh_beta': 0.0},
+    'single-flight': {'cache_single_flight': True, 'cache_early_refresh_beta': 0.0},
+    'single-flight+xfetch': {'cache_single_flight': True, 'cache_early_refresh_beta': 1.0},
+}
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Counters:
+    def __init__(self):
+        self.misses = USER_CACHE.labels('miss').get()
+        self.early = CACHE_EARLY_REFRESH.labels('user').get()
+
+    def since(self) -> dict:
+        return {'misses': int(USER_CACHE.labels('miss').get() - self.misses),
+                'early_refreshes': int(CACHE_EARLY_REFRESH.labels('user').get() - self.early)}
+
+
+async def burst(auth: Auth, token: str, session, concurrency: int) -> list:
+    await auth.r_cashe.flushdb()
+
+    async def request():
+        started = time.perf_counter()
+        await auth.get_current_user(token, session)
+        return time.perf_counter() - started
+
+    return await asyncio.gather(*(request() for _ in range(concurrency)))
+
+
+async def steady(auth: Auth, token: str, session, concurrency: int, duration: float) -> list:
+    await auth.r_cashe.flushdb()
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await auth.get_current_user(token, session)
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+async def run(args) -> list:
+    workdir = tempfile.TemporaryDirectory(prefix='bench_stampede_')
+    engine = create_engine(f'sqlite:///{workdir.name}/stampede.db', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    email = generate(engine, 1, 0, prefix='stampede')['users'][0]['email']
+    session = sessionmaker(bind=engine)()
+    auth = Auth()
+    if args.redis_url:
+        import redis.asyncio as redis
+
+        auth.r_cashe = redis.Redis.from_url(args.redis_url)
+    else:
+        auth.r_cashe = LocalRedis()
+    token = await auth.create_access_token({'sub': email})
+    reads = 0
+    get_user_by_email = repository_users.get_user_by_email
+
+    async def slow_get_user_by_email(email, db):
+        nonlocal reads
+        reads += 1
+        if args.db_latency_ms:
+            await asyncio.sleep(args.db_latency_ms / 1000)
+        return await get_user_by_email(email, db)
+
+    results = []
+    try:
+        with patch.object(repository_users, 'get_user_by_email', slow_get_user_by_email), \
+                patch.object(settings, 'user_cache_ttl', args.ttl):
+            for scenario in args.scenarios:
+                for mode, options in MODES.items():
+                    auth.user_loads = SingleFlight('user')
+                    with patch.multiple(settings, **options):
+                        reads = 0
+                        counters = Counters()
+                        started = time.perf_counter()
+                        if scenario == 'burst':
+                            latencies = await burst(auth, token, session, args.concurrency)
+                        else:
+                            latencies = await steady(auth, token, session, args.concurrency, args.duration)
+                        elapsed = time.perf_counter() - started
+                    results.append({
+                        'scenario': scenario,
+                        'mode': mode,
+                        'requests': len(latencies),
+                        'db_reads': reads,
+                        **counters.since(),
+                        'wall_ms': elapsed * 1000,
+                        'p50_ms': percentile(latencies, 0.5) * 1000,
+                        'p99_ms': percentile(latencies, 0.99) * 1000,
+                        'max_ms': max(latencies) * 1000,
+                    })
+    finally:
+        session.close()
+        engine.dispose()
+        workdir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=['burst', 'steady'], default=['burst', 'steady'])
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight at once')
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help='added to every database read')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds the steady scenario runs')
+    parser.add_argument('--ttl', type=int, default=1, help='seconds the user stays cached')
+    parser.add_argument('--redis-url', help='use this Redis server instead of LocalRedis')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<8} {'mode':<22} {'requests':>9} {'db reads':>9} {'misses':>7} {'early':>6} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results:
+        print(f"{r['scenario']:<8} {r['mode']:<22} {r['requests']:>9} {r['db_reads']:>9} {r['misses']:>7} "
+              f"{r['early_refreshes']:>6} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
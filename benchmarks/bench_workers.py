@@ -0,0 +1,193 @@
+"""
+Throughput of the application served by serve.py with an increasing number of workers.
+
+For every worker count a server is started on a temporary SQLite database, loaded for a fixed time
+by several client processes, then stopped. The report shows requests per second, latency percentiles
+and the speedup over the first worker count.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --duration 10
+    python benchmarks/bench_workers.py --authenticated --contacts 200 --json
+
+By default only GET / is requested, which needs neither Redis nor data. With --authenticated a user
+with --contacts contacts is generated and GET /api/contacts/ is requested with its access token too;
+that route reads the current user through Redis, so a Redis server must be running.
+Load generation needs CPU as well: keep --clients plus the largest worker count at most the number of CPUs,
+or run the clients on another machine against --base-url (one worker count only).
+"""
+import sys
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import httpx
+from sqlalchemy import create_engine
+
+from benchmarks.generate_data import generate
+from src.database.models import Base
+from src.services.workers import cpu_count
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def start_server(workers: int, port: int, server: str, database_url: str, timeout: float = 60.0) -> subprocess.Popen:
+    env = dict(os.environ, SQLALCHEMY_SQLITE_DATABASE_URL=database_url, METRICS_ENABLED='false')
+    process = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(workers), '--port', str(port),
+                                '--server', server], cwd=path_root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'serve.py exited with status {process.returncode}')
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/live', timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'serve.py did not answer within {timeout:.0f} s')
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def load(base_url: str, requests: list, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient, offset: int):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            path, headers = requests[i % len(requests)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+    return {'latencies': latencies, 'errors': errors}
+
+
+def client_process(base_url: str, requests: list, concurrency: int, duration: float) -> dict:
+    return asyncio.run(load(base_url, requests, concurrency, duration))
+
+
+def measure(base_url: str, requests: list, clients: int, concurrency: int, duration: float) -> dict:
+    """
+    Load base_url from several processes at once, so the client is not the bottleneck of a single event loop.
+    """
+    per_client = max(1, concurrency // clients)
+    with ProcessPoolExecutor(clients) as pool:
+        results = list(pool.map(client_process, [base_url] * clients, [requests] * clients,
+                                [per_client] * clients, [duration] * clients))
+    latencies = [latency for result in results for latency in result['latencies']]
+    return {
+        'requests': len(latencies),
+        'errors': sum(result['errors'] for result in results),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def prepare(database_url: str, authenticated: bool, contacts: int) -> list:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    requests = [('/', {})]
+    if authenticated:
+        from src.services.auth import service_auth
+
+        user = generate(engine, 1, contacts, prefix='bench_workers')['users'][0]
+        token = asyncio.run(service_auth.create_access_token({'sub': user['email']}))
+        requests.append(('/api/contacts/', {'Authorization': f'Bearer {token}'}))
+    engine.dispose()
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per worker count')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of load before measuring')
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight, over all clients')
+    parser.add_argument('--clients', type=int, default=max(1, cpu_count() // 2), help='load generating processes')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'uvicorn'], default='auto')
+    parser.add_argument('--base-url', help='load a running server instead of starting serve.py')
+    parser.add_argument('--authenticated', action='store_true', help='also request the contact list, needs Redis')
+    parser.add_argument('--contacts', type=int, default=100, help='contacts of the generated user')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory(prefix='bench_workers_')
+    database_url = f'sqlite:///{workdir.name}/bench_workers.db'
+    requests = prepare(database_url, args.authenticated, args.contacts)
+    results = []
+    try:
+        for workers in [None] if args.base_url else args.workers:
+            port = free_port()
+            process = None if args.base_url else start_server(workers, port, args.server, database_url)
+            base_url = args.base_url or f'http://127.0.0.1:{port}'
+            try:
+                measure(base_url, requests, args.clients, args.concurrency, args.warmup)
+                result = {'workers': workers, **measure(base_url, requests, args.clients, args.concurrency,
+                                                        args.duration)}
+            finally:
+                if process is not None:
+                    stop_server(process)
+            result['speedup'] = result['rps'] / results[0]['rps'] if results and results[0]['rps'] else 1.0
+            results.append(result)
+            if not args.json:
+                if len(results) == 1:
+                    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'errors':>7}")
+                print(f"{str(workers or '-'):>7} {result['rps']:>9.0f} {result['speedup']:>7.2f}x "
+                      f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                      f"{result['errors']:>7}")
+    finally:
+        workdir.cleanup()
+    if args.json:
+        print(json.dumps({'cpus': cpu_count(), 'clients': args.clients, 'concurrency': args.concurrency,
+                          'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Cold start profile of the application: how long importing each module takes, measured with
+python -X importtime in fresh interpreters, and with --lifespan, how long each resource takes to initialise.
+
+    python benchmarks/startup_profile.py --top 25
+    python benchmarks/startup_profile.py --runs 5 --lifespan --json
+
+It also lists the optional subsystems (email, avatar upload, rate limiting, the dev server) that should stay
+unloaded until they are used, and exits with status 1 with --check when one of them is loaded at import.
+"""
+import sys
+import argparse
+import json
+import re
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+
+# modules only the routes that use them should load, on their first request
+LAZY_MODULES = ('fastapi_mail', 'cloudinary', 'PIL', 'fastapi_limiter', 'uvicorn', 'jinja2')
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+LIFESPAN_SNIPPET = '''
+import asyncio, json, sys, time
+started = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+from src.services.lifespan import app_state, startup, shutdown
+asyncio.run(startup(target.app))
+initialised = time.perf_counter()
+asyncio.run(shutdown(target.app))
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'startup_ms': (initialised - imported) * 1000,
+                  'checks': app_state.checks, 'timings_ms': app_state.timings}}))
+'''
+
+
+def import_times(module: str) -> tuple:
+    """
+    Import module in a fresh interpreter with -X importtime. Return the self and cumulative time
+    in microseconds of every module it imported, and the modules loaded at the end.
+    """
+    code = f'import sys, json, {module}; print(json.dumps(sorted(sys.modules)))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=path_root,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            times[name] = {'self_us': int(self_us), 'cumulative_us': int(cumulative_us), 'depth': len(indent) // 2}
+    return times, json.loads(result.stdout.splitlines()[-1])
+
+
+def best_of(module: str, runs: int) -> tuple:
+    """
+    The fastest of several runs for every module, which leaves out most of the noise of disk caches.
+    """
+    best = {}
+    loaded = []
+    for _ in range(runs):
+        times, loaded = import_times(module)
+        for name, entry in times.items():
+            if name not in best or entry['cumulative_us'] < best[name]['cumulative_us']:
+                best[name] = entry
+    return best, loaded
+
+
+def by_package(times: dict) -> dict:
+    packages = defaultdict(int)
+    for name, entry in times.items():
+        packages[name.split('.')[0]] += entry['self_us']
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def lifespan_times(module: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', LIFESPAN_SNIPPET.format(module=module)], cwd=path_root,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='main', help='module to import')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters to take the best time from')
+    parser.add_argument('--top', type=int, default=20, help='modules and packages to list')
+    parser.add_argument('--lifespan', action='store_true',
+                        help='also run the lifespan startup; connects to the configured database and Redis')
+    parser.add_argument('--check', action='store_true', help='fail when a lazy subsystem is loaded at import')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    times, loaded = best_of(args.module, args.runs)
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    report = {
+        'module': args.module,
+        'import_ms': times[args.module]['cumulative_us'] / 1000 if args.module in times else None,
+        'modules_loaded': len(loaded),
+        'slowest_modules': sorted(({'module': name, **entry} for name, entry in times.items()),
+                                  key=lambda entry: entry['self_us'], reverse=True)[:args.top],
+        'packages': dict(list(by_package(times).items())[:args.top]),
+        'application_modules': {name: entry for name, entry in times.items()
+                                if name.split('.')[0] in ('src', args.module)},
+        'lazy_modules_loaded': eager,
+    }
+    if args.lifespan:
+        report['lifespan'] = lifespan_times(args.module)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['import_ms']:.1f} ms, {report['modules_loaded']} modules loaded")
+        print(f"\n{'package':<30} {'self ms':>9}")
+        for name, self_us in report['packages'].items():
+            print(f'{name:<30} {self_us / 1000:>9.1f}')
+        print(f"\n{'module':<45} {'self ms':>9} {'cumulative ms':>14}")
+        for entry in report['slowest_modules']:
+            print(f"{entry['module']:<45} {entry['self_us'] / 1000:>9.1f} {entry['cumulative_us'] / 1000:>14.1f}")
+        print(f"\n{'application module':<45} {'self ms':>9} {'cumulative ms':>14}")
+        for name, entry in report['application_modules'].items():
+            print(f"{name:<45} {entry['self_us'] / 1000:>9.1f} {entry['cumulative_us'] / 1000:>14.1f}")
+        print(f"\nlazy subsystems loaded at import: {', '.join(eager) or 'none'}")
+        if args.lifespan:
+            lifespan = report['lifespan']
+            print(f"\nlifespan startup: {lifespan['startup_ms']:.1f} ms")
+            for name, ms in lifespan['timings_ms'].items():
+                print(f"  {name:<15} {ms:>9.1f} ms  {'ok' if lifespan['checks'][name] else 'NOT AVAILABLE'}")
+    if args.check and eager:
+        print(f"{', '.join(eager)} should not be imported by {args.module}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
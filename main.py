@@ -1,16 +1,28 @@
-import uvicorn
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
-import redis.asyncio as redis
-from src.routes import contacts, auth, users
+from src.routes import contacts, auth, users, metrics, admin, health, batch
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.metrics import MetricsMiddleware
+from src.middleware.queries import QueryStatsMiddleware
+from src.middleware.profiling import ProfilingMiddleware
+from src.middleware.memory import MemoryMiddleware
+from src.middleware.inflight import InFlightMiddleware
+from src.middleware.idempotency import IdempotencyMiddleware
+from src.services.lifespan import lifespan
+from src.services.profiles import profile_store
+from src.conf.config import settings
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # create route so i don't need to add contacts/... everytime to my routes functions
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(admin.router, prefix='/api')
+app.include_router(batch.router, prefix='/api')
+app.include_router(health.router)
+if settings.metrics_enabled:
+    app.include_router(metrics.router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,16 +32,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# @app.on_event("startup")
-# async def startup() -> None:
-#     """
-#     The startup function is called when the application starts up.
-#     It's a good place to initialize things that are needed by your app, like database connections or caches.
-    
-#     :return: None
-#     """
-#     r = redis.Redis(host='localhost', port=6379, db=0, encoding='utf-8', decode_responses=True)
-#     await FastAPILimiter.init(r)
+# inside compression, so a replayed response is encoded for the client that retries, not the one that sent it first
+if settings.idempotency_enabled:
+    app.add_middleware(IdempotencyMiddleware)
+
+if settings.sql_instrumentation:
+    app.add_middleware(QueryStatsMiddleware, n_plus_one_threshold=settings.sql_n_plus_one_threshold)
+
+if settings.memory_instrumentation:
+    app.add_middleware(MemoryMiddleware)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        content_types=settings.compression_content_types.split(','),
+    )
+
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=settings.profiling_sample_rate,
+        backend=settings.profiling_backend,
+    )
+
+# counts the requests being handled for a graceful shutdown, so it wraps every other middleware
+app.add_middleware(InFlightMiddleware)
 
 @app.get("/")
 async def read_root():
@@ -42,4 +76,6 @@ async def read_root():
 
 # start server, main:app - name of the file and app - Fastapi, reload=True - for authomatical reload
 if __name__ == '__main__':
+    import uvicorn
+
     uvicorn.run('main:app', host='127.0.0.1', port=8000, reload=True)
\ No newline at end of file
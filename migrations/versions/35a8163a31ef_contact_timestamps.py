@@ -0,0 +1,43 @@
+"""Contact timestamps and soft delete
+
+Revision ID: 35a8163a31ef
+Revises: 2f9806668f16
+Create Date: 2026-10-19 10:12:31.418210
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35a8163a31ef'
+down_revision = '2f9806668f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    # bound as a parameter, so SQLite stores it in the same format as the timestamps written by the app
+    contacts = sa.table('contacts', sa.column('created_at', sa.DateTime()), sa.column('updated_at', sa.DateTime()))
+    now = datetime.utcnow()
+    op.execute(contacts.update().values(created_at=now, updated_at=now))
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_contacts_user_id_updated_at', ['user_id', 'updated_at', 'id'])
+
+
+def downgrade() -> None:
+    # without deleted_at the tombstones would turn back into contacts
+    op.execute(sa.text('DELETE FROM contacts WHERE deleted_at IS NOT NULL'))
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_updated_at')
+        batch_op.drop_column('deleted_at')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,51 @@
+"""Contact phone numbers in E.164 with an index
+
+Revision ID: 8413c3fa90c2
+Revises: 35a8163a31ef
+Create Date: 2026-10-19 11:40:07.295113
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.phones import normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision = '8413c3fa90c2'
+down_revision = '35a8163a31ef'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    contacts = sa.table('contacts', sa.column('id', sa.Integer()), sa.column('phone_number', sa.String()),
+                        sa.column('updated_at', sa.DateTime()))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(contacts.c.id, contacts.c.phone_number).order_by(contacts.c.id)).all()
+    changes = []
+    for contact_id, phone_number in rows:
+        try:
+            normalized = normalize_phone(phone_number)
+        except ValueError:
+            # not a phone number, kept as typed; it is only found by the lookup if typed the same way
+            continue
+        if normalized != phone_number:
+            changes.append({'contact_id': contact_id, 'phone_number': normalized})
+    # updated_at moves on, so clients syncing with /contacts/changes download the new numbers
+    statement = contacts.update().where(contacts.c.id == sa.bindparam('contact_id')) \
+        .values(phone_number=sa.bindparam('phone_number'), updated_at=datetime.utcnow())
+    for offset in range(0, len(changes), BATCH_SIZE):
+        connection.execute(statement, changes[offset:offset + BATCH_SIZE])
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.create_index('ix_contacts_user_id_phone_number', ['user_id', 'phone_number'])
+
+
+def downgrade() -> None:
+    # the numbers stay in E.164, the form they were typed in is not kept
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_phone_number')
@@ -0,0 +1,115 @@
+"""
+Production entry point: serves main:app with several worker processes.
+
+    python serve.py
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+The number of workers is WEB_CONCURRENCY, one per CPU when it is 0. With gunicorn installed the workers are
+uvicorn workers under a gunicorn master; with WEB_PRELOAD the application is imported once in the master
+and the workers are forked from it, so they share its memory and a broken import stops the launch
+before any worker starts. Without gunicorn, uvicorn's own process manager starts the workers,
+each importing the application itself.
+
+When a worker is told to stop it reports not ready, keeps serving for SHUTDOWN_GRACE_SECONDS, ends its event streams
+and drains the requests being handled, all before the server closes its sockets, see src/services/server.py.
+
+Every worker reads WEB_CONCURRENCY to size its database and Redis pools, see src/services/workers.py.
+A process started without serve.py and without WEB_CONCURRENCY is the only worker and uses the whole budget.
+"""
+import argparse
+import gc
+import logging
+import os
+
+from src.conf.config import settings
+from src.services.workers import db_pool_options, redis_pool_size, worker_count
+
+logger = logging.getLogger('serve')
+
+
+def run_gunicorn(host: str, port: int, workers: int, preload: bool) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    def pre_fork(server, worker):
+        # objects loaded by the preloaded app are never collected in the workers,
+        # so their memory pages stay shared instead of being copied by the garbage collector
+        gc.freeze()
+
+    def post_fork(server, worker):
+        from src.database.db import engine
+
+        # connections opened in the master must not be shared with the workers
+        engine.dispose(close=False)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'{host}:{port}',
+                'workers': workers,
+                'worker_class': 'src.services.server.GracefulUvicornWorker',
+                'preload_app': preload,
+                'graceful_timeout': settings.shutdown_grace_seconds + settings.shutdown_timeout,
+                'pre_fork': pre_fork,
+                'post_fork': post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+
+            return app
+
+    Application().run()
+
+
+def run_uvicorn(host: str, port: int, workers: int, preload: bool) -> None:
+    import uvicorn
+    from uvicorn.supervisors import Multiprocess
+
+    from src.services.server import GracefulServer
+
+    if preload:
+        logger.warning('gunicorn is not installed, the workers import the application themselves')
+    config = uvicorn.Config('main:app', host=host, port=port, workers=workers, proxy_headers=True)
+    server = GracefulServer(config)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=settings.web_host)
+    parser.add_argument('--port', type=int, default=settings.web_port)
+    parser.add_argument('--workers', type=int, default=settings.web_concurrency, help='0 starts one per CPU')
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=settings.web_preload,
+                        help='import the application before forking the workers (gunicorn only)')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'uvicorn'], default='auto')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:     %(message)s')
+
+    workers = worker_count(args.workers)
+    # read by every worker, including the settings of the preloaded application
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    settings.web_concurrency = workers
+    pool = db_pool_options(settings.sqlalchemy_sqlite_database_url, workers=workers)
+    logger.info('%d workers, database pool of %s + %s overflow and Redis pools of %d connections per worker',
+                workers, pool.get('pool_size', 'default'), pool.get('max_overflow', 0), redis_pool_size(workers=workers))
+
+    server = args.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn'
+        except ImportError:
+            server = 'uvicorn'
+    if server == 'gunicorn':
+        run_gunicorn(args.host, args.port, workers, args.preload)
+    else:
+        run_uvicorn(args.host, args.port, workers, args.preload)
+
+
+if __name__ == '__main__':
+    main()
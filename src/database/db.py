@@ -1,18 +1,33 @@
 
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from src.conf.config import settings
+from src.database.instrumentation import instrument_pool, instrument_queries
+from src.services.metrics import Gauge
+from src.services.workers import db_pool_options
 
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_sqlite_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# the pool is sized from the worker count, so all workers together stay under db_max_connections
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **db_pool_options(SQLALCHEMY_DATABASE_URL))
+instrument_pool(engine)
+if settings.sql_instrumentation:
+    instrument_queries(engine)
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out_connections', 'Connections currently taken from the pool.',
+                            function=lambda: getattr(engine.pool, 'checkedout', lambda: 0)())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 # Dependency
-def get_db():
+def get_db(request: Request):
+    # a request run by POST /api/batch uses the session of the batch, which the batch closes
+    db = getattr(request.state, 'db', None)
+    if db is not None:
+        yield db
+        return
     db = SessionLocal()
     try:
         yield db
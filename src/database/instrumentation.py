@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+from src.services.metrics import DB_POOL_CHECKOUT, DB_QUERY_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """
+    Statements issued while handling one request: how many, how long they took and how often each one repeated.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """
+        The repeated function returns the statements that were issued at least threshold times, most repeated first.
+            The same statement run over and over with different parameters in one request is usually an N+1 pattern,
+            e.g. a lazy load of Contact.user for every contact being serialized.
+
+        :param self: Represent the instance of the class
+        :param threshold: int: How many identical statements count as a repetition
+        :return: A list of (statement, count) pairs
+        """
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def redact_parameters(parameters):
+    """
+    The redact_parameters function replaces the values of statement parameters with their type names,
+        so slow query logs show the shape of a query without leaking emails, passwords or tokens.
+
+    :param parameters: Parameters passed to the DBAPI cursor
+    :return: The parameters with every value replaced
+    """
+    if isinstance(parameters, dict):
+        return {key: f'<{type(value).__name__}>' for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return [redact_parameters(item) for item in parameters]
+        return tuple(f'<{type(value).__name__}>' for value in parameters)
+    return parameters
+
+
+def instrument_pool(engine: Engine) -> None:
+    """
+    The instrument_pool function records how long getting a connection from the engine's pool takes.
+        SQLAlchemy has no event that fires before a checkout, so the pool's connect method is wrapped instead.
+        When every connection is in use, this is the time a request waits for one to be returned.
+
+    :param engine: Engine: The engine whose pool is measured
+    :return: None
+    """
+    pool = engine.pool
+    connect = pool.connect
+
+    @wraps(connect)
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+def instrument_queries(engine: Engine) -> None:
+    """
+    The instrument_queries function adds event hooks that time every statement executed by the engine.
+        Each statement is added to the QueryStats of the current request, if there is one,
+        and statements slower than sql_slow_query_ms are logged with their parameters redacted.
+
+    :param engine: Engine: The engine whose statements are measured
+    :return: None
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._query_start
+        DB_QUERY_DURATION.observe(duration)
+        stats = query_stats.get()
+        if stats is not None:
+            stats.record(statement, duration)
+        if duration * 1000 >= settings.sql_slow_query_ms:
+            logger.warning('Slow query (%.1f ms): %s; parameters: %s',
+                           duration * 1000, statement, redact_parameters(parameters))
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql.sqltypes import Date
 
@@ -10,11 +12,19 @@ class Contact(Base):
     first_name = Column(String(50), nullable=False)
     last_name = Column(String(60), nullable=False)
     email = Column(String(30), nullable=False)
+    # stored in E.164, see normalize_phone
     phone_number = Column(String(20), nullable=False)
     birth_date = Column(Date, nullable=False)
     description = Column(String(300), nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # deleted contacts are kept as tombstones, so clients syncing with /contacts/changes learn about the delete
+    deleted_at = Column(DateTime, nullable=True)
     user = relationship('User', backref='contacts')
+
+    __table_args__ = (Index('ix_contacts_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+                      Index('ix_contacts_user_id_phone_number', 'user_id', 'phone_number'))
     
 
 class User(Base):
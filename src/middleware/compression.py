@@ -0,0 +1,160 @@
+import zlib
+from typing import Iterable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool) -> str | None:
+    """
+    The choose_encoding function picks the content encoding to use from an Accept-Encoding header.
+        The encoding with the highest q-value wins, brotli is preferred over gzip on a tie.
+
+    :param accept_encoding: str: Value of the Accept-Encoding request header
+    :param brotli_available: bool: Whether brotli may be chosen
+    :return: 'br', 'gzip' or None if the client accepts neither
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    wildcard = weights.get('*', 0.0)
+    candidates = (['br'] if brotli_available else []) + ['gzip']
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with brotli or gzip.
+
+    Only responses whose content type is in the allowlist and whose body reaches minimum_size are compressed.
+    Streaming responses are buffered only up to minimum_size, after that every chunk is compressed and flushed
+    as it comes, so streams keep flowing. Responses that already carry a Content-Encoding (precompressed bodies)
+    are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4,
+                 content_types: Iterable[str] = ('application/json',)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = frozenset(content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''), brotli is not None)
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def make_encoder(self, encoding: str):
+        if encoding == 'br':
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str | None, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Message | None = None
+        self.buffer = bytearray()
+        self.encoder = None
+        self.passthrough = False
+
+    def eligible(self, headers: MutableHeaders) -> bool:
+        if self.start_message['status'] in (204, 304) or 'content-encoding' in headers:
+            return False
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        return content_type in self.middleware.content_types
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.downstream(message)
+            return
+        if message['type'] == 'http.response.start':
+            self.start_message = message
+            headers = MutableHeaders(scope=message)
+            if not self.eligible(headers):
+                self.passthrough = True
+                await self.downstream(message)
+                return
+            headers.add_vary_header('Accept-Encoding')
+            if self.encoding is None:
+                self.passthrough = True
+                await self.downstream(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if self.encoder is not None:
+            data = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+            await self.downstream({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+            return
+
+        self.buffer.extend(body)
+        if len(self.buffer) < self.middleware.minimum_size:
+            if more_body:
+                return
+            # the whole body is below the threshold, send it as it is
+            await self.downstream(self.start_message)
+            await self.downstream({'type': 'http.response.body', 'body': bytes(self.buffer)})
+            return
+
+        self.encoder = self.middleware.make_encoder(self.encoding)
+        headers = MutableHeaders(scope=self.start_message)
+        headers['Content-Encoding'] = self.encoding
+        etag = headers.get('etag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = f'W/{etag}'
+        if more_body:
+            del headers['Content-Length']
+            data = self.encoder.compress(bytes(self.buffer))
+        else:
+            data = self.encoder.finish(bytes(self.buffer))
+            headers['Content-Length'] = str(len(data))
+        self.buffer.clear()
+        await self.downstream(self.start_message)
+        await self.downstream({'type': 'http.response.body', 'body': data, 'more_body': more_body})
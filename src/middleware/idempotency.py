@@ -0,0 +1,142 @@
+import base64
+import logging
+
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.auth import service_auth
+from src.services.idempotency import IDEMPOTENCY_REQUESTS, IdempotencyStore, fingerprint, service_idempotency
+
+logger = logging.getLogger(__name__)
+
+# POST routes that create something and that clients retry
+IDEMPOTENT_PATHS = ('/api/contacts/', '/api/auth/signup')
+MAX_KEY_LENGTH = 255
+
+
+async def read_body(receive: Receive) -> bytes | None:
+    """
+    The read_body function reads the whole body of a request.
+
+    :param receive: Receive: The ASGI receive callable of the request
+    :return: The body, or None if the client disconnected first
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that makes the POST routes of IDEMPOTENT_PATHS safe to retry. A request with an Idempotency-Key
+    header runs once; a repeat with the same key and body gets the stored response, with Idempotent-Replayed: true,
+    without running the route again. A repeat that arrives while the first request is still running waits for it.
+    Reusing a key for another body is answered with 422. If Redis is not available, requests run as without a key.
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = service_idempotency, paths=IDEMPOTENT_PATHS):
+        self.app = app
+        self.store = store
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get('idempotency-key')
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        path = scope['path']
+        if not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            response = JSONResponse({'detail': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'},
+                                    status_code=400)
+            await response(scope, receive, send)
+            return
+        body = await read_body(receive)
+        if body is None:
+            return
+        replay_receive = self._replay_body(body, receive)
+        request_fingerprint = fingerprint(body)
+        key = self.store.key('POST', path, idempotency_key, service_auth.token_subject(headers.get('authorization')))
+        try:
+            record = await self.store.acquire(key, request_fingerprint)
+        except (RedisError, OSError) as err:
+            logger.warning('Idempotency-Key ignored, Redis is not available: %s', err)
+            IDEMPOTENCY_REQUESTS.labels(path, 'unavailable').inc()
+            await self.app(scope, replay_receive, send)
+            return
+
+        if record is not None:
+            await self._answer_duplicate(record, request_fingerprint, path, scope, receive, send)
+            return
+
+        IDEMPOTENCY_REQUESTS.labels(path, 'executed').inc()
+        status = 500
+        response_headers = []
+        chunks = []
+
+        async def capture(message: Message) -> None:
+            nonlocal status, response_headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = list(message.get('headers', ()))
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await self._forget(self.store.release(key))
+            raise
+        await self._forget(self.store.save(key, request_fingerprint, status, response_headers, b''.join(chunks)))
+
+    async def _answer_duplicate(self, record: dict, request_fingerprint: str, path: str,
+                                scope: Scope, receive: Receive, send: Send) -> None:
+        if record['fingerprint'] != request_fingerprint:
+            IDEMPOTENCY_REQUESTS.labels(path, 'mismatch').inc()
+            response = JSONResponse({'detail': 'Idempotency-Key was already used for another request'},
+                                    status_code=422)
+            await response(scope, receive, send)
+            return
+        if record['state'] != 'done':
+            IDEMPOTENCY_REQUESTS.labels(path, 'conflict').inc()
+            response = JSONResponse({'detail': 'A request with this Idempotency-Key is still being processed'},
+                                    status_code=409, headers={'Retry-After': '1'})
+            await response(scope, receive, send)
+            return
+        IDEMPOTENCY_REQUESTS.labels(path, 'replayed').inc()
+        headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in record['headers']]
+        headers.append((b'idempotent-replayed', b'true'))
+        await send({'type': 'http.response.start', 'status': record['status'], 'headers': headers})
+        await send({'type': 'http.response.body', 'body': base64.b64decode(record['body'])})
+
+    @staticmethod
+    def _replay_body(body: bytes, receive: Receive) -> Receive:
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        return replay
+
+    @staticmethod
+    async def _forget(operation) -> None:
+        # the response is already sent, failing to store it only means a retry runs again
+        try:
+            await operation
+        except (RedisError, OSError) as err:
+            logger.warning('Could not store the response of an Idempotency-Key: %s', err)
@@ -0,0 +1,33 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.services.lifespan import AppState, app_state
+
+# health checks keep answering while the worker drains, so the load balancer can see it is going away
+HEALTH_PATHS = ('/live', '/ready')
+
+
+class InFlightMiddleware:
+    """
+    ASGI middleware that counts the requests being handled, so shutdown can wait for them,
+    and refuses new requests with 503 once the worker is draining.
+    """
+
+    def __init__(self, app: ASGIApp, state: AppState = app_state):
+        self.app = app
+        self.state = state
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['path'] in HEALTH_PATHS:
+            await self.app(scope, receive, send)
+            return
+        if self.state.draining:
+            response = JSONResponse({'detail': 'Server is shutting down'}, status_code=503,
+                                    headers={'Connection': 'close', 'Retry-After': '1'})
+            await response(scope, receive, send)
+            return
+        self.state.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.request_finished()
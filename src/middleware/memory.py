@@ -0,0 +1,32 @@
+import tracemalloc
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.middleware.metrics import route_template
+from src.services.memory import MemoryTracker, memory_tracker
+
+
+class MemoryMiddleware:
+    """
+    ASGI middleware that records how much memory each request allocated while tracemalloc is tracing.
+
+    When tracing is off it only checks tracemalloc.is_tracing and passes the request on.
+    """
+
+    def __init__(self, app: ASGIApp, tracker: MemoryTracker = memory_tracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tracemalloc.is_tracing():
+                after, peak = tracemalloc.get_traced_memory()
+                route = f"{scope['method']} {route_template(scope)}"
+                self.tracker.record(route, after - before, max(peak - before, 0))
@@ -0,0 +1,114 @@
+import asyncio
+import cProfile
+import logging
+import marshal
+import random
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.middleware.metrics import route_template
+from src.services.admin import is_admin_token
+from src.services.profiles import ProfileStore
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - pyinstrument is optional
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+
+class CProfileRecorder:
+    suffix = 'pstats'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profiler.enable()
+
+    def stop(self) -> bytes:
+        self.profiler.disable()
+        self.profiler.create_stats()
+        # the same format pstats.Stats.dump_stats writes, so the file opens with pstats, snakeviz or gprof2dot
+        return marshal.dumps(self.profiler.stats)
+
+
+class PyinstrumentRecorder:
+    suffix = 'speedscope.json'
+
+    def __init__(self):
+        self.profiler = SamplingProfiler(async_mode='enabled')
+
+    def start(self) -> None:
+        self.profiler.start()
+
+    def stop(self) -> bytes:
+        self.profiler.stop()
+        return self.profiler.output(SpeedscopeRenderer()).encode()
+
+
+def make_recorder(backend: str):
+    """
+    The make_recorder function returns a profiler for one request.
+        pyinstrument samples the stack and follows the request across awaits; it is used when asked for and installed.
+        cProfile is in the standard library, but it records every function called on the thread,
+        including other requests the event loop runs meanwhile.
+
+    :param backend: str: pyinstrument or cprofile
+    :return: A recorder with start and stop methods
+    """
+    if backend == 'pyinstrument' and SamplingProfiler is not None:
+        return PyinstrumentRecorder()
+    return CProfileRecorder()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles a request when it carries the admin token in the X-Profile header,
+    or at random with probability sample_rate, and saves the profile to a ProfileStore.
+
+    Only one request is profiled at a time, since a profiler hooks the whole thread.
+    The middleware is only added when profiling is enabled, so it costs nothing otherwise.
+    """
+
+    def __init__(self, app: ASGIApp, store: ProfileStore, sample_rate: float = 0.0, backend: str = 'cprofile'):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.backend = backend
+        self.active = False
+
+    def should_profile(self, scope: Scope) -> bool:
+        if self.active:
+            return False
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        token = Headers(scope=scope).get('x-profile')
+        return token is not None and is_admin_token(token)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        self.active = True
+        recorder = make_recorder(self.backend)
+        name = self.store.new_name(scope['method'], route_template(scope), recorder.suffix)
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append('X-Profile-Id', name)
+            await send(message)
+
+        recorder.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            data = recorder.stop()
+            self.active = False
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.store.save, name, data)
+            except OSError as err:
+                logger.warning('Could not save profile %s: %s', name, err)
@@ -0,0 +1,51 @@
+import logging
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database.instrumentation import QueryStats, query_stats
+from src.middleware.metrics import route_template
+from src.services.metrics import DB_QUERIES_PER_REQUEST, DB_N_PLUS_ONE
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware that counts the SQL statements and database time of each request.
+
+    The totals are sent back in a Server-Timing header, and a request that repeats the same statement
+    n_plus_one_threshold times or more is logged as a probable N+1.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: int = 5):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                headers.append('Server-Timing', f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats.reset(token)
+            route = route_template(scope)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+            repeated = stats.repeated(self.n_plus_one_threshold)
+            if repeated:
+                DB_N_PLUS_ONE.labels(route).inc()
+                for statement, count in repeated:
+                    logger.warning('Probable N+1 in %s %s: statement issued %d times: %s',
+                                   scope['method'], route, count, statement)
+            logger.debug('%s %s: %d queries in %.1f ms', scope['method'], scope['path'],
+                         stats.count, stats.duration * 1000)
@@ -1,11 +1,12 @@
-
-from datetime import date, timedelta
+import calendar
+from datetime import date, datetime, timedelta
 from fastapi import HTTPException, status
-from sqlalchemy import and_
+from sqlalchemy import and_, extract, select, tuple_, update
 from sqlalchemy.orm import Session
 
 from src.database.models import Contact
 from src.schemas.contacts import (
+    CONTACT_FIELDS,
     ContactModel, 
     ContactFirstNameUpdate, 
     ContactLastNameUpdate, 
@@ -16,6 +17,62 @@ from src.schemas.contacts import (
     )
 
 from src.database.models import User
+from src.services.cache import service_cache
+from src.services.batch import pending_events
+from src.services.events import broker, format_event
+
+
+async def _contacts_changed(user: User, contact: Contact, kind: str) -> None:
+    """
+    The _contacts_changed function is called by every write below once its change is committed.
+        It moves the user's contacts generation forward, which invalidates the ETags handed out for them,
+        and publishes the change to the user's open event streams.
+        Inside an atomic batch the event is held back until the batch commits.
+    
+    :param user: User: logged user's object from database
+    :param contact: Contact: The contact after the change
+    :param kind: str: created, updated or deleted
+    :return: None
+    """
+    await service_cache.bump_generation(user.id)
+    event = format_event(kind, contact)
+    pending = pending_events.get()
+    if pending is not None:
+        pending.append((user.id, event))
+    else:
+        await broker.publish(user.id, event)
+
+
+async def _contacts_changed_many(user: User, rows: list, kind: str) -> None:
+    """
+    The _contacts_changed_many function is _contacts_changed for the bulk writes below:
+        the generation moves forward once, and the events of all changed contacts are published together.
+    
+    :param user: User: logged user's object from database
+    :param rows: list: The changed contacts, rows with at least the id and updated_at columns
+    :param kind: str: updated or deleted
+    :return: None
+    """
+    if not rows:
+        return
+    await service_cache.bump_generation(user.id)
+    events = [format_event(kind, row) for row in rows]
+    pending = pending_events.get()
+    if pending is not None:
+        pending.extend((user.id, event) for event in events)
+    else:
+        await broker.publish_many(user.id, events)
+
+
+def _owned(user: User):
+    """
+    The _owned function is the filter every read and write below starts from:
+        contacts of the user that are not deleted.
+    
+    :param user: User: logged user's object from database
+    :return: A SQL condition
+    """
+    return and_(Contact.user_id==user.id, Contact.deleted_at.is_(None))
 
 
 async def get_contacts(user, skip: int, limit: int, db: Session):
@@ -28,7 +85,7 @@ async def get_contacts(user, skip: int, limit: int, db: Session):
     :param db: Session: Pass the database session to the function
     :return: A list of contacts
     """
-    return db.query(Contact).filter(Contact.user_id==user.id).offset(skip).limit(limit).all()
+    return db.query(Contact).filter(_owned(user)).offset(skip).limit(limit).all()
 
 
 async def get_contact_by_id(contact_id: int, user: User, db: Session):
@@ -43,7 +100,7 @@ async def get_contact_by_id(contact_id: int, user: User, db: Session):
     :param db: Session: Access the database
     :return: A contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     return contact
@@ -59,7 +116,7 @@ async def get_contact_by_firstname(contact_firstname: str, user: User, db: Sessi
     :param db: Session: Access the database
     :return: The contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.first_name==contact_firstname)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.first_name==contact_firstname).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     return contact
@@ -75,7 +132,7 @@ async def get_contact_by_lastname(contact_lastname: str, user: User, db: Session
     :param db: Session: Access the database
     :return: The contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.last_name==contact_lastname)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.last_name==contact_lastname).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     return contact
@@ -91,7 +148,25 @@ async def get_contact_by_email(contact_email: str, user: User, db: Session):
     :param db: Session: Access the database
     :return: The contact with the specified email address
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.email==contact_email)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.email==contact_email).first()
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
+    return contact
+
+
+async def get_contact_by_phone(phone_number: str, user: User, db: Session):
+    """
+    The get_contact_by_phone function returns the contact a phone number belongs to, e.g. to show who is calling.
+        The number has to be normalized with normalize_phone, as stored; the lookup is one seek
+        of the ix_contacts_user_id_phone_number index. If several contacts share the number, the oldest is returned.
+        If no contact is found, an HTTP 404 error is raised.
+    
+    :param phone_number: str: The phone number in E.164
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :return: The contact with the phone number
+    """
+    contact = db.query(Contact).filter(_owned(user), Contact.phone_number==phone_number).order_by(Contact.id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     return contact
@@ -110,7 +185,7 @@ async def get_birthdays(user: User, db: Session):
     for _ in range(7):
         current_date += timedelta(days=1)
         current_week_dates.append(current_date)
-    contacts = db.query(Contact).filter(Contact.user_id==user.id).all()
+    contacts = db.query(Contact).filter(_owned(user)).all()
     result = []
     for contact in contacts:
         needed_year = contact.birth_date.replace(year=current_date.year)
@@ -119,6 +194,115 @@ async def get_birthdays(user: User, db: Session):
     return result
 
 
+def contact_columns(fields=None) -> list:
+    """
+    The contact_columns function maps field names of a contact to the columns of the contacts table.
+    
+    :param fields: Names of the fields, all fields of ContactResponce if None
+    :return: A list of columns
+    """
+    return [getattr(Contact, field) for field in fields or CONTACT_FIELDS]
+
+
+async def get_contacts_rows(user: User, skip: int, limit: int, db: Session, fields=None) -> list:
+    """
+    The get_contacts_rows function returns a page of the user's contacts as plain tuples instead of ORM objects.
+        It selects only the requested columns, in the order of fields.
+    
+    :param user: User: logged user's object from database
+    :param skip: int: Skip the first n contacts in the database
+    :param limit: int: Limit the number of contacts returned
+    :param db: Session: Pass the database session to the function
+    :param fields: Names of the columns to select, all fields of ContactResponce if None
+    :return: A list of rows
+    """
+    return db.query(*contact_columns(fields)).filter(_owned(user)).offset(skip).limit(limit).all()
+
+
+async def get_contact_row(column, value, user: User, db: Session, fields=None):
+    """
+    The get_contact_row function returns the oldest of the user's contacts whose column equals value, as a plain tuple.
+        If no such contact exists, an HTTP 404 error is raised.
+    
+    :param column: Column of the contacts table to look the contact up by, e.g. Contact.email
+    :param value: Value the column has to be equal to
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :param fields: Names of the columns to select, all fields of ContactResponce if None
+    :return: A row
+    """
+    row = db.query(*contact_columns(fields)).filter(_owned(user), column==value).order_by(Contact.id).first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
+    return row
+
+
+async def get_contacts_rows_by_ids(ids: list, user: User, db: Session, fields=None) -> list:
+    """
+    The get_contacts_rows_by_ids function returns the user's contacts with the given ids as plain tuples,
+        in one query. Ids of contacts that do not exist, are deleted or belong to another user are left out.
+    
+    :param ids: list: Ids of the contacts
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :param fields: Names of the columns to select, all fields of ContactResponce if None
+    :return: A list of rows, in no particular order
+    """
+    return db.query(*contact_columns(fields)).filter(_owned(user), Contact.id.in_(ids)).all()
+
+
+def birthday_dates(start: date, days: int) -> list:
+    """
+    The birthday_dates function lists the (month, day) pairs of the days from start on.
+        Outside leap years people born on 29 February celebrate on 28 February, so that day also matches (2, 29).
+    
+    :param start: date: First day
+    :param days: int: Number of days
+    :return: A list of (month, day) tuples
+    """
+    dates = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        dates.append((day.month, day.day))
+        if (day.month, day.day) == (2, 28) and not calendar.isleap(day.year):
+            dates.append((2, 29))
+    return dates
+
+
+def _birthday_in(dates: list):
+    return tuple_(extract('month', Contact.birth_date), extract('day', Contact.birth_date)).in_(dates)
+
+
+async def get_birthdays_rows(user: User, db: Session, fields=None, days: int = 7) -> list:
+    """
+    The get_birthdays_rows function returns the contacts whose birthdays are in the next days, from tomorrow on,
+        as plain tuples. The birthdays are matched by the database, only the contacts having one are loaded.
+    
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :param fields: Names of the columns to return, all fields of ContactResponce if None
+    :param days: int: Number of days to look ahead
+    :return: A list of rows
+    """
+    dates = birthday_dates(date.today() + timedelta(days=1), days)
+    return db.query(*contact_columns(fields)).filter(_owned(user), _birthday_in(dates)).order_by(Contact.id).all()
+
+
+async def get_all_birthdays_rows(start: date, days: int, db: Session) -> list:
+    """
+    The get_all_birthdays_rows function returns the contacts of all users whose birthdays are in the days
+        from start on, in one query, for the daily birthday digest.
+    
+    :param start: date: First day
+    :param days: int: Number of days
+    :param db: Session: Access the database
+    :return: A list of rows, the user id followed by all fields of ContactResponce, ordered by user
+    """
+    dates = birthday_dates(start, days)
+    return db.query(Contact.user_id, *contact_columns()).filter(Contact.deleted_at.is_(None), _birthday_in(dates)) \
+        .order_by(Contact.user_id, Contact.id).all()
+
+
 async def add_contact(body: ContactModel, user: User, db: Session):
     """
     The add_contact function creates a new contact in the database.
@@ -130,7 +314,7 @@ async def add_contact(body: ContactModel, user: User, db: Session):
     :param db: Session: Access the database
     :return: The contact object
     """
-    contact = db.query(Contact).filter(Contact.first_name==body.first_name).first()
+    contact = db.query(Contact).filter(Contact.first_name==body.first_name, Contact.deleted_at.is_(None)).first()
     if contact:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Contact with this first name already exists')
     contact = Contact(**body.dict())
@@ -138,6 +322,7 @@ async def add_contact(body: ContactModel, user: User, db: Session):
     db.add(contact)
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'created')
     return contact
 
 
@@ -149,16 +334,19 @@ async def delete_contact(contact_id: int, user: User, db: Session):
             user (User): The user who is deleting the contact.
             db (Session): A connection to our database session, used for querying and committing changes.
     
+        The row is kept as a tombstone with deleted_at set, so get_changes can report the delete.
+    
     :param contact_id: int: Specify the id of the contact to be deleted
     :param user: User: logged user's object from database
     :param db: Session: Access the database
     :return: The deleted contact
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
-    db.delete(contact)
+    contact.deleted_at = contact.updated_at = datetime.utcnow()
     db.commit()
+    await _contacts_changed(user, contact, 'deleted')
     return contact
 
 
@@ -177,12 +365,13 @@ async def update_contact_firstname(body: ContactFirstNameUpdate, contact_id: int
     :param db: Session: Access the database
     :return: A contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.first_name = body.first_name
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'updated')
     return contact
 
 
@@ -201,12 +390,13 @@ async def update_contact_lastname(body: ContactLastNameUpdate, contact_id: int,
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.last_name = body.last_name
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'updated')
     return contact
 
 
@@ -225,12 +415,13 @@ async def update_contact_email(body: ContactEmailUpdate, contact_id: int, user:
     :param db: Session: Access the database
     :return: A contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.email = body.email
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'updated')
     return contact
 
 
@@ -249,12 +440,13 @@ async def update_contact_phone(body: ContactPhoneUpdate, contact_id: int, user:
     :param db: Session: Access the database
     :return: A contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.phone_number = body.phone_number
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'updated')
     return contact
 
 
@@ -273,12 +465,13 @@ async def update_contact_birthdate(body: ContactBirthdateUpdate, contact_id: int
     :param db: Session: Access the database
     :return: The updated contact
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.birth_date = body.birth_date
     db.commit()
     db.refresh(contact)
+    await _contacts_changed(user, contact, 'updated')
     return contact
 
 
@@ -297,10 +490,110 @@ async def update_contact_description(body: ContactDescriptionUpdate, contact_id:
     :param db: Session: Pass the database session to the function
     :return: The updated contact
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id==user.id, Contact.id==contact_id)).first()
+    contact = db.query(Contact).filter(_owned(user), Contact.id==contact_id).first()
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Contact does not exist')
     contact.description = body.description
     db.commit()
     db.refresh(contact)
-    return contact
\ No newline at end of file
+    await _contacts_changed(user, contact, 'updated')
+    return contact
+
+
+def _filter_conditions(conditions: dict) -> list:
+    """
+    The _filter_conditions function turns the fields of a ContactFilter into SQL conditions.
+        Every field is compared for equality, except updated_before, which matches contacts not changed since.
+    
+    :param conditions: dict: The fields of the filter that are set
+    :return: A list of SQL conditions
+    """
+    result = []
+    for field, value in conditions.items():
+        if field == 'updated_before':
+            result.append(Contact.updated_at < value)
+        else:
+            result.append(getattr(Contact, field)==value)
+    return result
+
+
+async def delete_contacts(user: User, db: Session, ids: list | None = None, conditions: dict | None = None,
+                          limit: int = 1000) -> list:
+    """
+    The delete_contacts function deletes many of the user's contacts with one UPDATE statement in one transaction,
+        instead of a SELECT, an UPDATE and a commit per contact. Like delete_contact it keeps them as tombstones.
+        The contacts are given either by ids or by filter conditions. A filter deletes at most limit contacts,
+        lowest ids first, so the statement locks a bounded number of rows; call again until fewer are deleted.
+    
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :param ids: list | None: Ids of the contacts to delete
+    :param conditions: dict | None: Fields of a ContactFilter the contacts have to match, used if ids is None
+    :param limit: int: Most contacts a filter deletes
+    :return: The ids of the deleted contacts
+    """
+    if ids is not None:
+        selected = Contact.id.in_(ids)
+    else:
+        selected = Contact.id.in_(select(Contact.id).where(_owned(user), *_filter_conditions(conditions))
+                                  .order_by(Contact.id).limit(limit))
+    now = datetime.utcnow()
+    statement = (update(Contact).where(_owned(user), selected).values(deleted_at=now, updated_at=now)
+                 .returning(Contact.id, Contact.updated_at).execution_options(synchronize_session=False))
+    rows = db.execute(statement).all()
+    db.commit()
+    await _contacts_changed_many(user, rows, 'deleted')
+    return sorted(row.id for row in rows)
+
+
+async def update_contacts(ids: list, values: dict, user: User, db: Session) -> list:
+    """
+    The update_contacts function sets the same values on many of the user's contacts
+        with one UPDATE statement in one transaction.
+    
+    :param ids: list: Ids of the contacts to update
+    :param values: dict: New values by field name
+    :param user: User: logged user's object from database
+    :param db: Session: Access the database
+    :return: The ids of the updated contacts
+    """
+    statement = (update(Contact).where(_owned(user), Contact.id.in_(ids))
+                 .values(**values, updated_at=datetime.utcnow())
+                 .returning(*contact_columns(), Contact.updated_at).execution_options(synchronize_session=False))
+    rows = db.execute(statement).all()
+    db.commit()
+    await _contacts_changed_many(user, rows, 'updated')
+    return sorted(row.id for row in rows)
+
+
+async def get_changes(user: User, since: tuple | None, limit: int, db: Session) -> list:
+    """
+    The get_changes function returns the user's contacts created, updated or deleted after a point in time,
+        oldest change first. The point is the (updated_at, id) of the last change the client has seen,
+        so changes made in the same microsecond are neither repeated nor skipped between pages.
+        Deleted contacts are returned as tombstones with deleted_at set.
+        The (user_id, updated_at, id) index answers the query without reading the unchanged contacts.
+    
+    :param user: User: logged user's object from database
+    :param since: tuple | None: (updated_at, id) of the last change seen, None for all contacts
+    :param limit: int: Limit the number of changes returned
+    :param db: Session: Access the database
+    :return: A list of contacts
+    """
+    query = db.query(Contact).filter(Contact.user_id==user.id)
+    if since is not None:
+        query = query.filter(tuple_(Contact.updated_at, Contact.id) > tuple_(*since))
+    return query.order_by(Contact.updated_at, Contact.id).limit(limit).all()
+
+
+async def purge_tombstones(before: datetime, db: Session) -> int:
+    """
+    The purge_tombstones function removes the contacts deleted before a point in time for good.
+    
+    :param before: datetime: Tombstones older than this are removed
+    :param db: Session: Access the database
+    :return: The number of removed contacts
+    """
+    count = db.query(Contact).filter(Contact.deleted_at < before).delete(synchronize_session=False)
+    db.commit()
+    return count
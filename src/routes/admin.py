@@ -0,0 +1,139 @@
+import gc
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.repository import contacts as repository_contacts
+from src.services.admin import require_admin
+from src.services.birthdays import run_digest
+from src.services.memory import memory_tracker
+from src.services.profiles import profile_store
+
+router = APIRouter(prefix='/admin', tags=['admin'], dependencies=[Depends(require_admin)])
+
+
+@router.get('/profiles')
+async def read_profiles():
+    """
+    The read_profiles function lists the saved request profiles, newest first.
+    
+    :return: A list of dicts with the name, size and creation time of each profile
+    """
+    return profile_store.list()
+
+
+@router.get('/profiles/{name}')
+async def read_profile(name: str):
+    """
+    The read_profile function downloads one saved profile.
+        pstats files open with python -m pstats or snakeviz, speedscope files at https://www.speedscope.app.
+    
+    :param name: str: Name of the profile
+    :return: The profile file
+    """
+    path = profile_store.get(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Profile not found')
+    return FileResponse(path, media_type='application/octet-stream', filename=name)
+
+
+@router.get('/memory')
+async def read_memory():
+    """
+    The read_memory function returns the RSS and garbage collector state of the worker that handles the request,
+        and while tracemalloc is tracing, the traced memory and the allocations recorded per route.
+        Every worker process answers for itself; pid tells which one answered.
+    
+    :return: A dict
+    """
+    return memory_tracker.summary()
+
+
+@router.post('/memory/tracemalloc/start')
+async def start_tracemalloc(frames: int = Query(settings.tracemalloc_frames, ge=1, le=50)):
+    """
+    The start_tracemalloc function starts tracing allocations in this worker and resets the per route totals.
+        Tracing makes every allocation slower, stop it when done.
+    
+    :param frames: int: How many frames of the traceback to keep for each allocation
+    :return: The memory summary
+    """
+    memory_tracker.start(frames)
+    return memory_tracker.summary()
+
+
+@router.post('/memory/tracemalloc/stop')
+async def stop_tracemalloc():
+    """
+    The stop_tracemalloc function stops tracing allocations in this worker.
+    
+    :return: The memory summary
+    """
+    memory_tracker.stop()
+    return memory_tracker.summary()
+
+
+@router.get('/memory/top')
+async def read_memory_top(limit: int = Query(20, ge=1, le=200),
+                          group_by: str = Query('lineno', regex='^(lineno|filename|traceback)$'),
+                          growth: bool = False):
+    """
+    The read_memory_top function lists the allocation sites holding the most memory,
+        or with growth=true, the ones that grew the most since tracing was started.
+    
+    :param limit: int: How many sites to return
+    :param group_by: str: lineno, filename or traceback
+    :param growth: bool: Compare with the snapshot taken when tracing was started
+    :return: A list of allocation sites
+    """
+    if not memory_tracker.enabled:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='tracemalloc is not tracing')
+    if growth:
+        return memory_tracker.growth(limit, group_by)
+    return memory_tracker.top(limit, group_by)
+
+
+@router.post('/memory/gc')
+async def collect_garbage():
+    """
+    The collect_garbage function runs a full garbage collection, so memory held only by reference cycles
+        can be told apart from memory that is really leaking.
+    
+    :return: A dict with the number of unreachable objects found and the RSS afterwards
+    """
+    collected = gc.collect()
+    return {'collected': collected, 'rss_bytes': memory_tracker.summary()['rss_bytes']}
+
+
+@router.post('/contacts/tombstones/purge')
+async def purge_tombstones(db: Session = Depends(get_db)):
+    """
+    The purge_tombstones function removes deleted contacts older than tombstone_retention_days.
+        Clients whose last sync is older than that get 410 from /contacts/changes and sync from scratch.
+    
+    :param db: Session: Access the database
+    :return: A dict with the number of removed contacts
+    """
+    before = datetime.utcnow() - timedelta(days=settings.tombstone_retention_days)
+    return {'purged': await repository_contacts.purge_tombstones(before, db)}
+
+
+@router.post('/birthdays/digest')
+async def make_birthday_digest(emails: bool = False, db: Session = Depends(get_db)):
+    """
+    The make_birthday_digest function runs the daily birthday digest now, e.g. after a bulk import of contacts.
+        It stores the birthdays of every user where /contacts/birthdays reads them.
+    
+    :param emails: bool: Also email the users who have birthdays coming up
+    :param db: Session: Access the database
+    :return: A dict with the date, the number of users, contacts and emails sent
+    """
+    try:
+        return await run_digest(db, send_emails=emails)
+    except (RedisError, OSError) as err:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f'Redis is not available: {err}')
@@ -32,7 +32,7 @@ async def signup(body: schema_users.UserModel, background_tasks: BackgroundTasks
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'User with email: {body.email} already exists')
-    body.password = service_auth.get_password_hash(body.password)
+    body.password = await service_auth.get_password_hash_async(body.password)
     user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, user.email, user.username, request.base_url)
     return {'user': user, 'detail': 'User successfully created, please check your email for verification'}
@@ -52,7 +52,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Email is not confirmed')
-    if not service_auth.verify_password(body.password, user.password):
+    if not await service_auth.verify_password_async(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     access_token = await service_auth.create_access_token(data={"sub": user.email})
     refresh_token = await service_auth.create_refresh_token(data={"sub": user.email})
@@ -169,7 +169,7 @@ async def reset_password(body: ChangePassword, token: str, db: Session = Depends
     user = await repository_users.get_user_by_email(email, db)
     if user is None:
         return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Verification error')
-    body.new_password = service_auth.get_password_hash(body.new_password)
+    body.new_password = await service_auth.get_password_hash_async(body.new_password)
     await repository_users.change_password(user, body.new_password, db)
     return "User's password was changed succesfully"
     
\ No newline at end of file
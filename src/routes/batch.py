@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.database.models import User
+from src.schemas.batch import BatchRequest, BatchResponse
+from src.services.auth import service_auth
+from src.services.batch import Batch, batchable
+
+router = APIRouter(tags=['batch'],
+                   default_response_class=ORJSONResponse if settings.fast_json_responses else JSONResponse)
+
+
+@router.post('/batch', response_model=BatchResponse, status_code=status.HTTP_200_OK)
+async def run_batch(body: BatchRequest, request: Request, db: Session = Depends(get_db),
+                    current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The run_batch function runs several requests to the contacts and users routes in one HTTP round trip.
+        The requests run in order, with the user authenticated once for all of them, and their responses
+        come back in the same order, each with its own status. With atomic set they share one database transaction,
+        which is committed only if every request succeeded; the first failing request stops the batch
+        and the requests after it are answered with 424.
+        No more than batch_max_requests requests are accepted.
+    
+    :param body: BatchRequest: The requests and whether they are atomic
+    :param request: Request: The batch request, its Authorization header is passed on to the requests
+    :param db: Session: Database session shared by the requests
+    :param current_user: User: Get the current user from the database
+    :return: A dict with the responses and whether their changes were committed
+    """
+    if len(body.requests) > settings.batch_max_requests:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f'No more than {settings.batch_max_requests} requests per batch')
+    for index, item in enumerate(body.requests):
+        if not batchable(item.path):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=f'Request {index} cannot be part of a batch: {item.path}')
+    return await Batch(request, current_user, db, atomic=body.atomic).run(body.requests)
@@ -1,64 +1,274 @@
+from datetime import date, datetime
 from typing import List
 
 from pydantic import EmailStr
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer
-from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.orm import Session
 
 from src.database.db import get_db
 from src.schemas import contacts as schemas_contacts
 from src.repository import contacts as repository_contacts
 from src.services.auth import service_auth
+from src.services.birthdays import birthdays_page
+from src.services.cache import service_cache
+from src.services.etag import etag_matches
+from src.services.events import RESYNC, broker, event_stream, format_cursor, format_event
+from src.services.serializers import RawJSONResponse, dump_batch, dump_rows, parse_fields, rows_response, row_response
+from src.services.sync import decode_cursor, encode_cursor
+from src.services.phones import normalize_phone
+from src.services.rate_limit import RateLimit
+from src.conf.config import settings
 from src.database.models import User, Contact
 
-router = APIRouter(prefix='/contacts', tags=["contacts"])
+router = APIRouter(prefix='/contacts', tags=["contacts"],
+                   default_response_class=ORJSONResponse if settings.fast_json_responses else JSONResponse)
 security = HTTPBearer()
 
 
+def not_modified(request: Request, response: Response, etag: str | None) -> Response | None:
+    """
+    The not_modified function handles conditional reads of a user's contacts.
+        If the client's If-None-Match header matches the current ETag, it returns a 304 response to send instead.
+        Otherwise it sets the ETag on the response that is going to be sent and returns None.
+    
+    :param request: Request: Read the If-None-Match header
+    :param response: Response: Response of the route, gets the ETag headers
+    :param etag: str | None: Current ETag of the user's contacts, None if unknown
+    :return: A 304 response or None
+    """
+    if etag is None:
+        return None
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @router.get('/', response_model=List[schemas_contacts.ContactResponce], 
                  description='No more than 3 requests each 4 seconds',
-                #  dependencies = [Depends(RateLimiter(times=3, seconds=4))],
+                #  dependencies = [Depends(RateLimit(times=3, seconds=4))],
                  status_code=status.HTTP_200_OK)
-async def read_contacts(skip: int = 0, limit: int = 10, db: Session = Depends(get_db),
+async def read_contacts(request: Request, response: Response, skip: int = Query(default=0, ge=0),
+                        limit: int = Query(default=10, ge=1),
+                        fields: tuple | None = Depends(parse_fields), db: Session = Depends(get_db),
                         current_user: User = Depends(service_auth.get_current_user)):
     """
     The read_contacts function returns a list of contacts for the current user.
         The skip and limit parameters are used to paginate the results.
+        The response carries an ETag, and a matching If-None-Match is answered with 304 without querying the contacts.
+        The first page is served from Redis as the JSON bytes cached by an earlier request,
+        until one of the user's contacts changes.
+        With fast_json_responses enabled the contacts are fetched as tuples and encoded straight to JSON bytes.
     
     
+    :param request: Request: Read the If-None-Match header
+    :param response: Response: Set the ETag header
     :param skip: int: Skip the first n contacts
     :param limit: int: Limit the number of contacts returned
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the repository layer
     :param current_user: User: Get the current user from the database
     :return: A list of contacts
     """
+    generation = await service_cache.get_generation(current_user.id)
+    cached = not_modified(request, response, service_cache.etag(current_user.id, generation))
+    if cached is not None:
+        return cached
+    if skip == 0 and limit <= settings.contacts_cache_max_limit:
+        async def load():
+            return dump_rows(await repository_contacts.get_contacts_rows(current_user, 0, limit, db, fields), fields)
+
+        name = f'first_page:{limit}:{",".join(fields or ())}'
+        body = await service_cache.read_through(current_user.id, generation, name, load)
+        return RawJSONResponse(body, headers=response.headers)
+    if fields or settings.fast_json_responses:
+        rows = await repository_contacts.get_contacts_rows(current_user, skip, limit, db, fields)
+        return rows_response(rows, fields, headers=response.headers)
     contacts = await repository_contacts.get_contacts(current_user, skip, limit, db)
     return contacts
 
 
 @router.get('/birthdays', response_model=List[schemas_contacts.ContactResponce],
                           description='No more than 3 requests each 4 seconds',)
-                        #   dependencies = [Depends(RateLimiter(times=3, seconds=4))])
-async def read_birthdays(db: Session = Depends(get_db), 
+                        #   dependencies = [Depends(RateLimit(times=3, seconds=4))])
+async def read_birthdays(fields: tuple | None = Depends(parse_fields), db: Session = Depends(get_db), 
                          current_user: User = Depends(service_auth.get_current_user)):
     """
-    The read_birthdays function returns a list of contacts with birthdays in the current week.
+    The read_birthdays function returns a list of contacts with birthdays in the next birthdays_days days.
         The function requires an authenticated user.
+        The list is cached in Redis as JSON bytes for the rest of the day, until one of the user's contacts changes.
+        The daily birthday digest stores the list of every user ahead of time, so a request with all fields
+        usually only reads its key.
     
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the function
     :param current_user: User: Get the current user from the database
     :return: A list of contacts
     """
-    contacts = await repository_contacts.get_birthdays(current_user, db)
-    return contacts
+    async def load():
+        rows = await repository_contacts.get_birthdays_rows(current_user, db, fields, settings.birthdays_days)
+        return dump_rows(rows, fields)
+
+    generation = await service_cache.get_generation(current_user.id)
+    name = birthdays_page(date.today(), fields)
+    return RawJSONResponse(await service_cache.read_through(current_user.id, generation, name, load))
+
+@router.get('/changes', response_model=schemas_contacts.ContactChanges)
+async def read_changes(since: str | None = None, limit: int = Query(default=100, ge=1, le=1000),
+                       db: Session = Depends(get_db), current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The read_changes function returns the contacts created, updated or deleted since the client's last sync,
+        so a client only downloads what changed instead of the whole list.
+        Without since all contacts are returned, page by page. Every response has a next cursor to pass as since
+        on the following call; has_more tells whether to call again right away.
+        Deleted contacts come with deleted_at set.
+        The next cursor expires tombstone_retention_days after the call that returned it, whether or not
+        anything changed, so a client has to sync at least that often to stay incremental.
+    
+    :param since: str | None: Cursor returned as next by the previous call
+    :param limit: int: Limit the number of changes returned
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A dict with the changes, the next cursor and has_more
+    """
+    position = decode_cursor(since) if since else None
+    # taken before the query: every change made up to now is in this response or a later page
+    synced_at = datetime.utcnow()
+    contacts = await repository_contacts.get_changes(current_user, position, limit + 1, db)
+    has_more = len(contacts) > limit
+    contacts = contacts[:limit]
+    if contacts:
+        position = contacts[-1].updated_at, contacts[-1].id
+    if position is not None:
+        since = encode_cursor(*position, None if has_more else synced_at)
+    return {'changes': contacts, 'next': since, 'has_more': has_more}
+
+@router.get('/events', response_class=StreamingResponse)
+async def read_events(request: Request, db: Session = Depends(get_db),
+                      current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The read_events function opens a Server-Sent Events stream of the changes of the current user's contacts,
+        made on any worker, so dashboards do not have to poll. Every event carries the change feed cursor as its id.
+        A client reconnecting with Last-Event-ID first gets the changes it missed, or a resync event
+        if there are more than events_replay_limit of them, in which case it should sync with /contacts/changes.
+        After the missed changes the client's Last-Event-ID is renewed, so an idle stream does not expire.
+        The database session is released before streaming starts.
+    
+    :param request: Request: Read the Last-Event-ID header
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A text/event-stream response
+    """
+    subscription = broker.subscribe(current_user.id)
+    replay = []
+    try:
+        last_event_id = request.headers.get('last-event-id')
+        if last_event_id:
+            position = decode_cursor(last_event_id)
+            synced_at = datetime.utcnow()
+            # subscribed first, so a change made while the missed ones are read is not lost
+            contacts = await repository_contacts.get_changes(current_user, position,
+                                                             settings.events_replay_limit + 1, db)
+            if len(contacts) > settings.events_replay_limit:
+                replay = [RESYNC]
+            else:
+                replay = [format_event('deleted' if contact.deleted_at else 'updated', contact) for contact in contacts]
+                if contacts:
+                    position = contacts[-1].updated_at, contacts[-1].id
+                # the client is caught up, its Last-Event-ID does not expire while it keeps reconnecting
+                replay.append(format_cursor(encode_cursor(*position, synced_at)))
+    except BaseException:
+        broker.unsubscribe(current_user.id, subscription)
+        raise
+    finally:
+        db.close()
+    return StreamingResponse(event_stream(current_user.id, subscription, replay), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@router.post('/batch_get', response_model=schemas_contacts.ContactBatch, status_code=status.HTTP_200_OK)
+async def read_contacts_batch(body: schemas_contacts.ContactBatchGet, fields: tuple | None = Depends(parse_fields),
+                              db: Session = Depends(get_db),
+                              current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The read_contacts_batch function returns many contacts by their ids in one request and one query,
+        instead of a GET /contacts/{contact_id} per id. Contacts come back in the order of the ids, each once.
+        Ids that do not match a contact of the current user are listed in missing instead of failing the request.
+        No more than contacts_batch_max_ids distinct ids are accepted.
+    
+    :param body: schemas_contacts.ContactBatchGet: Ids of the contacts
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A dict with the contacts and the missing ids
+    """
+    ids = list(dict.fromkeys(body.ids))
+    if len(ids) > settings.contacts_batch_max_ids:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f'No more than {settings.contacts_batch_max_ids} ids per request')
+    rows = await repository_contacts.get_contacts_rows_by_ids(ids, current_user, db, fields)
+    # the id is the first field of every fieldset
+    found = {row[0]: row for row in rows}
+    return RawJSONResponse(dump_batch([found[contact_id] for contact_id in ids if contact_id in found],
+                                      [contact_id for contact_id in ids if contact_id not in found], fields))
+
+@router.post('/bulk_delete', response_model=schemas_contacts.ContactBulkResult, status_code=status.HTTP_200_OK)
+async def remove_contacts(body: schemas_contacts.ContactBulkDelete, db: Session = Depends(get_db),
+                          current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The remove_contacts function deletes many contacts in one statement, given either by ids or by a filter.
+        No more than contacts_bulk_max_rows ids are accepted, and a filter deletes at most that many contacts
+        per call, so a client cleaning up more calls again until affected is lower than the limit.
+        Ids that do not match a contact of the current user are ignored.
+    
+    :param body: schemas_contacts.ContactBulkDelete: Ids of the contacts or a filter they match
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A dict with the number and the ids of the deleted contacts
+    """
+    conditions = body.filter.dict(exclude_none=True) if body.filter is not None else {}
+    if (body.ids is None) == (not conditions):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail='Either ids or a filter with at least one field is required')
+    if body.ids is not None and len(set(body.ids)) > settings.contacts_bulk_max_rows:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f'No more than {settings.contacts_bulk_max_rows} ids per request')
+    ids = await repository_contacts.delete_contacts(current_user, db, ids=body.ids, conditions=conditions,
+                                                    limit=settings.contacts_bulk_max_rows)
+    return {'affected': len(ids), 'ids': ids}
+
+
+@router.patch('/bulk_update', response_model=schemas_contacts.ContactBulkResult, status_code=status.HTTP_200_OK)
+async def update_contacts(body: schemas_contacts.ContactBulkUpdate, db: Session = Depends(get_db),
+                          current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The update_contacts function sets the same values on many contacts in one statement.
+        The first name cannot be set this way, since contacts are looked up by it.
+        No more than contacts_bulk_max_rows ids are accepted. Ids that do not match a contact of the current user are ignored.
+    
+    :param body: schemas_contacts.ContactBulkUpdate: Ids of the contacts and the values to set
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A dict with the number and the ids of the updated contacts
+    """
+    values = body.values.dict(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='No values to update')
+    if len(set(body.ids)) > settings.contacts_bulk_max_rows:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f'No more than {settings.contacts_bulk_max_rows} ids per request')
+    ids = await repository_contacts.update_contacts(body.ids, values, current_user, db)
+    return {'affected': len(ids), 'ids': ids}
 
 # adding parametr {contact_id} to path and finding a contact using that id
 @router.get('/{contact_id}', response_model=schemas_contacts.ContactResponce,
                              description='No more than 3 requests each 4 seconds',
                              status_code=status.HTTP_200_OK)
-                            #  dependencies = [Depends(RateLimiter(times=3, seconds=4))])
-async def read_contact_by_id(contact_id: int = Path(ge=1), db: Session = Depends(get_db),
+                            #  dependencies = [Depends(RateLimit(times=3, seconds=4))])
+async def read_contact_by_id(request: Request, response: Response, contact_id: int = Path(ge=1), 
+                             fields: tuple | None = Depends(parse_fields), db: Session = Depends(get_db),
                              current_user: User = Depends(service_auth.get_current_user)):
     """
     The read_contact_by_id function returns a contact by its id.
@@ -68,12 +278,23 @@ async def read_contact_by_id(contact_id: int = Path(ge=1), db: Session = Depends
             current_user (User, optional): The user currently logged in and making this request. Defaults to Depends(service_auth.get_current_user).
         Returns:
             Contact: A single Contact object matching the given id.
+        The response carries an ETag, and a matching If-None-Match is answered with 304 without querying the contact.
     
+    :param request: Request: Read the If-None-Match header
+    :param response: Response: Set the ETag header
     :param contact_id: int: Get the contact_id from the url
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the function
     :param current_user: User: Get the user from the database
     :return: A contact object
     """
+    etag = await service_cache.contacts_etag(current_user.id)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+    if fields or settings.fast_json_responses:
+        row = await repository_contacts.get_contact_row(Contact.id, contact_id, current_user, db, fields)
+        return row_response(row, fields, headers=response.headers)
     contact = await repository_contacts.get_contact_by_id(contact_id, current_user, db)
     return contact
 
@@ -81,8 +302,9 @@ async def read_contact_by_id(contact_id: int = Path(ge=1), db: Session = Depends
 @router.get('/firstname/{contact_first_name}', response_model=schemas_contacts.ContactResponce,
                                                description='No more than 3 requests each 4 seconds',
                                                status_code=status.HTTP_200_OK,)
-                                            #    dependencies = [Depends(RateLimiter(times=3, seconds=4))])
-async def read_contact_by_firstname(contact_first_name : str = Path(min_length=3, max_length=50), db: Session = Depends(get_db),
+                                            #    dependencies = [Depends(RateLimit(times=3, seconds=4))])
+async def read_contact_by_firstname(contact_first_name : str = Path(min_length=3, max_length=50), 
+                                    fields: tuple | None = Depends(parse_fields), db: Session = Depends(get_db),
                                     current_user: User = Depends(service_auth.get_current_user)):
     """
     The read_contact_by_firstname function returns a contact object based on the first name of the contact.
@@ -90,18 +312,23 @@ async def read_contact_by_firstname(contact_first_name : str = Path(min_length=3
     
     :param contact_first_name : str: Get the contact by first name
     :param max_length: Specify the maximum length of the string
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the function
     :param current_user: User: Get the current user information
     :return: A contact object
     """
+    if fields or settings.fast_json_responses:
+        row = await repository_contacts.get_contact_row(Contact.first_name, contact_first_name, current_user, db, fields)
+        return row_response(row, fields)
     contact = await repository_contacts.get_contact_by_firstname(contact_first_name, current_user, db)
     return contact
 
 
 @router.get('/lastname/{contact_last_name}', response_model=schemas_contacts.ContactResponce,
                                              description='No more than 3 requests each 4 seconds',
-                                             dependencies = [Depends(RateLimiter(times=3, seconds=4))])
-async def read_contact_by_lastname(contact_last_name: str = Path(min_length=3, max_length=60), db: Session = Depends(get_db),
+                                             dependencies = [Depends(RateLimit(times=3, seconds=4))])
+async def read_contact_by_lastname(contact_last_name: str = Path(min_length=3, max_length=60), 
+                                   fields: tuple | None = Depends(parse_fields), db: Session = Depends(get_db),
                                    current_user: User = Depends(service_auth.get_current_user)):
     """
     The read_contact_by_lastname function returns a contact by last name.
@@ -112,18 +339,23 @@ async def read_contact_by_lastname(contact_last_name: str = Path(min_length=3, m
     
     :param contact_last_name: str: Pass the contact last name to the function
     :param max_length: Limit the length of the string
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the function
     :param current_user: User: Get the user_id of the logged in user
     :return: A single contact with the same last name
     """
+    if fields or settings.fast_json_responses:
+        row = await repository_contacts.get_contact_row(Contact.last_name, contact_last_name, current_user, db, fields)
+        return row_response(row, fields)
     contact = await repository_contacts.get_contact_by_lastname(contact_last_name, current_user, db)
     return contact
 
 
 @router.get('/email/{contact_email}', response_model=schemas_contacts.ContactResponce,
                                       description='No more than 3 requests each 4 seconds',
-                                      dependencies = [Depends(RateLimiter(times=3, seconds=4))])
-async def read_contact_by_email(contact_email: EmailStr, db: Session = Depends(get_db),
+                                      dependencies = [Depends(RateLimit(times=3, seconds=4))])
+async def read_contact_by_email(contact_email: EmailStr, fields: tuple | None = Depends(parse_fields), 
+                                db: Session = Depends(get_db),
                                 current_user: User = Depends(service_auth.get_current_user)):
     """
     The read_contact_by_email function returns a contact by email.
@@ -133,17 +365,46 @@ async def read_contact_by_email(contact_email: EmailStr, db: Session = Depends(g
             current_user (User, optional): User object for the user making this request. Defaults to Depends(service_auth.get_current_user).
     
     :param contact_email: EmailStr: Get the email of a contact
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
     :param db: Session: Pass the database session to the function
     :param current_user: User: Get the user information from the database
     :return: A contact object
     """
+    if fields or settings.fast_json_responses:
+        row = await repository_contacts.get_contact_row(Contact.email, contact_email, current_user, db, fields)
+        return row_response(row, fields)
     contact = await repository_contacts.get_contact_by_email(contact_email, current_user, db)
     return contact
 
+
+@router.get('/phone/{phone_number}', response_model=schemas_contacts.ContactResponce)
+async def read_contact_by_phone(phone_number: str, fields: tuple | None = Depends(parse_fields),
+                                db: Session = Depends(get_db),
+                                current_user: User = Depends(service_auth.get_current_user)):
+    """
+    The read_contact_by_phone function returns the contact a phone number belongs to, e.g. for caller ID.
+        The number may be written in any form normalize_phone accepts, it is looked up in E.164.
+    
+    :param phone_number: str: The phone number, e.g. +380501234567 or 050 123 45 67
+    :param fields: tuple | None: Fields asked for with ?fields=, only these columns are selected and returned
+    :param db: Session: Pass the database session to the function
+    :param current_user: User: Get the user information from the database
+    :return: A contact object
+    """
+    try:
+        phone_number = normalize_phone(phone_number)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
+    if fields or settings.fast_json_responses:
+        row = await repository_contacts.get_contact_row(Contact.phone_number, phone_number, current_user, db, fields)
+        return row_response(row, fields)
+    contact = await repository_contacts.get_contact_by_phone(phone_number, current_user, db)
+    return contact
+
 # adding a form ContactModel so user can create new contact by filling this form
 @router.post('/', response_model=schemas_contacts.ContactResponce, status_code=status.HTTP_201_CREATED,
                   description='No more than 3 contacts each 10 seconds',)
-                #   dependencies = [Depends(RateLimiter(times=3, seconds=10))])
+                #   dependencies = [Depends(RateLimit(times=3, seconds=10))])
 async def create_contact(body: schemas_contacts.ContactModel, db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
     """
@@ -165,7 +426,7 @@ async def create_contact(body: schemas_contacts.ContactModel, db: Session = Depe
 @router.patch('/first_name/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                           description='No more than 3 requests each 4 seconds',
                                           status_code=status.HTTP_202_ACCEPTED,)
-                                        #   dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                        #   dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_firstname(body: schemas_contacts.ContactFirstNameUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -186,7 +447,7 @@ async def update_contact_firstname(body: schemas_contacts.ContactFirstNameUpdate
 
 @router.patch('/last_name/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                          description='No more than 3 requests each 4 seconds',
-                                         dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                         dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_lastname(body: schemas_contacts.ContactLastNameUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -210,7 +471,7 @@ async def update_contact_lastname(body: schemas_contacts.ContactLastNameUpdate,
 
 @router.patch('/email/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                      description='No more than 3 requests each 4 seconds',
-                                     dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                     dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_email(body: schemas_contacts.ContactEmailUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -231,7 +492,7 @@ async def update_contact_email(body: schemas_contacts.ContactEmailUpdate, contac
 
 @router.patch('/phone/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                      description='No more than 3 requests each 4 seconds',
-                                     dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                     dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_phone(body: schemas_contacts.ContactPhoneUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -255,7 +516,7 @@ async def update_contact_phone(body: schemas_contacts.ContactPhoneUpdate, contac
 
 @router.patch('/birthdate/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                          description='No more than 3 requests each 4 seconds',              
-                                         dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                         dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_birthdate(body: schemas_contacts.ContactBirthdateUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -280,7 +541,7 @@ async def update_contact_birthdate(body: schemas_contacts.ContactBirthdateUpdate
 
 @router.patch('/description/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                            description='No more than 3 requests each 4 seconds',
-                                           dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                           dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def update_contact_description(body: schemas_contacts.ContactDescriptionUpdate, contact_id: int = Path(ge=1), 
                          db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
@@ -305,7 +566,7 @@ async def update_contact_description(body: schemas_contacts.ContactDescriptionUp
 @router.delete('/{contact_id}', response_model=schemas_contacts.ContactResponce,
                                 description='No more than 3 requests each 4 seconds',
                                 status_code=status.HTTP_202_ACCEPTED,)
-                                # dependencies = [Depends(RateLimiter(times=3, seconds=4))])
+                                # dependencies = [Depends(RateLimit(times=3, seconds=4))])
 async def remove_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db),
                          current_user: User = Depends(service_auth.get_current_user)):
     """
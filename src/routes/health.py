@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Response, status
+
+from src.services.lifespan import app_state
+
+router = APIRouter(tags=['health'])
+
+
+@router.get('/live')
+async def live():
+    """
+    The live function tells that the worker is running and its event loop answers.
+    
+    :return: A dict
+    """
+    return {'status': 'alive'}
+
+
+@router.get('/ready')
+async def ready(response: Response):
+    """
+    The ready function tells whether the worker should get traffic: it answers 200 once the database,
+        Redis, the rate limiter and the mail sender are warmed up, and 503 before that and while draining.
+    
+    :param response: Response: Set the status code
+    :return: A dict with the status and the result of every check
+    """
+    if not app_state.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    status_name = 'draining' if app_state.stopping or app_state.draining else 'ready' if app_state.ready else 'starting'
+    return {'status': status_name, 'checks': app_state.checks, 'in_flight': app_state.in_flight}
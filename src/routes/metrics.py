@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Response
+
+from src.services.admin import require_admin
+from src.services.metrics import REGISTRY, CONTENT_TYPE
+
+router = APIRouter(tags=['metrics'], dependencies=[Depends(require_admin)])
+
+
+@router.get('/metrics', include_in_schema=False)
+async def read_metrics():
+    """
+    The read_metrics function returns the metrics of this worker in the Prometheus text format.
+        Like the admin routes it needs the X-Admin-Token header.
+    
+    :return: The metrics
+    """
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Path
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import service_auth
+from src.services import avatars as service_avatars
+from src.services.etag import etag_matches
 from src.conf.config import settings
 from src.schemas.users import UserResponce
 
@@ -30,7 +31,8 @@ async def read_users_me(current_user: User = Depends(service_auth.get_current_us
 
 
 @router.patch('/avatar', response_model=UserResponce)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(service_auth.get_current_user),
+async def update_avatar_user(request: Request, file: UploadFile = File(),
+                             current_user: User = Depends(service_auth.get_current_user),
                              db: Session = Depends(get_db)):
     """
     The update_avatar_user function updates the avatar of a user.
@@ -38,12 +40,24 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
             file (UploadFile): The image to be uploaded as an avatar.
             current_user (User): The user whose avatar is being updated.
             db (Session): A database session for interacting with the database.
+        With the local avatar backend the image is resized in-house and served by read_avatar,
+        otherwise it is uploaded to Cloudinary.
     
+    :param request: Request: Build the url of the stored avatar
     :param file: UploadFile: Get the file from the request
     :param current_user: User: Get the current user from the database
     :param db: Session: Pass the database session to the repository layer
     :return: The updated user
     """
+    if settings.avatar_backend == 'local':
+        data = await file.read(settings.avatar_max_bytes + 1)
+        filename = await service_avatars.store_avatar(data)
+        src_url = str(request.url_for('read_avatar', filename=filename))
+        user = await repository_users.update_avatar(current_user.email, src_url, db)
+        return user
+    import cloudinary
+    import cloudinary.uploader
+
     cloudinary.config(
         cloud_name=settings.cloudinary_name,
         api_key=settings.cloudinary_api_key,
@@ -54,4 +68,25 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     src_url = cloudinary.CloudinaryImage(f'ContactsApp/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
-    return user
\ No newline at end of file
+    return user
+
+
+@router.get('/avatar/{filename}', response_class=FileResponse)
+async def read_avatar(request: Request, filename: str = Path(regex=r'^[0-9a-f]{64}\.(webp|jpg)$')):
+    """
+    The read_avatar function serves an avatar rendered by the local avatar pipeline.
+        Files are named after their content hash and never change, so the hash is used as a strong ETag
+        and clients may cache the file for a year. A matching If-None-Match header gets 304 Not Modified.
+    
+    :param request: Request: Read the If-None-Match header
+    :param filename: str: Name of the avatar file, digest plus extension
+    :return: The avatar image
+    """
+    digest, extension = filename.split('.')
+    headers = {'ETag': f'"{digest}"', 'Cache-Control': service_avatars.CACHE_CONTROL}
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    path = service_avatars.avatar_path(filename)
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Avatar does not exist')
+    return FileResponse(path, media_type=service_avatars.MEDIA_TYPES[extension], headers=headers)
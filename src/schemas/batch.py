@@ -0,0 +1,26 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class BatchItem(BaseModel):
+    method: str = Field(default='GET', regex='^(GET|POST|PUT|PATCH|DELETE)$')
+    path: str = Field(min_length=1, max_length=2000, default='/api/contacts/')
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(min_items=1)
+    atomic: bool = False
+
+
+class BatchItemResponse(BaseModel):
+    status: int
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResponse]
+    committed: bool
@@ -1,14 +1,34 @@
-from datetime import date
-from pydantic import BaseModel, Field, EmailStr
+from datetime import date, datetime
+from typing import List
+
+from pydantic import BaseModel, Field, EmailStr, conint, validator
+
+from src.services.phones import MIN_DIGITS, normalize_phone
+
+# the shortest number normalize_phone accepts, written in E.164; responses have to allow every stored number
+PHONE_MIN_LENGTH = MIN_DIGITS + 1
+
+
+def normalize_optional_phone(number: str | None) -> str | None:
+    """
+    The normalize_optional_phone function normalizes the phone number of a model where it may be left out;
+        None stays None, meaning no filter or no change.
+
+    :param number: str | None: The phone number as typed, or None
+    :return: The number in E.164, or None
+    """
+    return None if number is None else normalize_phone(number)
 
 
 class ContactModel(BaseModel):
     first_name: str = Field(min_length=3, max_length=50, default='contact firstname')
     last_name: str = Field(min_length=3, max_length=60, default='contact lastname')
     email: EmailStr = Field(default='example@mail.com')
-    phone_number: str = Field(min_length=10, max_length=20, default='+38 (000) 000 00 00')
+    phone_number: str = Field(min_length=PHONE_MIN_LENGTH, max_length=20, default='+380000000000')
     birth_date: date
     description: str = Field(max_length=300,  default='some additional info, not required')
+
+    _normalize_phone = validator('phone_number', allow_reuse=True)(normalize_phone)
   
 
 class ContactResponce(BaseModel):
@@ -16,7 +36,7 @@ class ContactResponce(BaseModel):
     first_name: str = Field(min_length=3, max_length=50)
     last_name: str = Field(min_length=3, max_length=60)
     email: EmailStr
-    phone_number: str = Field(min_length=10, max_length=20)
+    phone_number: str = Field(min_length=PHONE_MIN_LENGTH, max_length=20)
     birth_date: date
     description: str = Field(max_length=300)
 
@@ -24,6 +44,65 @@ class ContactResponce(BaseModel):
         orm_mode = True
 
 
+class ContactChange(ContactResponce):
+    updated_at: datetime
+    deleted_at: datetime | None = None
+
+
+class ContactChanges(BaseModel):
+    changes: List[ContactChange]
+    next: str | None = None
+    has_more: bool = False
+
+
+class ContactBatchGet(BaseModel):
+    ids: List[conint(ge=1)] = Field(min_items=1)
+
+
+class ContactBatch(BaseModel):
+    contacts: List[ContactResponce]
+    missing: List[int]
+
+
+class ContactFilter(BaseModel):
+    last_name: str | None = Field(default=None, min_length=3, max_length=60)
+    email: EmailStr | None = None
+    phone_number: str | None = Field(default=None, min_length=PHONE_MIN_LENGTH, max_length=20)
+    birth_date: date | None = None
+    updated_before: datetime | None = None
+
+    _normalize_phone = validator('phone_number', allow_reuse=True)(normalize_optional_phone)
+
+
+class ContactBulkDelete(BaseModel):
+    ids: List[conint(ge=1)] | None = Field(default=None, min_items=1)
+    filter: ContactFilter | None = None
+
+
+class ContactBulkValues(BaseModel):
+    last_name: str | None = Field(default=None, min_length=3, max_length=60)
+    email: EmailStr | None = None
+    phone_number: str | None = Field(default=None, min_length=PHONE_MIN_LENGTH, max_length=20)
+    birth_date: date | None = None
+    description: str | None = Field(default=None, max_length=300)
+
+    _normalize_phone = validator('phone_number', allow_reuse=True)(normalize_optional_phone)
+
+
+class ContactBulkUpdate(BaseModel):
+    ids: List[conint(ge=1)] = Field(min_items=1)
+    values: ContactBulkValues
+
+
+class ContactBulkResult(BaseModel):
+    affected: int
+    ids: List[int]
+
+
+# column names of a contact in the order ContactResponce returns them, used by the row based responses
+CONTACT_FIELDS = tuple(ContactResponce.__fields__)
+
+
 class ContactFirstNameUpdate(BaseModel):
     first_name: str = Field(min_length=3, max_length=50) 
 
@@ -37,7 +116,9 @@ class ContactEmailUpdate(BaseModel):
 
 
 class ContactPhoneUpdate(BaseModel):
-    phone_number: str = Field(min_length=10, max_length=20)
+    phone_number: str = Field(min_length=PHONE_MIN_LENGTH, max_length=20)
+
+    _normalize_phone = validator('phone_number', allow_reuse=True)(normalize_phone)
 
 
 class ContactBirthdateUpdate(BaseModel):
@@ -0,0 +1,30 @@
+import secrets
+
+from fastapi import Header, HTTPException, status
+
+from src.conf.config import settings
+
+
+def is_admin_token(token: str | None) -> bool:
+    """
+    The is_admin_token function checks a token against the admin token from the settings in constant time.
+        With no admin token configured nothing is accepted.
+    
+    :param token: str | None: The token sent by the client
+    :return: True if the token is the admin token
+    """
+    if not settings.admin_token or not token:
+        return False
+    return secrets.compare_digest(token.encode(), settings.admin_token.encode())
+
+
+async def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    """
+    The require_admin function is a dependency for the admin routes.
+        It raises HTTPException 403 unless the X-Admin-Token header carries the admin token.
+    
+    :param x_admin_token: str | None: Value of the X-Admin-Token header
+    :return: None
+    """
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Admin token required')
@@ -1,17 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
 import pickle
+import time
 
 import redis.asyncio as redis
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer  # Bearer token
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
 from src.repository import users as repository_auth
-from src.database.db import get_db
+from src.database.db import SessionLocal, get_db
 from src.conf.config import settings
+from src.services.metrics import USER_CACHE, PASSWORD_HASH_QUEUE, PASSWORD_HASH_DURATION
+from src.services.singleflight import CACHE_EARLY_REFRESH, SingleFlight, should_refresh_early
 
 
 class Auth:
@@ -19,7 +24,9 @@ class Auth:
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
-    r_cashe = redis.Redis(host='localhost', port=6379, db=0)
+    r_cashe = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix='bcrypt')
+    user_loads = SingleFlight('user')
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -45,6 +52,50 @@ class Auth:
         """
         return self.pwd_context.hash(password)
 
+    async def _run_hashing(self, operation: str, func, *args):
+        """
+        The _run_hashing function runs a bcrypt call in the hashing thread pool, so it does not block the event loop.
+            It records how long the call waited for a free thread and how long the hashing itself took.
+        
+        :param self: Represent the instance of the class
+        :param operation: str: Name of the operation for the metrics, hash or verify
+        :param func: The function to run
+        :param args: Arguments of the function
+        :return: The result of the function
+        """
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            PASSWORD_HASH_QUEUE.labels(operation).observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+        return await asyncio.get_running_loop().run_in_executor(self.hash_executor, timed)
+
+    async def verify_password_async(self, plain_password, hashed_password):
+        """
+        The verify_password_async function is verify_password run in the hashing thread pool.
+        
+        :param self: Represent the instance of the class
+        :param plain_password: Pass the password that is being checked
+        :param hashed_password: Compare the hashed password in the database with a plain text password
+        :return: A boolean value
+        """
+        return await self._run_hashing('verify', self.verify_password, plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password: str):
+        """
+        The get_password_hash_async function is get_password_hash run in the hashing thread pool.
+        
+        :param self: Represent the instance of the class
+        :param password: str: Get the password from the user
+        :return: A hashed password
+        """
+        return await self._run_hashing('hash', self.get_password_hash, password)
+
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
         The create_access_token function creates a new access token for the user.
@@ -86,17 +137,22 @@ class Auth:
         return encoded_refresh_token
 
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db),
+                               request: Request = None):
         """
         The get_current_user function is a dependency that will be used in the UserResource class.
         It takes an access token as input and returns the user object associated with it.
         If no user is found, it raises an HTTPException.
+        A request run by POST /api/batch gets the user the batch was authenticated as, without checking the token again.
         
         :param self: Access the class attributes and methods
         :param token: str: Get the token from the request header
         :param db: Session: Get the database session
+        :param request: Request: Read the user of the batch the request is part of
         :return: A user object
         """
+        if request is not None and getattr(request.state, 'user', None) is not None:
+            return request.state.user
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -114,17 +170,81 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = await self.r_cashe.get(f'user: {email}')
-        if user is None:
-            user = await repository_auth.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            await self.r_cashe.set(f'user: {email}', pickle.dumps(user))
-            await self.r_cashe.expire(f'user: {email}', 900)
+        key = f'user: {email}'
+        cached = await self.r_cashe.get(key)
+        if cached is not None:
+            user, delta, expiry = self._unpack_user(cached)
+            if not should_refresh_early(delta, expiry, settings.cache_early_refresh_beta):
+                USER_CACHE.labels('hit').inc()
+                return user
+            CACHE_EARLY_REFRESH.labels('user').inc()
         else:
-            user = pickle.loads(user)
+            USER_CACHE.labels('miss').inc()
+        if settings.cache_single_flight:
+            cached = await self.user_loads.do(key, lambda: self._load_user(email, db))
+        else:
+            cached = await self._load_user(email, db)
+        if cached is None:
+            raise credentials_exception
+        # every caller of a shared load gets its own copy of the user
+        user, _, _ = self._unpack_user(cached)
         return user
 
+    async def _load_user(self, email: str, db: Session | None) -> bytes | None:
+        """
+        The _load_user function reads a user from the database and caches it for user_cache_ttl seconds,
+            together with how long the read took and when the entry expires, which get_current_user
+            needs to refresh it early.
+            The read uses a session of its own on the same database as db: the load may be shared by
+            several requests and outlive the one that started it, whose session is closed when it ends.
+        
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :param db: Session | None: Session of the request, tells which database to read
+        :return: The cache entry, or None if there is no such user
+        """
+        session = SessionLocal() if db is None else Session(bind=db.get_bind())
+        try:
+            started = time.perf_counter()
+            user = await repository_auth.get_user_by_email(email, session)
+            if user is None:
+                return None
+            delta = time.perf_counter() - started
+        finally:
+            session.close()
+        ttl = settings.user_cache_ttl
+        cached = pickle.dumps((user, delta, time.time() + ttl))
+        await self.r_cashe.set(f'user: {email}', cached, ex=ttl)
+        return cached
+
+    @staticmethod
+    def _unpack_user(cached: bytes) -> tuple:
+        value = pickle.loads(cached)
+        if isinstance(value, tuple):
+            return value
+        # entries cached before the load time was stored are never refreshed early
+        return value, 0.0, 0.0
+
+
+    def token_subject(self, authorization: str | None) -> str | None:
+        """
+        The token_subject function tells whom the Authorization header of a request belongs to,
+            without loading the user: the email of a valid access token.
+
+        :param self: Represent the instance of the class
+        :param authorization: str | None: Value of the Authorization header
+        :return: The email the access token was issued to, or None without a valid bearer access token
+        """
+        scheme, _, token = (authorization or '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return None
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get("scope") != "access_token":
+            return None
+        return payload.get("sub")
 
     async def decode_refresh_token(self, refresh_token: str):
         """
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+
+# bump when the rendering below changes, so old files are not served for new uploads
+PIPELINE_VERSION = 1
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+MEDIA_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def render_avatar(data: bytes, size: int, image_format: str) -> bytes:
+    """
+    The render_avatar function decodes an uploaded image once and renders a square avatar from it.
+        JPEG sources are decoded straight at a reduced scale (draft mode), EXIF rotation is applied,
+        and the image is cropped to the center and resized to size x size.
+        It runs in a worker process, so it only takes and returns plain bytes.
+
+    :param data: bytes: Raw bytes of the uploaded image
+    :param size: int: Width and height of the avatar in pixels
+    :param image_format: str: Pillow format name of the result, WEBP or JPEG
+    :return: The encoded avatar
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img)
+        keep_alpha = image_format == 'WEBP' and img.mode in ('RGBA', 'LA', 'P')
+        img = img.convert('RGBA' if keep_alpha else 'RGB')
+        img = ImageOps.fit(img, (size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format=image_format, quality=85)
+    return out.getvalue()
+
+
+def avatar_digest(data: bytes) -> str:
+    """
+    The avatar_digest function returns the content hash the rendered avatar is stored under.
+        The hash covers the uploaded bytes and the rendering parameters, so identical uploads
+        map to the same file and never get resized twice.
+
+    :param data: bytes: Raw bytes of the uploaded image
+    :return: A hex sha256 digest
+    """
+    params = f'{PIPELINE_VERSION}:{settings.avatar_size}:{settings.avatar_format}:'.encode()
+    return hashlib.sha256(params + data).hexdigest()
+
+
+def avatar_path(filename: str) -> Path:
+    """
+    The avatar_path function returns the location of a stored avatar file.
+        Files are spread over subdirectories named after the first two characters of the digest.
+
+    :param filename: str: Name of the avatar file, digest plus extension
+    :return: The path of the file
+    """
+    return Path(settings.avatar_dir) / filename[:2] / filename
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    The get_executor function returns the process pool used for resizing, creating it on first use.
+
+    :return: The process pool
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.avatar_workers)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """
+    The shutdown_executor function stops the resize process pool if it was started.
+
+    :return: None
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def store_avatar(data: bytes) -> str:
+    """
+    The store_avatar function renders an uploaded image and stores it under its content hash.
+        If a file for the same upload already exists, nothing is decoded or written.
+        The CPU-bound rendering runs in a process pool so the event loop is not blocked.
+
+    :param data: bytes: Raw bytes of the uploaded image
+    :return: The file name of the stored avatar
+    """
+    if len(data) > settings.avatar_max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail='Avatar file is too large')
+    filename = f'{avatar_digest(data)}.{EXTENSIONS[settings.avatar_format]}'
+    path = avatar_path(filename)
+    if path.exists():
+        return filename
+    # Pillow is only loaded once an avatar is uploaded; the exceptions raised in the pool are its own
+    from PIL import Image
+
+    loop = asyncio.get_running_loop()
+    try:
+        rendered = await loop.run_in_executor(get_executor(), render_avatar, data,
+                                              settings.avatar_size, settings.avatar_format)
+    except (Image.DecompressionBombError, OSError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid image file')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_path.write_bytes(rendered)
+    os.replace(tmp_path, path)
+    return filename
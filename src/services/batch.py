@@ -0,0 +1,200 @@
+import logging
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+
+import orjson
+from fastapi import Request
+from sqlalchemy.orm import Session
+from starlette.middleware.exceptions import ExceptionMiddleware
+
+from src.middleware.metrics import route_template
+from src.services.cache import service_cache
+from src.services.events import broker
+from src.services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# the routes a batch can call; the event stream never ends, so it cannot be part of one
+BATCH_PATHS = ('/api/contacts', '/api/users')
+UNBATCHED_PATHS = ('/api/contacts/events',)
+
+# (user id, event) of the contacts changed by the atomic batch being run, published once it commits
+pending_events: ContextVar[list | None] = ContextVar('pending_events', default=None)
+
+BATCH_SUBREQUESTS = Counter('batch_subrequests_total', 'Requests run inside POST /api/batch.', ('route', 'status'))
+
+
+def batchable(path: str) -> bool:
+    """
+    The batchable function tells whether a path can be called from a batch.
+
+    :param path: str: Path of the request, with or without a query string
+    :return: True if the path belongs to one of BATCH_PATHS
+    """
+    path = path.partition('?')[0]
+    if any(path == prefix or path.startswith(prefix + '/') for prefix in UNBATCHED_PATHS):
+        return False
+    return any(path == prefix or path.startswith(prefix + '/') for prefix in BATCH_PATHS)
+
+
+class Batch:
+    """
+    Runs the requests of one POST /api/batch, in order, in the worker that received it. They are dispatched
+    to the routers of the app without going through the middleware again, which already ran for the batch.
+    Every request gets the user the batch was authenticated as and the database session of the batch.
+
+    In an atomic batch the requests share one transaction: the commits of the routes only flush, the first request
+    answered with an error status stops the batch, and the transaction is committed only if all of them succeeded.
+    Events of the changed contacts are published after the commit, so streams never see a change that was rolled back.
+    """
+
+    def __init__(self, request: Request, user, db: Session, atomic: bool = False):
+        self.parent = request.scope
+        self.user = user
+        self.db = db
+        self.atomic = atomic
+        app = request.app
+        handlers = {key: value for key, value in app.exception_handlers.items() if key not in (500, Exception)}
+        self.handler = ExceptionMiddleware(app.router, handlers=handlers)
+        self.authorization = request.headers.get('authorization')
+
+    async def run(self, requests: list) -> dict:
+        """
+        The run function runs the requests and returns their responses in the same order.
+
+        :param self: Represent the instance of the class
+        :param requests: list: The BatchItem objects to run
+        :return: A dict with the responses and whether their changes were committed
+        """
+        if not self.atomic:
+            responses = [await self.call(item, self.db) for item in requests]
+            return {'responses': responses, 'committed': True}
+
+        session = Session(bind=self.db.connection(), autoflush=False, join_transaction_mode='rollback_only')
+        pending = []
+        token = pending_events.set(pending)
+        responses = []
+        failed = committed = False
+        try:
+            for item in requests:
+                if failed:
+                    responses.append({'status': 424, 'headers': {},
+                                      'body': {'detail': 'Not run, an earlier request of the batch failed'}})
+                    continue
+                response = await self.call(item, session)
+                responses.append(response)
+                failed = response['status'] >= 400
+            if failed:
+                self.db.rollback()
+            else:
+                self.db.commit()
+                committed = True
+        except BaseException:
+            self.db.rollback()
+            raise
+        finally:
+            pending_events.reset(token)
+            session.close()
+            await self.publish(pending, committed)
+        return {'responses': responses, 'committed': committed}
+
+    async def publish(self, pending: list, committed: bool) -> None:
+        """
+        The publish function runs what the changes of an atomic batch held back. The generation of every user
+        whose contacts changed moves forward again, since a read of the batch may have cached uncommitted contacts,
+        and the events are published if the changes were committed.
+
+        :param self: Represent the instance of the class
+        :param pending: list: (user id, event) of every change made by the batch
+        :param committed: bool: Whether the transaction was committed
+        :return: None
+        """
+        events = defaultdict(list)
+        for user_id, event in pending:
+            events[user_id].append(event)
+        for user_id, messages in events.items():
+            await service_cache.bump_generation(user_id)
+            if committed:
+                await broker.publish_many(user_id, messages)
+
+    async def call(self, item, db: Session) -> dict:
+        """
+        The call function runs one request of the batch through the routers of the app.
+            An exception the routes do not handle becomes a 500 response of that request only;
+            outside an atomic batch the session is rolled back so the following requests can still use it.
+
+        :param self: Represent the instance of the class
+        :param item: BatchItem: Method, path, headers and JSON body of the request
+        :param db: Session: Session the request uses
+        :return: A dict with the status, headers and body of the response
+        """
+        path, _, query = item.path.partition('?')
+        body = b'' if item.body is None else orjson.dumps(item.body)
+        headers = {name.lower(): value for name, value in item.headers.items()}
+        if self.authorization is not None:
+            headers['authorization'] = self.authorization
+        if item.body is not None:
+            headers['content-type'] = 'application/json'
+        headers['content-length'] = str(len(body))
+        scope = {
+            'type': 'http',
+            'asgi': self.parent.get('asgi', {'version': '3.0'}),
+            'http_version': self.parent.get('http_version', '1.1'),
+            'method': item.method.upper(),
+            'scheme': self.parent.get('scheme', 'http'),
+            'server': self.parent.get('server'),
+            'client': self.parent.get('client'),
+            'root_path': self.parent.get('root_path', ''),
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+            'app': self.parent['app'],
+            'state': {'user': self.user, 'db': db},
+        }
+        response = {'status': 500, 'headers': {}, 'chunks': []}
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {'type': 'http.disconnect'}
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.decode('latin-1'): value.decode('latin-1')
+                                       for name, value in message.get('headers', ())}
+            elif message['type'] == 'http.response.body':
+                response['chunks'].append(message.get('body', b''))
+
+        try:
+            # closes the dependencies with yield, what AsyncExitStackMiddleware does for requests from a client
+            async with AsyncExitStack() as stack:
+                scope['fastapi_astack'] = stack
+                await self.handler(scope, receive, send)
+        except Exception:
+            logger.exception('Request %s %s of a batch failed', scope['method'], path)
+            if not self.atomic:
+                db.rollback()
+            response = {'status': 500, 'headers': {'content-type': 'application/json'},
+                        'chunks': [b'{"detail":"Internal Server Error"}']}
+        BATCH_SUBREQUESTS.labels(route_template(scope), str(response['status'])).inc()
+        return {'status': response['status'], 'headers': self._headers(response['headers']),
+                'body': self._body(response['headers'], b''.join(response['chunks']))}
+
+    @staticmethod
+    def _headers(headers: dict) -> dict:
+        headers.pop('content-length', None)
+        return headers
+
+    @staticmethod
+    def _body(headers: dict, content: bytes):
+        if not content:
+            return None
+        if headers.get('content-type', '').startswith('application/json'):
+            return orjson.loads(content)
+        return content.decode(errors='replace')
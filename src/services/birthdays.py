@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas.contacts import CONTACT_FIELDS
+from src.services.cache import service_cache
+from src.services.metrics import Counter
+from src.services.serializers import dump_rows
+
+logger = logging.getLogger(__name__)
+
+BIRTHDAY_DIGEST_RUNS = Counter('birthday_digest_runs_total', 'Runs of the daily birthday digest.', ('result',))
+
+# users whose pages are written to Redis in one round trip
+CHUNK_SIZE = 500
+# the pages of a day outlive its midnight a little, for requests still using the date they started with
+TTL_MARGIN = 300
+
+
+def birthdays_page(day: date, fields=None) -> str:
+    """
+    The birthdays_page function names the cached response of /api/contacts/birthdays for a day.
+
+    :param day: date: The day the birthdays are counted from
+    :param fields: Fields asked for with ?fields=, None for all of them
+    :return: The name passed to read_through
+    """
+    return f'birthdays:{day.isoformat()}:{",".join(fields or ())}'
+
+
+def seconds_until(moment: datetime, now: datetime) -> float:
+    return max((moment - now).total_seconds(), 0.0)
+
+
+async def run_digest(db: Session, today: date | None = None, send_emails: bool = False,
+                     progress: dict | None = None) -> dict:
+    """
+    The run_digest function computes the birthdays of the next birthdays_days days for all users with one query
+        and stores them in Redis where /api/contacts/birthdays looks for them, so the route only reads a key.
+        Users without birthdays get an empty list, which saves their query too.
+        The generations are read before the contacts: a contact changed in between moves its user's generation on,
+        and the page written under the old one is never read.
+
+    :param db: Session: Access the database
+    :param today: date | None: The day the digest is for, today if None
+    :param send_emails: bool: Also email every confirmed user who has birthdays coming up
+    :param progress: dict | None: Kept up to date with the emails sent so far, for a caller whose run failed
+    :return: A dict with the date, the number of users, contacts and emails sent
+    """
+    today = today or date.today()
+    progress = {} if progress is None else progress
+    progress['emails'] = 0
+    users = db.query(User.id, User.email, User.username, User.confirmed).order_by(User.id).all()
+    generations = {}
+    for offset in range(0, len(users), CHUNK_SIZE):
+        generations.update(await service_cache.get_generations([user.id for user in users[offset:offset + CHUNK_SIZE]]))
+
+    rows = await repository_contacts.get_all_birthdays_rows(today + timedelta(days=1), settings.birthdays_days, db)
+    birthdays = defaultdict(list)
+    for row in rows:
+        birthdays[row[0]].append(tuple(row[1:]))
+
+    name = birthdays_page(today)
+    midnight = datetime.combine(today + timedelta(days=1), time())
+    ttl = int(seconds_until(midnight, datetime.now())) + TTL_MARGIN
+    for offset in range(0, len(users), CHUNK_SIZE):
+        pages = {service_cache.page_key(user.id, generations[user.id], name): dump_rows(birthdays.get(user.id, ()))
+                 for user in users[offset:offset + CHUNK_SIZE]}
+        await service_cache.write_pages(pages, ttl)
+
+    if send_emails:
+        from src.services.email import send_birthday_digest
+
+        for user in users:
+            if user.confirmed and birthdays.get(user.id):
+                contacts = [dict(zip(CONTACT_FIELDS, row)) for row in birthdays[user.id]]
+                await send_birthday_digest(user.email, user.username, contacts)
+                progress['emails'] += 1
+    return {'date': today.isoformat(), 'users': len(users), 'contacts': len(rows), 'emails': progress['emails']}
+
+
+class DigestScheduler:
+    """
+    Runs the birthday digest every day at birthday_digest_hour, and once when the worker starts if today's digest
+    was not made yet. Every worker runs a scheduler; a Redis key taken with SET NX lets only one of them run a day.
+    """
+
+    def __init__(self):
+        self._task = None
+
+    def start(self) -> None:
+        if settings.birthday_digest_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self, today: date) -> dict | None:
+        """
+        The run_once function runs the digest of a day unless a worker already did.
+            If the run fails before any email went out, the day's key is released so the next worker that starts
+            tries again; once emails were sent it is kept, a second run would send them twice.
+
+        :param self: Represent the instance of the class
+        :param today: date: The day to run the digest for
+        :return: The summary of the run, or None if another worker ran it
+        """
+        from src.database.db import SessionLocal
+
+        key = f'birthday_digest: {today.isoformat()}'
+        if not await service_cache.r_cashe.set(key, os.getpid(), nx=True, ex=2 * 86400):
+            return None
+        db = SessionLocal()
+        progress = {'emails': 0}
+        try:
+            summary = await run_digest(db, today, settings.birthday_digest_emails, progress)
+        except BaseException:
+            if progress['emails']:
+                logger.error('Birthday digest of %s stopped after %d emails, it is not retried today',
+                             today.isoformat(), progress['emails'])
+            else:
+                await service_cache.r_cashe.delete(key)
+            raise
+        finally:
+            db.close()
+        BIRTHDAY_DIGEST_RUNS.labels('done').inc()
+        logger.info('Birthday digest of %s: %d users, %d contacts, %d emails',
+                    summary['date'], summary['users'], summary['contacts'], summary['emails'])
+        return summary
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now()
+            if now.hour >= settings.birthday_digest_hour:
+                try:
+                    await self.run_once(now.date())
+                except Exception:
+                    # whatever failed, the scheduler has to live on to run tomorrow's digest
+                    BIRTHDAY_DIGEST_RUNS.labels('failed').inc()
+                    logger.exception('Birthday digest failed')
+                next_run = datetime.combine(now.date() + timedelta(days=1), time(settings.birthday_digest_hour))
+            else:
+                next_run = datetime.combine(now.date(), time(settings.birthday_digest_hour))
+            await asyncio.sleep(seconds_until(next_run, datetime.now()))
+
+
+digest_scheduler = DigestScheduler()
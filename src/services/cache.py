@@ -0,0 +1,163 @@
+import logging
+import time
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.metrics import CONTACTS_PAGE_CACHE
+from src.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    r_cashe = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    page_loads = SingleFlight('contacts_page')
+
+    async def get_generation(self, user_id: int) -> int | None:
+        """
+        The get_generation function returns the current contacts generation of a user.
+            The generation changes every time one of the user's contacts is created, updated or deleted.
+            A missing counter is started from the current time in nanoseconds rather than from zero,
+            so a flushed or restarted Redis never hands out a generation a client has already seen.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contacts
+        :return: The generation, or None if Redis is unavailable
+        """
+        key = f'contacts_generation: {user_id}'
+        try:
+            generation = await self.r_cashe.get(key)
+            if generation is None:
+                await self.r_cashe.set(key, time.time_ns(), nx=True)
+                generation = await self.r_cashe.get(key)
+        except (RedisError, OSError) as err:
+            logger.warning('Could not read contacts generation: %s', err)
+            return None
+        return int(generation)
+
+    async def bump_generation(self, user_id: int) -> None:
+        """
+        The bump_generation function moves the contacts generation of a user forward.
+            It has to be called after the change is committed, otherwise a concurrent reader
+            could tag the old rows with the new generation.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contacts
+        :return: None
+        """
+        key = f'contacts_generation: {user_id}'
+        try:
+            await self.r_cashe.set(key, time.time_ns(), nx=True)
+            await self.r_cashe.incr(key)
+        except (RedisError, OSError) as err:
+            logger.warning('Could not bump contacts generation: %s', err)
+
+    async def contacts_etag(self, user_id: int) -> str | None:
+        """
+        The contacts_etag function derives the ETag of a user's contacts from their generation.
+            It is a weak ETag because the same data may be sent with different content encodings.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contacts
+        :return: The ETag, or None if the generation is unknown
+        """
+        return self.etag(user_id, await self.get_generation(user_id))
+
+    @staticmethod
+    def etag(user_id: int, generation: int | None) -> str | None:
+        """
+        The etag function formats the ETag of a user's contacts for a generation already read,
+            for routes that use the generation for more than the ETag.
+
+        :param user_id: int: Id of the user who owns the contacts
+        :param generation: int | None: Contacts generation of the user
+        :return: The ETag, or None if the generation is unknown
+        """
+        if generation is None:
+            return None
+        return f'W/"contacts-{user_id}-{generation}"'
+
+    @staticmethod
+    def page_key(user_id: int, generation: int, name: str) -> str:
+        return f'contacts_page: {user_id}:{generation}:{name}'
+
+    async def get_generations(self, user_ids: list) -> dict:
+        """
+        The get_generations function is get_generation for many users at once, in one round trip to Redis.
+            Unlike get_generation it raises the Redis error, for jobs that cannot do without.
+
+        :param self: Represent the instance of the class
+        :param user_ids: list: Ids of the users
+        :return: The generation of every user, by user id
+        """
+        keys = [f'contacts_generation: {user_id}' for user_id in user_ids]
+        started = time.time_ns()
+        async with self.r_cashe.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, started, nx=True)
+            for key in keys:
+                pipe.get(key)
+            results = await pipe.execute()
+        return {user_id: int(generation) for user_id, generation in zip(user_ids, results[len(keys):])}
+
+    async def write_pages(self, pages: dict, ttl: int) -> None:
+        """
+        The write_pages function stores responses computed ahead of the requests that read them through read_through,
+            in one round trip to Redis. It raises the Redis error.
+
+        :param self: Represent the instance of the class
+        :param pages: dict: Response bodies by key, made by page_key
+        :param ttl: int: Seconds to keep them
+        :return: None
+        """
+        async with self.r_cashe.pipeline(transaction=False) as pipe:
+            for key, body in pages.items():
+                pipe.set(key, body, ex=ttl)
+            await pipe.execute()
+
+    async def read_through(self, user_id: int, generation: int | None, name: str, load) -> bytes:
+        """
+        The read_through function returns a serialized response of a user's contacts from Redis,
+            or calls load to build it from the database and stores it for the next request.
+            Entries are keyed by the contacts generation, so every write, which moves the generation forward,
+            invalidates all of them at once; the outdated entries expire after contacts_cache_ttl.
+            Concurrent misses of the same entry share one load.
+            Without a generation, when Redis is unavailable, load is called every time.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contacts
+        :param generation: int | None: Current contacts generation of the user
+        :param name: str: Which response it is, e.g. the page and its size
+        :param load: Coroutine function returning the response body as JSON bytes
+        :return: The response body
+        """
+        if generation is None:
+            return await load()
+        page = name.split(':')[0]
+        key = self.page_key(user_id, generation, name)
+        try:
+            body = await self.r_cashe.get(key)
+        except (RedisError, OSError) as err:
+            logger.warning('Could not read cached contacts: %s', err)
+            return await load()
+        if body is not None:
+            CONTACTS_PAGE_CACHE.labels(page, 'hit').inc()
+            return body
+        CONTACTS_PAGE_CACHE.labels(page, 'miss').inc()
+
+        async def fill():
+            body = await load()
+            try:
+                await self.r_cashe.set(key, body, ex=settings.contacts_cache_ttl)
+            except (RedisError, OSError) as err:
+                logger.warning('Could not cache contacts: %s', err)
+            return body
+
+        if settings.cache_single_flight:
+            return await self.page_loads.do(key, fill)
+        return await fill()
+
+
+service_cache = Cache()
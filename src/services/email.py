@@ -1,25 +1,44 @@
+import logging
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import service_auth
 from src.conf.config import settings
+from src.services.metrics import EMAILS_SENT
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=EmailStr(settings.mail_from),
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Kostiantyn Pereimybida",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent.parent / 'templates',
-)
+logger = logging.getLogger(__name__)
+
+_mailer = None
+
+
+def get_mailer():
+    """
+    The get_mailer function returns the mail sender shared by all emails, creating it on first use.
+        fastapi_mail is imported here rather than at the top of the module: it pulls in httpx and jinja2,
+        which workers and scripts that never send an email should not have to load.
+
+    :return: The FastMail instance
+    """
+    global _mailer
+    if _mailer is None:
+        from fastapi_mail import FastMail, ConnectionConfig
+
+        conf = ConnectionConfig(
+            MAIL_USERNAME=settings.mail_username,
+            MAIL_PASSWORD=settings.mail_password,
+            MAIL_FROM=EmailStr(settings.mail_from),
+            MAIL_PORT=settings.mail_port,
+            MAIL_SERVER=settings.mail_server,
+            MAIL_FROM_NAME="Kostiantyn Pereimybida",
+            MAIL_STARTTLS=False,
+            MAIL_SSL_TLS=True,
+            USE_CREDENTIALS=True,
+            VALIDATE_CERTS=True,
+            TEMPLATE_FOLDER=Path(__file__).parent.parent / 'templates',
+        )
+        _mailer = FastMail(conf)
+    return _mailer
 
 
 async def send_email(email: EmailStr, username: str, host: str) -> None:
@@ -36,6 +55,10 @@ async def send_email(email: EmailStr, username: str, host: str) -> None:
     :param host: str: Pass the hostname of the server to be used in the link for email verification
     :return: None
     """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    fm = get_mailer()
     try:
         token_verification = await service_auth.create_email_token({"sub": email})
         message = MessageSchema(
@@ -45,9 +68,10 @@ async def send_email(email: EmailStr, username: str, host: str) -> None:
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
         await fm.send_message(message, template_name="email_template.html")
+        EMAILS_SENT.labels("email_template.html", "sent").inc()
     except ConnectionErrors as err:
+        EMAILS_SENT.labels("email_template.html", "failed").inc()
         print(err)
 
 
@@ -64,6 +88,10 @@ async def send_reset_password_email(email: EmailStr, username: str, host: str) -
     :param host: str: Pass the hostname of the server to the email template
     :return: None
     """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    fm = get_mailer()
     try:
         token_verification = await service_auth.create_email_token({"sub": email})
         message = MessageSchema(
@@ -73,7 +101,36 @@ async def send_reset_password_email(email: EmailStr, username: str, host: str) -
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
         await fm.send_message(message, template_name="reset_password.html")
+        EMAILS_SENT.labels("reset_password.html", "sent").inc()
+    except ConnectionErrors as err:
+        EMAILS_SENT.labels("reset_password.html", "failed").inc()
+        print(err)
+
+
+async def send_birthday_digest(email: EmailStr, username: str, contacts: list) -> None:
+    """
+    The send_birthday_digest function sends the user the list of their contacts whose birthdays are coming up.
+    
+    :param email: EmailStr: Specify the email address of the user
+    :param username: str: Pass the username to the email template
+    :param contacts: list: The contacts as dicts, with first_name, last_name and birth_date
+    :return: None
+    """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    fm = get_mailer()
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays ",
+            recipients=[email],
+            template_body={"username": username, "contacts": contacts},
+            subtype=MessageType.html
+        )
+
+        await fm.send_message(message, template_name="birthday_digest.html")
+        EMAILS_SENT.labels("birthday_digest.html", "sent").inc()
     except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+        EMAILS_SENT.labels("birthday_digest.html", "failed").inc()
+        logger.warning('Birthday digest to %s not sent: %s', email, err)
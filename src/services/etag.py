@@ -0,0 +1,16 @@
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function checks an If-None-Match request header against the current ETag of a resource.
+        The comparison is the weak one required for If-None-Match, so W/"x" and "x" are treated as equal.
+        A wildcard (*) matches any existing representation.
+
+    :param if_none_match: str | None: Value of the If-None-Match request header
+    :param etag: str: Current ETag of the resource, including quotes
+    :return: True if the client already holds the current representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    current = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == current for tag in if_none_match.split(','))
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+import orjson
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.schemas.contacts import CONTACT_FIELDS
+from src.services.metrics import Counter, Gauge
+from src.services.sync import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'contacts_events:'
+
+# put into a subscriber's queue instead of its backlog when it could not keep up
+RESYNC = b'event: resync\ndata: {}\n\n'
+# put into every queue when the worker shuts down; the client reconnects to another worker after retry ms
+CLOSE = b'retry: 1000\n\n'
+HEARTBEAT = b': ping\n\n'
+
+
+def format_event(kind: str, contact) -> bytes:
+    """
+    The format_event function encodes a change of a contact as a Server-Sent Event.
+        The event id is the change feed cursor of the change, so a client that reconnects with Last-Event-ID,
+        or calls /contacts/changes with it, continues right after the last event it received.
+
+    :param kind: str: created, updated or deleted
+    :param contact: Contact: The contact after the change
+    :return: The event, ready to be written to the stream
+    """
+    data = {'type': kind, 'id': contact.id}
+    if kind != 'deleted':
+        data['contact'] = {field: getattr(contact, field) for field in CONTACT_FIELDS}
+    event = b'event: contact\ndata: ' + orjson.dumps(data) + b'\n\n'
+    if contact.updated_at is None:
+        return event
+    return b'id: ' + encode_cursor(contact.updated_at, contact.id).encode() + b'\n' + event
+
+
+def format_cursor(cursor: str) -> bytes:
+    """
+    The format_cursor function encodes a Server-Sent Event that only sets the client's Last-Event-ID.
+        It has no data, so the client does not dispatch it.
+
+    :param cursor: str: The change feed cursor
+    :return: The event, ready to be written to the stream
+    """
+    return b'id: ' + cursor.encode() + b'\n\n'
+
+
+class Subscription:
+    """
+    Events waiting to be sent to one open stream. The queue is bounded: a client that reads slower than
+    its contacts change loses the backlog and gets a resync event, instead of the worker buffering without limit.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message: bytes) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            EVENTS_DROPPED.inc()
+
+    def close(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSE)
+
+
+class Broker:
+    """
+    Fan-out of contact change events to the streams open on this worker.
+
+    With a Redis client, events are published to a channel per user and one pattern subscription per worker
+    receives the events of every worker, so all streams of a user see every change whichever worker made it.
+    The subscription holds its connection for as long as the worker runs, so it gets a client of its own
+    instead of taking a connection from the pool the requests share.
+    Without one the broker is a stand-in that only delivers events within the process.
+    """
+
+    def __init__(self):
+        self.redis = None
+        self.subscriber = None
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    @property
+    def streams(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(settings.events_queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: int, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[user_id]
+
+    def deliver(self, user_id: int, message: bytes) -> None:
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.put(message)
+
+    async def publish(self, user_id: int, message: bytes) -> None:
+        """
+        The publish function sends an event to every stream of the user, on all workers.
+            If Redis cannot be reached the event still reaches the streams of this worker.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contact
+        :param message: bytes: The event made by format_event
+        :return: None
+        """
+        if self.redis is not None:
+            try:
+                await self.redis.publish(f'{CHANNEL_PREFIX}{user_id}', message)
+                return
+            except (RedisError, OSError) as err:
+                logger.warning('Could not publish contact event: %s', err)
+        self.deliver(user_id, message)
+
+    async def publish_many(self, user_id: int, messages: list) -> None:
+        """
+        The publish_many function sends several events to every stream of the user, in one round trip to Redis.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who owns the contacts
+        :param messages: list: The events made by format_event, in order
+        :return: None
+        """
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for message in messages:
+                        pipe.publish(f'{CHANNEL_PREFIX}{user_id}', message)
+                    await pipe.execute()
+                return
+            except (RedisError, OSError) as err:
+                logger.warning('Could not publish contact events: %s', err)
+        for message in messages:
+            self.deliver(user_id, message)
+
+    async def start(self, client=None, subscriber=None) -> None:
+        """
+        The start function connects the broker to Redis and starts listening for the events of all workers.
+
+        :param self: Represent the instance of the class
+        :param client: Redis client to publish with, None for the in-process broker
+        :param subscriber: Redis client the subscription uses, client if None
+        :return: None
+        """
+        self.redis = client
+        self.subscriber = subscriber or client
+        if client is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    def close_streams(self) -> None:
+        """
+        The close_streams function ends every open stream with a retry hint, so its client reconnects
+            to another worker. It runs before the server waits for its connections to close,
+            because streams never finish on their own.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    async def stop(self) -> None:
+        """
+        The stop function ends the streams still open and stops listening to Redis.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.close_streams()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.redis = self.subscriber = None
+
+    async def _listen(self) -> None:
+        delay = 0.5
+        while True:
+            pubsub = self.subscriber.pubsub()
+            try:
+                await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                delay = 0.5
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        channel = message['channel']
+                        if isinstance(channel, bytes):
+                            channel = channel.decode()
+                        self.deliver(int(channel[len(CHANNEL_PREFIX):]), message['data'])
+            except (RedisError, OSError) as err:
+                logger.warning('Contact events subscription lost, reconnecting in %.1f s: %s', delay, err)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                await pubsub.reset()
+
+
+broker = Broker()
+
+EVENT_STREAMS = Gauge('contact_event_streams', 'Open Server-Sent Events streams of contact changes.',
+                      function=lambda: broker.streams)
+EVENTS_DROPPED = Counter('contact_events_resync_total',
+                         'Streams that fell behind, lost their backlog and were told to resync.')
+
+
+async def event_stream(user_id: int, subscription: Subscription, replay: list):
+    """
+    The event_stream function writes the events of one subscription to a streaming response.
+        Replayed events come first. A comment is sent when nothing happened for events_heartbeat_seconds,
+        which keeps proxies from closing the idle connection. An idle stream is one task waiting on a queue,
+        it holds no database or Redis connection.
+        After events_stream_max_seconds the stream ends with a retry hint and the client reconnects
+        with Last-Event-ID, so a worker whose server does not close the streams itself still shuts down in time.
+
+    :param user_id: int: Id of the user the stream belongs to
+    :param subscription: Subscription: Events to send, made by broker.subscribe
+    :param replay: list: Events missed since the client's Last-Event-ID
+    :return: An async iterator of chunks
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.events_stream_max_seconds
+    try:
+        for message in replay:
+            yield message
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield CLOSE
+                return
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(),
+                                                 min(settings.events_heartbeat_seconds, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield HEARTBEAT
+                continue
+            yield message
+            if message is CLOSE:
+                return
+    finally:
+        broker.unsubscribe(user_id, subscription)
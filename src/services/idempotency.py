@@ -0,0 +1,134 @@
+import asyncio
+import base64
+import hashlib
+import logging
+
+import orjson
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_REQUESTS = Counter('idempotency_requests_total', 'Requests sent with an Idempotency-Key, by outcome.',
+                               ('path', 'result'))
+
+# how often a duplicate checks whether the request it waits for finished on another worker
+POLL_SECONDS = 0.05
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Responses of requests sent with an Idempotency-Key, kept for idempotency_ttl seconds, so a retried request
+    gets the response of the first one instead of running again.
+
+    While the first request runs its key holds a running marker that expires after idempotency_lock_seconds,
+    so a worker that died in the middle of a request does not block the key for the whole TTL.
+    """
+    r_cashe = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+
+    def __init__(self):
+        self._running = {}
+
+    @staticmethod
+    def key(method: str, path: str, idempotency_key: str, owner: str | None) -> str:
+        """
+        The key function builds the Redis key of a request. Keys are scoped to the user the request was sent by,
+            so two users picking the same Idempotency-Key never get each other's responses, while a retry
+            with a refreshed token still finds the first response.
+
+        :param method: str: HTTP method of the request
+        :param path: str: Path of the request
+        :param idempotency_key: str: Value of the Idempotency-Key header
+        :param owner: str | None: Email of the authenticated user, None for anonymous requests
+        :return: The Redis key
+        """
+        owner = hashlib.sha256(owner.encode()).hexdigest()[:32] if owner else '-'
+        return f'idempotency: {method} {path} {owner} {idempotency_key}'
+
+    async def acquire(self, key: str, request_fingerprint: str) -> dict | None:
+        """
+        The acquire function claims a key for the request about to run, or waits for the request already running
+            under it, for idempotency_wait_seconds at most. Duplicates on this worker are woken up as soon as
+            the first request finishes, duplicates on other workers check again every POLL_SECONDS.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key made by the key function
+        :param request_fingerprint: str: Fingerprint of the request body
+        :return: None if the caller claimed the key and runs the request, otherwise the record stored under it:
+            a finished response, a record of another request body, or a request still running after the wait
+        """
+        running = orjson.dumps({'state': 'running', 'fingerprint': request_fingerprint})
+        deadline = asyncio.get_running_loop().time() + settings.idempotency_wait_seconds
+        while True:
+            if await self.r_cashe.set(key, running, nx=True, ex=settings.idempotency_lock_seconds):
+                self._running[key] = asyncio.Event()
+                return None
+            stored = await self.r_cashe.get(key)
+            if stored is None:
+                # expired between the two commands
+                continue
+            record = orjson.loads(stored)
+            if record['state'] == 'done' or record['fingerprint'] != request_fingerprint:
+                return record
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return record
+            event = self._running.get(key)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(remaining, POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    async def save(self, key: str, request_fingerprint: str, status: int, headers: list, body: bytes) -> None:
+        """
+        The save function stores the response of a request that ran under a claimed key and wakes up its duplicates.
+            A 5xx response is not stored, a retry of it runs again.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key claimed by acquire
+        :param request_fingerprint: str: Fingerprint of the request body
+        :param status: int: Status code of the response
+        :param headers: list: Headers of the response as (name, value) byte pairs
+        :param body: bytes: Body of the response
+        :return: None
+        """
+        try:
+            if status >= 500:
+                await self.r_cashe.delete(key)
+            else:
+                record = {'state': 'done', 'fingerprint': request_fingerprint, 'status': status,
+                          'headers': [[name.decode('latin-1'), value.decode('latin-1')] for name, value in headers],
+                          'body': base64.b64encode(body).decode()}
+                await self.r_cashe.set(key, orjson.dumps(record), ex=settings.idempotency_ttl)
+        finally:
+            self._wake(key)
+
+    async def release(self, key: str) -> None:
+        """
+        The release function frees a claimed key without storing a response, when the request failed with an exception.
+
+        :param self: Represent the instance of the class
+        :param key: str: Key claimed by acquire
+        :return: None
+        """
+        try:
+            await self.r_cashe.delete(key)
+        finally:
+            self._wake(key)
+
+    def _wake(self, key: str) -> None:
+        event = self._running.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+service_idempotency = IdempotencyStore()
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import redis.asyncio as redis
+from fastapi import FastAPI
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+from src.conf.config import settings
+from src.database.db import engine
+from src.services import avatars as service_avatars
+from src.services import email as service_email
+from src.services.auth import service_auth
+from src.services.birthdays import digest_scheduler
+from src.services.cache import service_cache
+from src.services.events import broker
+from src.services.idempotency import service_idempotency
+from src.services.local_redis import LocalRedis
+from src.services.workers import redis_pool_size
+
+logger = logging.getLogger(__name__)
+
+
+class AppState:
+    """
+    Readiness of the worker: the result of every warm-up check, and whether it is stopping.
+    The worker is ready once all checks passed and until it is told to stop. While stopping it still serves requests
+    for shutdown_grace_seconds, so the load balancer sees it is not ready and stops sending it traffic,
+    then it drains: new requests are refused and the ones being handled are waited for.
+    """
+
+    def __init__(self):
+        self.checks = {}
+        self.timings = {}
+        self.started = False
+        self.stopping = False
+        self.draining = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.stopping and not self.draining and all(self.checks.values())
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        The drain function stops the worker from reporting ready and waits for the requests being handled to finish,
+            background tasks such as emails included, since those run before a request's ASGI call returns.
+
+        :param self: Represent the instance of the class
+        :param timeout: float: Seconds to wait at most
+        :return: True if every request finished in time
+        """
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+app_state = AppState()
+
+
+def create_redis(decode_responses: bool = False) -> redis.Redis:
+    # a request that finds every connection in use waits redis_pool_timeout for one instead of failing at once
+    pool = redis.BlockingConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0,
+                                        max_connections=redis_pool_size(), timeout=settings.redis_pool_timeout,
+                                        decode_responses=decode_responses)
+    return redis.Redis(connection_pool=pool)
+
+
+def create_subscriber() -> redis.Redis:
+    # the events subscription keeps one connection for itself, outside the pools the requests share
+    return redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, max_connections=1)
+
+
+def warm_database() -> None:
+    """
+    The warm_database function opens as many connections as the pool keeps and runs a query on each,
+        so the first requests do not pay for connecting to the database.
+
+    :return: None
+    """
+    size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.exec_driver_sql('SELECT 1')
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def _check(name: str, func) -> None:
+    started = time.perf_counter()
+    try:
+        await func()
+        app_state.checks[name] = True
+    except (RedisError, SQLAlchemyError, OSError) as err:
+        app_state.checks[name] = False
+        logger.warning('%s is not available: %s', name, err)
+    app_state.timings[name] = (time.perf_counter() - started) * 1000
+    logger.info('%s initialised in %.1f ms', name, app_state.timings[name])
+
+
+async def startup(app: FastAPI) -> None:
+    """
+    The startup function creates the shared resources of the worker and warms them up:
+        the Redis connection pool used by the caches and the idempotency keys, the rate limiter, the database pool
+        and the mail sender. It also starts the daily birthday digest when it is enabled.
+        A resource that is not available is reported by the readiness check instead of stopping the worker.
+
+    :param app: FastAPI: The application
+    :return: None
+    """
+    from fastapi_limiter import FastAPILimiter
+
+    client = create_redis()
+    limiter_client = create_redis(decode_responses=True)
+    app.state.redis = client
+    app.state.limiter_redis = limiter_client
+    service_auth.r_cashe = service_cache.r_cashe = client
+    service_idempotency.r_cashe = client if settings.idempotency_backend == 'redis' else LocalRedis()
+
+    async def database():
+        await asyncio.get_running_loop().run_in_executor(None, warm_database)
+
+    async def mail():
+        service_email.get_mailer()
+
+    await asyncio.gather(
+        _check('redis', client.ping),
+        _check('rate_limiter', lambda: FastAPILimiter.init(limiter_client)),
+        _check('database', database),
+        _check('mail', mail),
+    )
+    if settings.events_broker == 'redis':
+        app.state.events_redis = create_subscriber()
+        await broker.start(client, app.state.events_redis)
+    else:
+        app.state.events_redis = None
+        await broker.start(None)
+    digest_scheduler.start()
+    app_state.started = True
+
+
+async def before_shutdown() -> None:
+    """
+    The before_shutdown function runs when the worker is told to stop, before the server closes its sockets
+        and waits for the open connections, see src/services/server.py. The server stops accepting connections
+        only once the requests are drained, so until then the load balancer can still reach /ready and see 503.
+        The event streams are ended before waiting, they would otherwise keep the worker until it is killed.
+
+    :return: None
+    """
+    app_state.stopping = True
+    if settings.shutdown_grace_seconds > 0:
+        await asyncio.sleep(settings.shutdown_grace_seconds)
+    broker.close_streams()
+    if not await app_state.drain(settings.shutdown_timeout):
+        logger.warning('%d requests still running after %.0f s, shutting down anyway',
+                       app_state.in_flight, settings.shutdown_timeout)
+
+
+async def shutdown(app: FastAPI) -> None:
+    """
+    The shutdown function drains the requests still being handled, then releases the resources in reverse order.
+        Under serve.py before_shutdown already drained them; other servers only run the lifespan shutdown
+        once they stopped accepting connections and the connections closed.
+
+    :param app: FastAPI: The application
+    :return: None
+    """
+    # event streams never finish on their own, they are closed before waiting for the other requests
+    await broker.stop()
+    await digest_scheduler.stop()
+    if not await app_state.drain(settings.shutdown_timeout):
+        logger.warning('%d requests still running after %.0f s, shutting down anyway',
+                       app_state.in_flight, settings.shutdown_timeout)
+    for client in (app.state.redis, app.state.limiter_redis, app.state.events_redis):
+        if client is None:
+            continue
+        try:
+            await client.close(close_connection_pool=True)
+        except (RedisError, OSError, AttributeError) as err:
+            logger.warning('Could not close Redis connection: %s', err)
+    engine.dispose()
+    service_avatars.shutdown_executor()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function runs startup before the worker accepts requests and shutdown after it stopped.
+
+    :param app: FastAPI: The application
+    :return: None
+    """
+    await startup(app)
+    try:
+        yield
+    finally:
+        await shutdown(app)
@@ -0,0 +1,133 @@
+import time
+
+
+class LocalRedis:
+    """
+    An in-process stand-in for the part of the redis.asyncio.Redis client the application uses:
+    strings with expiry, SET with NX/XX, INCR, EXPIRE, DELETE, PING and pipelines of those.
+
+    Values are stored as bytes, the way Redis returns them. It keeps data in one process only,
+    so it is meant for benchmarks, tests and single-worker development without a Redis server.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, str):
+            return value.encode()
+        if isinstance(value, (int, float)):
+            return repr(value).encode()
+        raise TypeError(f'Invalid input of type {type(value).__name__}')
+
+    def _alive(self, key) -> bool:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    async def set(self, key, value, ex=None, px=None, nx: bool = False, xx: bool = False, keepttl: bool = False):
+        """
+        The set function stores value under key, with the same options as the Redis SET command.
+
+        :param self: Represent the instance of the class
+        :param key: Key to store the value under
+        :param value: bytes, str, int or float
+        :param ex: Expire the key after this many seconds
+        :param px: Expire the key after this many milliseconds
+        :param nx: bool: Only set the key if it does not exist
+        :param xx: bool: Only set the key if it already exists
+        :param keepttl: bool: Keep the expiry the key already has
+        :return: True if the key was set, None otherwise
+        """
+        exists = self._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.data[key] = self._encode(value)
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        elif px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+        elif not keepttl:
+            self.expires.pop(key, None)
+        return True
+
+    async def expire(self, key, seconds) -> bool:
+        if not self._alive(key):
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    async def ttl(self, key) -> int:
+        if not self._alive(key):
+            return -2
+        expires = self.expires.get(key)
+        return -1 if expires is None else max(round(expires - time.monotonic()), 0)
+
+    async def incr(self, key, amount: int = 1) -> int:
+        value = int(self.data[key]) + amount if self._alive(key) else amount
+        self.data[key] = self._encode(value)
+        return value
+
+    async def delete(self, *keys) -> int:
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                deleted += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    async def exists(self, *keys) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    async def flushdb(self) -> bool:
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    def pipeline(self, transaction: bool = True) -> 'LocalPipeline':
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """
+    Commands queued on a LocalRedis and run together by execute, like a redis.asyncio pipeline.
+    """
+
+    def __init__(self, redis: LocalRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+
+    async def __aenter__(self) -> 'LocalPipeline':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.commands = []
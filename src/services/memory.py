@@ -0,0 +1,184 @@
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.services.metrics import Gauge
+
+# frames of tracemalloc's own bookkeeping and of this module are left out of the top allocation sites
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_bytes() -> int:
+    """
+    The rss_bytes function returns the resident set size of this worker process.
+        /proc/self/statm is read where it exists (Linux); on other Unix systems the peak RSS from getrusage
+        is the best available. On Windows the RSS comes from psutil when it is installed,
+        otherwise only the memory traced by tracemalloc is known, 0 while it is not tracing.
+
+    :return: The RSS in bytes
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return tracemalloc.get_traced_memory()[0]
+    return psutil.Process().memory_info().rss
+
+
+def gc_stats() -> dict:
+    """
+    The gc_stats function returns the state of the garbage collector: objects waiting in each generation,
+        the thresholds and how many collections each generation has had.
+
+    :return: A dict
+    """
+    return {
+        'counts': gc.get_count(),
+        'thresholds': gc.get_threshold(),
+        'generations': gc.get_stats(),
+        'uncollectable': len(gc.garbage),
+    }
+
+
+class RouteAllocations:
+    def __init__(self):
+        self.requests = 0
+        self.total = 0
+        self.max = 0
+        self.max_peak = 0
+
+    def record(self, allocated: int, peak: int) -> None:
+        self.requests += 1
+        self.total += allocated
+        self.max = max(self.max, allocated)
+        self.max_peak = max(self.max_peak, peak)
+
+    def as_dict(self) -> dict:
+        return {'requests': self.requests, 'allocated_bytes_total': self.total,
+                'allocated_bytes_avg': self.total // self.requests if self.requests else 0,
+                'allocated_bytes_max': self.max, 'peak_bytes_max': self.max_peak}
+
+
+class MemoryTracker:
+    """
+    Admin controlled tracemalloc tracing: while it runs, the memory each request leaves allocated
+    and the peak it reached are recorded per route, and the top allocation sites can be listed.
+
+    Tracing slows every allocation down, so it is off until an admin starts it.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.baseline = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        """
+        The start function starts tracemalloc and takes the baseline snapshot that growth is compared with.
+
+        :param self: Represent the instance of the class
+        :param frames: int: How many frames of the traceback to keep for each allocation
+        :return: None
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        with self._lock:
+            self.routes = {}
+        self.baseline = self.snapshot()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def record(self, route: str, allocated: int, peak: int) -> None:
+        """
+        The record function adds the allocations of one request to the totals of its route.
+            Requests that run concurrently share one tracemalloc counter, so under load the numbers
+            of a route include some allocations of other requests.
+
+        :param self: Represent the instance of the class
+        :param route: str: Path template of the route, with the method
+        :param allocated: int: Bytes still allocated when the request finished
+        :param peak: int: Highest number of bytes allocated during the request
+        :return: None
+        """
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteAllocations()
+            stats.record(allocated, peak)
+
+    def route_stats(self) -> dict:
+        with self._lock:
+            return {route: stats.as_dict() for route, stats in sorted(self.routes.items())}
+
+    def top(self, limit: int = 20, group_by: str = 'lineno') -> list:
+        """
+        The top function lists the allocation sites holding the most memory right now.
+
+        :param self: Represent the instance of the class
+        :param limit: int: How many sites to return
+        :param group_by: str: lineno, filename or traceback
+        :return: A list of dicts with the site, its size in bytes and the number of blocks
+        """
+        statistics = self.snapshot().statistics(group_by)[:limit]
+        return [{'site': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count} for stat in statistics]
+
+    def growth(self, limit: int = 20, group_by: str = 'lineno') -> list:
+        """
+        The growth function lists the allocation sites that grew the most since tracing was started,
+            which is where memory that keeps creeping up is usually found.
+
+        :param self: Represent the instance of the class
+        :param limit: int: How many sites to return
+        :param group_by: str: lineno, filename or traceback
+        :return: A list of dicts with the site, its growth in bytes and blocks, and its current size
+        """
+        if self.baseline is None:
+            return []
+        statistics = self.snapshot().compare_to(self.baseline, group_by)[:limit]
+        return [{'site': str(stat.traceback), 'size_diff_bytes': stat.size_diff, 'size_bytes': stat.size,
+                 'count_diff': stat.count_diff} for stat in statistics]
+
+    def summary(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if self.enabled else (0, 0)
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'gc': gc_stats(),
+            'tracemalloc': {'enabled': self.enabled, 'traced_bytes': current, 'peak_bytes': peak},
+            'routes': self.route_stats(),
+        }
+
+
+memory_tracker = MemoryTracker()
+
+PROCESS_RSS = Gauge('process_resident_memory_bytes', 'Resident set size of this worker.', function=rss_bytes)
+GC_UNCOLLECTABLE = Gauge('python_gc_uncollectable_objects', 'Objects the garbage collector could not free.',
+                         function=lambda: len(gc.garbage))
@@ -0,0 +1,241 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Sequence
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """
+        The labels function returns the child metric for one combination of label values.
+            Children are created on first use and cached, so later calls are a dict lookup.
+
+        :param self: Represent the instance of the class
+        :param values: Label values in the order of labelnames
+        :param kwargs: Label values by name
+        :return: The child metric
+        """
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        The _new_child function creates the value kept for one combination of label values.
+
+        :param self: Represent the instance of the class
+        :return: The child metric
+        """
+
+    def collect(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+    def _sample_lines(self, values, child) -> list:
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}']
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        return self.value
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None,
+                 function: Callable[[], float] | None = None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def collect(self) -> list:
+        if self.function is None:
+            return super().collect()
+        # the value is computed when scraped, so keeping it up to date costs nothing per request
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}',
+                f'{self.name} {_format_value(self.function())}']
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, amount: float) -> None:
+        index = bisect_left(self.buckets, amount)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += amount
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, amount: float) -> None:
+        self._default().observe(amount)
+
+    def _sample_lines(self, values, child) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> bytes:
+        """
+        The render function renders all registered metrics in the Prometheus text exposition format.
+            Metrics are kept per worker process, every worker answers for itself.
+
+        :param self: Represent the instance of the class
+        :return: The metrics as bytes
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return ('\n'.join(lines) + '\n').encode()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests handled.', ('method', 'route', 'status'))
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request latency.', ('method', 'route'))
+HTTP_REQUESTS_IN_PROGRESS = Gauge('http_requests_in_progress', 'HTTP requests being handled.', ('method', 'route'))
+
+DB_POOL_CHECKOUT = Histogram('db_pool_checkout_seconds', 'Time spent waiting for a connection from the pool.',
+                             buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Time spent executing SQL statements.',
+                              buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+DB_QUERIES_PER_REQUEST = Histogram('db_queries_per_request', 'SQL statements issued by one HTTP request.', ('route',),
+                                   buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+DB_N_PLUS_ONE = Counter('db_n_plus_one_total', 'Requests that repeated an identical statement (probable N+1).',
+                        ('route',))
+
+USER_CACHE = Counter('user_cache_requests_total', 'Lookups of the current user in the Redis cache.', ('result',))
+CONTACTS_PAGE_CACHE = Counter('contacts_page_cache_requests_total', 'Lookups of serialized contact lists in Redis.',
+                              ('page', 'result'))
+
+
+def _user_cache_hit_ratio() -> float:
+    hits = USER_CACHE.labels('hit').get()
+    total = hits + USER_CACHE.labels('miss').get()
+    return hits / total if total else 0.0
+
+
+USER_CACHE_HIT_RATIO = Gauge('user_cache_hit_ratio', 'Share of current user lookups served from the Redis cache.',
+                             function=_user_cache_hit_ratio)
+
+PASSWORD_HASH_QUEUE = Histogram('password_hash_queue_seconds', 'Time bcrypt work waited for a free hashing thread.',
+                                ('operation',), buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+PASSWORD_HASH_DURATION = Histogram('password_hash_seconds', 'Time spent hashing or verifying a password.',
+                                   ('operation',), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5))
+
+EMAILS_SENT = Counter('emails_sent_total', 'Emails handed to the mail server.', ('template', 'outcome'))
@@ -0,0 +1,36 @@
+import re
+
+from src.conf.config import settings
+
+# ASCII digits only: str.isdigit also takes other scripts' digits and superscripts
+DIGITS = re.compile(r'[0-9]+')
+# separators people type between the digits of a phone number
+SEPARATORS = re.compile(r'[\s().\-/]')
+# E.164 numbers have at most 15 digits; fewer than 8 is no phone number anywhere
+MIN_DIGITS = 8
+MAX_DIGITS = 15
+
+
+def normalize_phone(number: str) -> str:
+    """
+    The normalize_phone function brings a phone number to E.164, the form phone numbers are stored and looked up in:
+        a plus followed by the country code and the number, without separators.
+        International numbers may start with + or 00. A number starting with the trunk prefix 0
+        is a national one of phone_country_code; any other number is taken to start with its country code.
+
+    :param number: str: The phone number as typed, e.g. +38 (050) 123 45 67, 050-123-45-67 or 00380501234567
+    :return: The number in E.164, e.g. +380501234567
+    :raises ValueError: If the number has other characters than digits and separators, or too few or too many digits
+    """
+    digits = SEPARATORS.sub('', number.strip())
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = settings.phone_country_code + digits[1:]
+    if not DIGITS.fullmatch(digits):
+        raise ValueError('phone number may only contain digits, spaces, brackets, dots, dashes and a leading +')
+    if not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+        raise ValueError(f'phone number must have {MIN_DIGITS} to {MAX_DIGITS} digits with the country code')
+    return '+' + digits
@@ -0,0 +1,87 @@
+import os
+import re
+import time
+from pathlib import Path
+
+from src.conf.config import settings
+
+PROFILE_NAME = re.compile(r'^[0-9]+-[A-Z]+-[A-Za-z0-9_.-]+\.(pstats|speedscope\.json)$')
+
+
+class ProfileStore:
+    """
+    Profiles of single requests kept on disk as a ring buffer: once max_files profiles are stored,
+    the oldest one is removed for every new one.
+    """
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def new_name(self, method: str, route: str, suffix: str) -> str:
+        """
+        The new_name function builds the file name of a new profile from the time, method and route of the request,
+            e.g. 1700000000000000-GET-api_contacts_contact_id.pstats.
+
+        :param self: Represent the instance of the class
+        :param method: str: HTTP method of the request
+        :param route: str: Path template of the route
+        :param suffix: str: pstats or speedscope.json
+        :return: The file name
+        """
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        return f'{time.time_ns() // 1000}-{method.upper()}-{slug}.{suffix}'
+
+    def save(self, name: str, data: bytes) -> Path:
+        """
+        The save function writes a profile and removes the oldest ones above max_files.
+
+        :param self: Represent the instance of the class
+        :param name: str: File name from new_name
+        :param data: bytes: The profile
+        :return: Path of the saved profile
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        tmp = path.with_name(f'.{name}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.trim()
+        return path
+
+    def trim(self) -> None:
+        for path in self.paths()[self.max_files:]:
+            path.unlink(missing_ok=True)
+
+    def paths(self) -> list:
+        """
+        The paths function returns the stored profiles, newest first.
+
+        :param self: Represent the instance of the class
+        :return: A list of paths
+        """
+        if not self.directory.is_dir():
+            return []
+        paths = [path for path in self.directory.iterdir() if PROFILE_NAME.match(path.name)]
+        return sorted(paths, key=lambda path: int(path.name.split('-', 1)[0]), reverse=True)
+
+    def list(self) -> list:
+        return [{'name': path.name, 'size': path.stat().st_size,
+                 'created_at': int(path.name.split('-', 1)[0]) / 1_000_000} for path in self.paths()]
+
+    def get(self, name: str) -> Path | None:
+        """
+        The get function returns the path of a stored profile, or None if there is no such profile.
+            Names that do not look like profile names are refused, so nothing outside the directory can be read.
+
+        :param self: Represent the instance of the class
+        :param name: str: File name of the profile
+        :return: The path or None
+        """
+        if not PROFILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+profile_store = ProfileStore(settings.profiling_dir, settings.profiling_max_files)
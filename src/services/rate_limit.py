@@ -0,0 +1,30 @@
+from fastapi import Request, Response
+
+
+class RateLimit:
+    """
+    Dependency that limits a route with fastapi_limiter's RateLimiter.
+
+    fastapi_limiter is only imported when the first limited request comes in, so importing the routes
+    does not load it for workers and scripts that never serve one.
+    """
+
+    def __init__(self, times: int, seconds: int):
+        self.times = times
+        self.seconds = seconds
+        self._limiter = None
+
+    async def __call__(self, request: Request, response: Response):
+        """
+        The __call__ function counts the request against the limit; over the limit, fastapi_limiter answers 429.
+
+        :param self: Represent the instance of the class
+        :param request: Request: The request being limited
+        :param response: Response: The response of the route
+        :return: None
+        """
+        if self._limiter is None:
+            from fastapi_limiter.depends import RateLimiter
+
+            self._limiter = RateLimiter(times=self.times, seconds=self.seconds)
+        return await self._limiter(request, response)
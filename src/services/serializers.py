@@ -0,0 +1,96 @@
+from typing import Any, Iterable, Mapping, Sequence
+
+import orjson
+from fastapi import HTTPException, Query, Response, status
+
+from src.schemas.contacts import CONTACT_FIELDS
+
+
+class RawJSONResponse(Response):
+    """
+    Response for bodies that are already encoded JSON bytes, sent as they are.
+    """
+    media_type = 'application/json'
+
+
+def parse_fields(fields: str | None = Query(None, description='Comma separated fields to return, e.g. first_name,last_name')) -> tuple | None:
+    """
+    The parse_fields function is a dependency that reads the sparse fieldset of a contacts request.
+        The id is always returned. Fields come back in the order of ContactResponce whatever order they were asked in.
+        Unknown field names are rejected with HTTP 422.
+
+    :param fields: str | None: Value of the fields query parameter
+    :return: The names of the fields to return, or None if all of them are wanted
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f'Unknown fields: {", ".join(sorted(unknown))}')
+    requested.add('id')
+    return tuple(field for field in CONTACT_FIELDS if field in requested)
+
+
+def dump_rows(rows: Iterable[Sequence[Any]], fields: Sequence[str] | None = None) -> bytes:
+    """
+    The dump_rows function encodes rows fetched as tuples straight to JSON bytes.
+        No pydantic model is created per row; orjson encodes dates and strings natively.
+
+    :param rows: Iterable[Sequence[Any]]: Rows whose values are in the order of fields
+    :param fields: Sequence[str] | None: Names of the columns in the rows, all fields of ContactResponce if None
+    :return: A JSON array of objects
+    """
+    fields = fields or CONTACT_FIELDS
+    return orjson.dumps([dict(zip(fields, row)) for row in rows])
+
+
+def dump_row(row: Sequence[Any], fields: Sequence[str] | None = None) -> bytes:
+    """
+    The dump_row function encodes a single row fetched as a tuple to a JSON object.
+
+    :param row: Sequence[Any]: Row whose values are in the order of fields
+    :param fields: Sequence[str] | None: Names of the columns in the row, all fields of ContactResponce if None
+    :return: A JSON object
+    """
+    return orjson.dumps(dict(zip(fields or CONTACT_FIELDS, row)))
+
+
+def dump_batch(rows: Iterable[Sequence[Any]], missing: Sequence[int], fields: Sequence[str] | None = None) -> bytes:
+    """
+    The dump_batch function encodes the result of a batch lookup of contacts to JSON bytes.
+
+    :param rows: Iterable[Sequence[Any]]: Rows of the contacts found, whose values are in the order of fields
+    :param missing: Sequence[int]: Ids that were asked for but not found
+    :param fields: Sequence[str] | None: Names of the columns in the rows, all fields of ContactResponce if None
+    :return: A JSON object with the contacts and the missing ids
+    """
+    fields = fields or CONTACT_FIELDS
+    return orjson.dumps({'contacts': [dict(zip(fields, row)) for row in rows], 'missing': list(missing)})
+
+
+def rows_response(rows: Iterable[Sequence[Any]], fields: Sequence[str] | None = None,
+                  headers: Mapping[str, str] | None = None) -> RawJSONResponse:
+    """
+    The rows_response function builds the response for a list of rows fetched as tuples.
+
+    :param rows: Iterable[Sequence[Any]]: Rows whose values are in the order of fields
+    :param fields: Sequence[str] | None: Names of the columns in the rows, all fields of ContactResponce if None
+    :param headers: Mapping[str, str] | None: Extra headers of the response, e.g. the ETag
+    :return: The response
+    """
+    return RawJSONResponse(dump_rows(rows, fields), headers=headers)
+
+
+def row_response(row: Sequence[Any], fields: Sequence[str] | None = None,
+                 headers: Mapping[str, str] | None = None) -> RawJSONResponse:
+    """
+    The row_response function builds the response for a single row fetched as a tuple.
+
+    :param row: Sequence[Any]: Row whose values are in the order of fields
+    :param fields: Sequence[str] | None: Names of the columns in the row, all fields of ContactResponce if None
+    :param headers: Mapping[str, str] | None: Extra headers of the response, e.g. the ETag
+    :return: The response
+    """
+    return RawJSONResponse(dump_row(row, fields), headers=headers)
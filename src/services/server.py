@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import sys
+
+import uvicorn
+
+from src.services.lifespan import before_shutdown
+
+try:
+    from gunicorn.arbiter import Arbiter
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # gunicorn is optional, serve.py falls back to uvicorn's process manager
+    UvicornWorker = None
+
+logger = logging.getLogger(__name__)
+
+
+class GracefulServer(uvicorn.Server):
+    """
+    uvicorn server that runs before_shutdown when it is told to stop, while its sockets are still open.
+    uvicorn closes them and waits for every connection to close before the application's lifespan shutdown runs,
+    so anything that has to happen before that, like reporting not ready, draining the requests
+    and ending the event streams, cannot wait for the lifespan.
+    A second signal stops the server without waiting for before_shutdown to finish.
+    """
+
+    def __init__(self, config: uvicorn.Config):
+        super().__init__(config)
+        self.stop_requested = False
+        self._stopping = None
+
+    def handle_exit(self, sig, frame) -> None:
+        # may run in a signal handler outside the event loop on Windows, the work starts on the next tick
+        if self.stop_requested:
+            super().handle_exit(sig, frame)
+            return
+        self.stop_requested = True
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.stop_requested and self._stopping is None:
+            self._stopping = asyncio.ensure_future(self._before_shutdown())
+        return await super().on_tick(counter)
+
+    async def _before_shutdown(self) -> None:
+        try:
+            await before_shutdown()
+        except Exception:
+            logger.exception('Preparing the shutdown failed')
+        finally:
+            self.should_exit = True
+
+
+if UvicornWorker is not None:
+    class GracefulUvicornWorker(UvicornWorker):
+        """
+        gunicorn worker class serving the application with GracefulServer.
+        """
+
+        async def _serve(self) -> None:
+            self.config.app = self.wsgi
+            server = GracefulServer(config=self.config)
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -0,0 +1,74 @@
+import asyncio
+import math
+import random
+import time
+from typing import Awaitable, Callable
+
+from src.services.metrics import Counter
+
+SINGLE_FLIGHT_SHARED = Counter('single_flight_shared_total',
+                               'Cache misses that waited for the same load already in flight instead of making their own.',
+                               ('name',))
+CACHE_EARLY_REFRESH = Counter('cache_early_refresh_total', 'Cache entries recomputed before they expired.', ('name',))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent loads of the same key: the first caller starts the load, callers arriving while it is
+    in flight wait for its result instead of starting their own. Once the load finished, the next call loads again.
+    Coalescing is per worker process.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, load: Callable[[], Awaitable]):
+        """
+        The do function returns the result of load, shared with every concurrent call for the same key.
+            The load runs as its own task, so a caller that is cancelled, e.g. because its client went away,
+            does not cancel it for the callers still waiting. An exception raised by load reaches all of them.
+
+        :param self: Represent the instance of the class
+        :param key: str: What is loaded, e.g. the cache key
+        :param load: Coroutine function doing the load
+        :return: The result of load
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            SINGLE_FLIGHT_SHARED.labels(self.name).inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # marks the exception as retrieved when every caller was cancelled before the load failed
+            task.exception()
+
+
+def should_refresh_early(delta: float, expiry: float, beta: float = 1.0, now: float | None = None) -> bool:
+    """
+    The should_refresh_early function decides whether a cached value is recomputed before it expires,
+        using probabilistic early expiration (XFetch). The closer the expiry and the longer the value takes to compute,
+        the likelier a request refreshes it, so one request usually refreshes a hot key shortly before it expires
+        instead of all of them missing at once when it does.
+
+    :param delta: float: Seconds the value took to compute
+    :param expiry: float: Time the value expires at, in seconds since the epoch
+    :param beta: float: Eagerness, 1 is the usual choice, more refreshes earlier and 0 never early
+    :param now: float: Current time, time.time() by default
+    :return: True if the caller should recompute the value
+    """
+    if beta <= 0 or delta <= 0:
+        return False
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1.0 - random.random()) >= expiry
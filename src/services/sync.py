@@ -0,0 +1,48 @@
+import base64
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+
+
+def encode_cursor(updated_at: datetime, contact_id: int, synced_at: datetime | None = None) -> str:
+    """
+    The encode_cursor function turns the position of the last change a client has seen into an opaque token,
+        which the client sends back as ?since= to get the changes after it.
+        The cursor also carries the time up to which the client has seen every change. An account without changes
+        keeps its position, but every sync moves that time on, so its cursor does not expire.
+
+    :param updated_at: datetime: Time of the last change
+    :param contact_id: int: Id of the contact changed last, breaks ties between changes made at the same time
+    :param synced_at: datetime | None: Time the client has seen all changes up to, updated_at if None
+    :return: The cursor
+    """
+    synced_at = synced_at or updated_at
+    raw = f'{updated_at.isoformat()}|{contact_id}|{synced_at.isoformat()}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    The decode_cursor function reads a cursor made by encode_cursor.
+        A cursor that cannot be read is answered with 400. A cursor whose client last caught up longer ago
+        than the tombstones are kept is answered with 410, since deletes made after that may already be forgotten
+        and the client has to sync from scratch. The time of the last change does not matter for that:
+        an account nobody edited keeps a valid cursor as long as it syncs.
+
+    :param cursor: str: The cursor
+    :return: A (updated_at, contact_id) tuple
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        parts = raw.split('|')
+        # cursors issued before they carried the sync time end with the contact id
+        updated_at, contact_id, synced_at = parts if len(parts) == 3 else (*parts, parts[0])
+        position = datetime.fromisoformat(updated_at), int(contact_id)
+        synced_at = datetime.fromisoformat(synced_at)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+    if synced_at < datetime.utcnow() - timedelta(days=settings.tombstone_retention_days):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail='Cursor expired, sync all contacts again')
+    return position
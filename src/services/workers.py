@@ -0,0 +1,99 @@
+import os
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from src.conf.config import settings
+
+# the cache and the rate limiter each keep their own Redis connection pool
+REDIS_CLIENTS = 2
+# and the contact events subscription holds one more connection
+REDIS_SUBSCRIBER_CONNECTIONS = 1
+
+
+def cpu_count() -> int:
+    """
+    The cpu_count function returns the number of CPUs the process may run on,
+        which is less than os.cpu_count() in a container limited with cpusets.
+
+    :return: The number of usable CPUs
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count(configured: int | None = None) -> int:
+    """
+    The worker_count function returns how many worker processes serve.py starts:
+        the configured number, or one per CPU when it is 0. Every worker runs its own event loop,
+        so more workers than CPUs only adds memory and connections, not throughput.
+
+    :param configured: int: Workers asked for, settings.web_concurrency by default
+    :return: The number of workers
+    """
+    if configured is None:
+        configured = settings.web_concurrency
+    return configured if configured > 0 else cpu_count()
+
+
+def running_workers() -> int:
+    """
+    The running_workers function returns how many workers share the connection budget.
+        serve.py sets WEB_CONCURRENCY to the number of workers it started; without it, e.g. under python main.py
+        or a plain uvicorn, the process is the only worker and gets the whole budget.
+
+    :return: The number of workers
+    """
+    return settings.web_concurrency if settings.web_concurrency > 0 else 1
+
+
+def per_worker(total: int, workers: int) -> int:
+    """
+    The per_worker function splits a connection budget evenly between the workers.
+
+    :param total: int: Connections all workers together may open
+    :param workers: int: Number of workers
+    :return: Connections one worker may open
+    :raises ValueError: If the budget does not leave every worker a connection
+    """
+    workers = max(workers, 1)
+    if total < workers:
+        raise ValueError(f'a budget of {total} connections cannot be shared by {workers} workers or pools')
+    return total // workers
+
+
+def db_pool_options(url: str, total: int | None = None, workers: int | None = None) -> dict:
+    """
+    The db_pool_options function returns the create_engine pool arguments of one worker.
+        Half of the worker's share of db_max_connections is kept open, the rest is overflow opened under load,
+        so all workers together never open more than db_max_connections.
+        Databases without a QueuePool, like in-memory SQLite, keep their default pool.
+
+    :param url: str: Database url
+    :param total: int: Connections all workers together may open, settings.db_max_connections by default
+    :param workers: int: Number of workers, running_workers() by default
+    :return: Keyword arguments for create_engine
+    """
+    parsed = make_url(url)
+    if not issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        return {}
+    share = per_worker(settings.db_max_connections if total is None else total,
+                       running_workers() if workers is None else workers)
+    pool_size = max(1, share // 2)
+    return {'pool_size': pool_size, 'max_overflow': share - pool_size, 'pool_timeout': settings.db_pool_timeout}
+
+
+def redis_pool_size(total: int | None = None, workers: int | None = None) -> int:
+    """
+    The redis_pool_size function returns the size of each Redis connection pool of one worker,
+        after setting aside the connection of every worker's events subscription.
+
+    :param total: int: Connections all workers together may open, settings.redis_max_connections by default
+    :param workers: int: Number of workers, running_workers() by default
+    :return: Maximum connections of one pool
+    """
+    total = settings.redis_max_connections if total is None else total
+    workers = running_workers() if workers is None else workers
+    return per_worker(total - workers * REDIS_SUBSCRIBER_CONNECTIONS, workers * REDIS_CLIENTS)
@@ -5,6 +5,7 @@ path_root = Path(__file__).parent.parent
 sys.path.append(str(path_root))
 
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -39,7 +40,10 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
+    def override_get_db(request: Request):
+        if getattr(request.state, 'db', None) is not None:
+            yield request.state.db
+            return
         try:
             yield session
         finally:
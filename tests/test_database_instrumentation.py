@@ -0,0 +1,72 @@
+import sys
+import logging
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src.conf.config import settings
+from src.database.instrumentation import QueryStats, query_stats, instrument_queries, redact_parameters
+from src.middleware.queries import QueryStatsMiddleware
+
+
+@pytest.fixture(scope='module')
+def instrumented_engine():
+    engine = create_engine('sqlite://')
+    instrument_queries(engine)
+    return engine
+
+
+def test_query_stats(instrumented_engine):
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        with instrumented_engine.connect() as conn:
+            for i in range(5):
+                conn.execute(text('SELECT :value'), {'value': i})
+            conn.execute(text('SELECT 1'))
+    finally:
+        query_stats.reset(token)
+    assert stats.count == 6
+    assert stats.duration > 0
+    assert stats.repeated(5) == [('SELECT ?', 5)]
+    assert stats.repeated(6) == []
+
+
+def test_slow_query_log(instrumented_engine, monkeypatch, caplog):
+    monkeypatch.setattr(settings, 'sql_slow_query_ms', 0)
+    with caplog.at_level(logging.WARNING, logger='src.database.instrumentation'):
+        with instrumented_engine.connect() as conn:
+            conn.execute(text('SELECT :email'), {'email': 'secret@example.com'})
+    assert 'Slow query' in caplog.text
+    assert "<str>" in caplog.text
+    assert 'secret@example.com' not in caplog.text
+
+
+def test_redact_parameters():
+    assert redact_parameters(('a', 1)) == ('<str>', '<int>')
+    assert redact_parameters({'email': 'a'}) == {'email': '<str>'}
+    assert redact_parameters([('a',), ('b',)]) == [('<str>',), ('<str>',)]
+
+
+def test_query_stats_middleware(instrumented_engine, caplog):
+    app = FastAPI()
+
+    @app.get('/contacts')
+    def contacts():
+        with instrumented_engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text('SELECT :id'), {'id': i})
+        return []
+
+    app.add_middleware(QueryStatsMiddleware, n_plus_one_threshold=3)
+    with caplog.at_level(logging.WARNING, logger='src.middleware.queries'):
+        response = TestClient(app).get('/contacts')
+    assert response.status_code == 200
+    assert 'db;dur=' in response.headers['server-timing']
+    assert 'Probable N+1 in GET /contacts: statement issued 3 times' in caplog.text
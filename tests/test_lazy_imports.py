@@ -0,0 +1,16 @@
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+LAZY_MODULES = ('fastapi_mail', 'cloudinary', 'PIL', 'fastapi_limiter', 'uvicorn', 'jinja2')
+
+
+def test_optional_subsystems_are_not_imported_by_main():
+    code = 'import sys, json, main; print(json.dumps(sorted(sys.modules)))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=path_root, capture_output=True, text=True, check=True)
+    loaded = set(json.loads(result.stdout.splitlines()[-1]))
+    assert [name for name in LAZY_MODULES if name in loaded] == []
@@ -0,0 +1,106 @@
+import sys
+import gzip
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.middleware import compression
+from src.middleware.compression import CompressionMiddleware, choose_encoding
+
+BODY = b'{"first_name": "john", "last_name": "jacob"}' * 100
+
+
+def create_app():
+    app = FastAPI()
+
+    @app.get('/large')
+    def large():
+        return Response(BODY, media_type='application/json', headers={'ETag': '"abc"'})
+
+    @app.get('/small')
+    def small():
+        return Response(b'{"a": 1}', media_type='application/json')
+
+    @app.get('/image')
+    def image():
+        return Response(BODY, media_type='image/webp')
+
+    @app.get('/stream')
+    def stream():
+        return StreamingResponse((BODY[i:i + 100] for i in range(0, len(BODY), 100)), media_type='text/plain')
+
+    @app.get('/precompressed')
+    def precompressed():
+        return Response(gzip.compress(BODY), media_type='application/json', headers={'Content-Encoding': 'gzip'})
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500, content_types=['application/json', 'text/plain'])
+    return app
+
+
+@pytest.fixture(scope='module')
+def compression_client():
+    return TestClient(create_app())
+
+
+def test_large_response_gzip(compression_client):
+    response = compression_client.get('/large', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert response.headers['etag'] == 'W/"abc"'
+    assert int(response.headers['content-length']) < len(BODY)
+    assert response.content == BODY
+
+
+def test_small_response_not_compressed(compression_client):
+    response = compression_client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.content == b'{"a": 1}'
+
+
+def test_content_type_not_allowed(compression_client):
+    response = compression_client.get('/image', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+    assert response.content == BODY
+
+
+def test_identity_encoding(compression_client):
+    response = compression_client.get('/large', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert response.content == BODY
+
+
+def test_streaming_response_gzip(compression_client):
+    response = compression_client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    assert response.content == BODY
+
+
+def test_precompressed_passthrough(compression_client):
+    response = compression_client.get('/precompressed', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.content == BODY
+
+
+@pytest.mark.skipif(compression.brotli is None, reason='brotli is not installed')
+def test_streaming_response_brotli(compression_client):
+    response = compression_client.get('/stream', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['content-encoding'] == 'br'
+    assert response.content == BODY
+
+
+def test_choose_encoding():
+    assert choose_encoding('gzip, deflate, br', True) == 'br'
+    assert choose_encoding('gzip, deflate, br', False) == 'gzip'
+    assert choose_encoding('br;q=0.5, gzip', True) == 'gzip'
+    assert choose_encoding('gzip;q=0', True) is None
+    assert choose_encoding('*', False) == 'gzip'
+    assert choose_encoding('', True) is None
@@ -0,0 +1,127 @@
+import sys
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from redis.exceptions import ConnectionError
+
+from src.middleware.idempotency import IdempotencyMiddleware
+from src.services.auth import service_auth
+from src.services.idempotency import IdempotencyStore
+from src.services.local_redis import LocalRedis
+
+
+def create_app(store: IdempotencyStore, delay: float = 0.0, fail_first: bool = False):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post('/items')
+    async def create_item(item: dict):
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+        if fail_first and app.state.calls == 1:
+            return JSONResponse({'detail': 'unavailable'}, status_code=503)
+        return JSONResponse({'id': app.state.calls, **item}, status_code=201)
+
+    app.add_middleware(IdempotencyMiddleware, store=store, paths=('/items',))
+    return app
+
+
+@pytest.fixture()
+def store():
+    store = IdempotencyStore()
+    store.r_cashe = LocalRedis()
+    return store
+
+
+def post(app, *requests):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            return await asyncio.gather(*(client.post('/items', json=body, headers=headers)
+                                          for body, headers in requests))
+
+    return asyncio.run(run())
+
+
+def test_repeat_is_replayed(store):
+    app = create_app(store)
+    first, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    second, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    assert app.state.calls == 1
+    assert second.status_code == first.status_code == 201
+    assert second.json() == first.json() == {'id': 1, 'name': 'a'}
+    assert second.headers['idempotent-replayed'] == 'true'
+    assert 'idempotent-replayed' not in first.headers
+
+
+def bearer(email: str, expires_delta: float) -> dict:
+    token = asyncio.run(service_auth.create_access_token({'sub': email}, expires_delta))
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_keys_are_scoped_to_the_user(store):
+    app = create_app(store)
+    post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1', **bearer('one@example.com', 60)}))
+    other, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1', **bearer('two@example.com', 60)}))
+    assert app.state.calls == 2
+    assert other.json()['id'] == 2
+    # a retry with a refreshed token of the same user is a repeat
+    again, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1', **bearer('one@example.com', 120)}))
+    assert app.state.calls == 2
+    assert again.json()['id'] == 1
+
+
+def test_token_subject():
+    assert service_auth.token_subject(bearer('one@example.com', 60)['Authorization']) == 'one@example.com'
+    refresh = asyncio.run(service_auth.create_refresh_token({'sub': 'one@example.com'}))
+    for authorization in (None, '', 'Bearer', 'Bearer not-a-token', f'Bearer {refresh}', 'Basic b25lOnR3bw=='):
+        assert service_auth.token_subject(authorization) is None
+
+
+def test_concurrent_duplicates_wait_for_the_first(store):
+    app = create_app(store, delay=0.05)
+    responses = post(app, *[({'name': 'a'}, {'Idempotency-Key': 'k1'})] * 5)
+    assert app.state.calls == 1
+    assert {response.json()['id'] for response in responses} == {1}
+    assert sum('idempotent-replayed' in response.headers for response in responses) == 4
+
+
+def test_key_reused_with_another_body(store):
+    app = create_app(store)
+    post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    response, = post(app, ({'name': 'b'}, {'Idempotency-Key': 'k1'}))
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+
+def test_server_error_is_not_stored(store):
+    app = create_app(store, fail_first=True)
+    first, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    second, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    assert (first.status_code, second.status_code) == (503, 201)
+    assert app.state.calls == 2
+
+
+def test_without_key_or_redis_requests_run(store):
+    app = create_app(store)
+    post(app, ({'name': 'a'}, {}), ({'name': 'a'}, {}))
+    assert app.state.calls == 2
+    store.r_cashe = AsyncMock()
+    store.r_cashe.set.side_effect = ConnectionError('Connection refused')
+    response, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k1'}))
+    assert response.status_code == 201
+    assert app.state.calls == 3
+
+
+def test_invalid_key(store):
+    app = create_app(store)
+    response, = post(app, ({'name': 'a'}, {'Idempotency-Key': 'k' * 256}))
+    assert response.status_code == 400
+    assert app.state.calls == 0
@@ -0,0 +1,69 @@
+import sys
+import marshal
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.conf.config import settings
+from src.middleware.profiling import ProfilingMiddleware
+from src.services.profiles import ProfileStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return ProfileStore(str(tmp_path), max_files=2)
+
+
+@pytest.fixture()
+def profiled_client(store, monkeypatch):
+    monkeypatch.setattr(settings, 'admin_token', 'secret')
+    app = FastAPI()
+
+    @app.get('/contacts/{contact_id}')
+    def contact(contact_id: int):
+        return {'id': contact_id}
+
+    app.add_middleware(ProfilingMiddleware, store=store)
+    return TestClient(app)
+
+
+def test_profile_with_admin_header(profiled_client, store):
+    response = profiled_client.get('/contacts/1', headers={'X-Profile': 'secret'})
+    assert response.status_code == 200
+    name = response.headers['x-profile-id']
+    assert name.endswith('-GET-contacts_contact_id.pstats')
+    stats = marshal.loads(store.get(name).read_bytes())
+    assert isinstance(stats, dict) and stats
+
+
+def test_no_profile_without_token(profiled_client, store):
+    assert 'x-profile-id' not in profiled_client.get('/contacts/1').headers
+    assert 'x-profile-id' not in profiled_client.get('/contacts/1', headers={'X-Profile': 'wrong'}).headers
+    assert store.list() == []
+
+
+def test_ring_buffer(profiled_client, store):
+    names = [profiled_client.get('/contacts/1', headers={'X-Profile': 'secret'}).headers['x-profile-id']
+             for _ in range(3)]
+    assert [profile['name'] for profile in store.list()] == names[:0:-1]
+    assert store.get(names[0]) is None
+    assert store.get('../../etc/passwd') is None
+
+
+def test_admin_profiles_routes(client, store, monkeypatch):
+    monkeypatch.setattr('src.routes.admin.profile_store', store)
+    monkeypatch.setattr(settings, 'admin_token', 'secret')
+    store.save(store.new_name('GET', '/api/contacts', 'pstats'), b'data')
+    assert client.get('/api/admin/profiles').status_code == 403
+    response = client.get('/api/admin/profiles', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200, response.text
+    name = response.json()[0]['name']
+    response = client.get(f'/api/admin/profiles/{name}', headers={'X-Admin-Token': 'secret'})
+    assert response.content == b'data'
+    response = client.get('/api/admin/profiles/missing.pstats', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 404
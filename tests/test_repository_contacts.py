@@ -1,8 +1,9 @@
 import sys
 from pathlib import Path
-from datetime import date
+from datetime import date, datetime
+from types import SimpleNamespace
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
@@ -11,6 +12,7 @@ path_root = Path(__file__).parent.parent
 sys.path.append(str(path_root))
 
 from src.database.models import User, Contact
+from src.services.cache import service_cache
 from src.schemas.contacts import (
     ContactModel,
     ContactFirstNameUpdate,
@@ -23,13 +25,20 @@ from src.schemas.contacts import (
 
 from src.repository.contacts import (
     get_contacts,
+    get_contacts_rows,
+    get_contacts_rows_by_ids,
+    get_contact_row,
     get_contact_by_id,
     get_contact_by_firstname,
     get_contact_by_lastname,
     get_contact_by_email,
     get_birthdays,
+    get_contact_by_phone,
+    birthday_dates,
     add_contact,
     delete_contact,
+    delete_contacts,
+    update_contacts,
     update_contact_firstname,
     update_contact_lastname,
     update_contact_email,
@@ -54,6 +63,26 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, contacts)
 
 
+    async def test_get_contacts_rows(self):
+        rows = [(1, 'first_name'), (2, 'first_name')]
+        self.session.query().filter().offset().limit().all.return_value = rows
+        result = await get_contacts_rows(user=self.user, skip=0, limit=10, db=self.session, fields=('id', 'first_name'))
+        self.assertEqual(result, rows)
+
+
+    async def test_get_contacts_rows_by_ids(self):
+        rows = [(2, 'first_name'), (1, 'first_name')]
+        self.session.query().filter().all.return_value = rows
+        result = await get_contacts_rows_by_ids([1, 2, 3], user=self.user, db=self.session, fields=('id', 'first_name'))
+        self.assertEqual(result, rows)
+
+
+    async def test_get_contact_row_not_found(self):
+        self.session.query().filter().order_by().first.return_value = None
+        with self.assertRaises(HTTPException) as err:
+            await get_contact_row(Contact.id, 1, user=self.user, db=self.session)
+
+
     async def test_get_contact_found(self):
         contact = Contact()
         self.session.query().filter().first.return_value = contact
@@ -92,6 +121,19 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             await get_contact_by_email(contact_email='email', user=self.user, db=self.session)
 
     
+    async def test_get_contact_by_phone_found(self):
+        contact = Contact()
+        self.session.query().filter().order_by().first.return_value = contact
+        result = await get_contact_by_phone(phone_number='+380501234567', user=self.user, db=self.session)
+        self.assertEqual(result, contact)
+
+
+    async def test_get_contact_by_phone_not_found(self):
+        self.session.query().filter().order_by().first.return_value = None
+        with self.assertRaises(HTTPException):
+            await get_contact_by_phone(phone_number='+380501234567', user=self.user, db=self.session)
+
+    
     async def test_get_birthdays_found(self):
         contacts = [
             Contact(birth_date=date(year=2005, month=12, day=1)), 
@@ -109,6 +151,12 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         result = await get_birthdays(user=self.user, db=self.session)
         self.assertListEqual(result, empty_list)
 
+
+    async def test_birthday_dates(self):
+        self.assertEqual(birthday_dates(date(2026, 12, 30), 3), [(12, 30), (12, 31), (1, 1)])
+        self.assertEqual(birthday_dates(date(2027, 2, 27), 3), [(2, 27), (2, 28), (2, 29), (3, 1)])
+        self.assertEqual(birthday_dates(date(2028, 2, 28), 2), [(2, 28), (2, 29)])
+
     
     async def test_add_contact(self):
         contact_model = ContactModel(
@@ -128,6 +176,14 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.description, contact_model.description)
         self.assertTrue(hasattr(result, 'id'))
 
+
+    async def test_add_contact_bumps_generation(self):
+        contact_model = ContactModel(first_name='firstname', birth_date=date(2000, month=2, day=2))
+        self.session.query().filter().first.return_value = None
+        with patch.object(service_cache, 'bump_generation') as bump_mock:
+            await add_contact(body=contact_model, user=self.user, db=self.session)
+            bump_mock.assert_awaited_once_with(self.user.id)
+
     
     async def test_delete_contact(self):
         contact = Contact()
@@ -136,6 +192,24 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, contact)
 
     
+    async def test_delete_contacts(self):
+        rows = [SimpleNamespace(id=3, updated_at=datetime(2026, 1, 1)), SimpleNamespace(id=2, updated_at=datetime(2026, 1, 1))]
+        self.session.execute().all.return_value = rows
+        with patch.object(service_cache, 'bump_generation') as bump_mock:
+            result = await delete_contacts(user=self.user, db=self.session, conditions={'last_name': 'lastname'})
+            bump_mock.assert_awaited_once_with(self.user.id)
+        self.assertEqual(result, [2, 3])
+        self.session.commit.assert_called_once()
+
+
+    async def test_update_contacts_none_found(self):
+        self.session.execute().all.return_value = []
+        with patch.object(service_cache, 'bump_generation') as bump_mock:
+            result = await update_contacts([1, 2], {'description': 'info'}, user=self.user, db=self.session)
+            bump_mock.assert_not_awaited()
+        self.assertEqual(result, [])
+
+    
     async def test_update_contact_first_name(self):
         contact = Contact()
         body = ContactFirstNameUpdate(first_name='firstname')
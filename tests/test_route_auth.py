@@ -8,6 +8,8 @@ from unittest.mock import MagicMock, patch
 import pytest
 from src.database.models import User
 from src.services.auth import service_auth
+from src.services.idempotency import service_idempotency
+from src.services.local_redis import LocalRedis
 
 
 def test_create_user(client, user, monkeypatch):
@@ -155,4 +157,17 @@ def test_request_email_reset_password_wrong_email(client):
         )
         assert response.status_code == 202, response.text
         data = response.json()
-        assert data['message'] == 'Check your email for further information'
\ No newline at end of file
+        assert data['message'] == 'Check your email for further information'
+
+def test_signup_idempotency_key(client, monkeypatch):
+    mock_send_email = MagicMock()
+    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    monkeypatch.setattr(service_idempotency, 'r_cashe', LocalRedis())
+    body = {"username": "retried", "email": "retried@example.com", "password": "password"}
+    headers = {"Idempotency-Key": "signup-retried"}
+    first = client.post("/api/auth/signup", json=body, headers=headers)
+    second = client.post("/api/auth/signup", json=body, headers=headers)
+    assert first.status_code == second.status_code == 201, second.text
+    assert second.json() == first.json()
+    assert second.headers['idempotent-replayed'] == 'true'
+    mock_send_email.assert_called_once()
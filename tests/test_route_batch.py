@@ -0,0 +1,119 @@
+import sys
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from unittest.mock import MagicMock, patch
+import pytest
+from src.database.models import User
+from src.services.auth import service_auth
+from src.services.events import broker
+from src.conf.config import settings
+
+CONTACT = {"last_name": "Ukrainka", "email": "example@example.ua", "phone_number": "38099999999",
+           "birth_date": "2000-10-1", "description": "hello world"}
+
+
+@pytest.fixture()
+def token(client, user, session, monkeypatch):
+    mock_send_email = MagicMock()
+    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    client.post("/api/auth/signup", json=user)
+    current_user: User = session.query(User).filter(User.email==user['email']).first()
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    return response.json()['access_token']
+
+
+def test_batch(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        responce = client.post(
+            "/api/batch",
+            json={"requests": [
+                {"method": "POST", "path": "/api/contacts/", "body": {"first_name": "Lesia", **CONTACT}},
+                {"path": "/api/contacts/?fields=first_name"},
+                {"path": "/api/contacts/999"},
+            ]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        assert r_mock.get.call_count == 1
+    data = responce.json()
+    assert [item['status'] for item in data['responses']] == [201, 200, 404]
+    assert data['responses'][1]['body'] == [{'id': 1, 'first_name': 'Lesia'}]
+    assert data['responses'][2]['body'] == {'detail': 'Contact does not exist'}
+    assert data['committed'] is True
+
+
+def test_atomic_batch_rolls_back(client, token):
+    subscription = broker.subscribe(1)
+    try:
+        with patch.object(service_auth, 'r_cashe') as r_mock:
+            r_mock.get.return_value = None
+            headers = {"Authorization": f"Bearer {token}"}
+            responce = client.post(
+                "/api/batch",
+                json={"atomic": True, "requests": [
+                    {"method": "POST", "path": "/api/contacts/", "body": {"first_name": "Bohdan", **CONTACT}},
+                    {"method": "PATCH", "path": "/api/contacts/first_name/999", "body": {"first_name": "Taras"}},
+                    {"method": "DELETE", "path": "/api/contacts/1"},
+                ]},
+                headers=headers
+            )
+            assert responce.status_code == 200, responce.text
+            data = responce.json()
+            assert [item['status'] for item in data['responses']] == [201, 404, 424]
+            assert data['committed'] is False
+            assert client.get("/api/contacts/firstname/Bohdan", headers=headers).status_code == 404
+            assert client.get("/api/contacts/1", headers=headers).status_code == 200
+        assert subscription.queue.empty()
+    finally:
+        broker.unsubscribe(1, subscription)
+
+
+def test_atomic_batch_commits(client, token):
+    subscription = broker.subscribe(1)
+    try:
+        with patch.object(service_auth, 'r_cashe') as r_mock:
+            r_mock.get.return_value = None
+            headers = {"Authorization": f"Bearer {token}"}
+            responce = client.post(
+                "/api/batch",
+                json={"atomic": True, "requests": [
+                    {"method": "POST", "path": "/api/contacts/", "body": {"first_name": "Bohdan", **CONTACT}},
+                    {"method": "PATCH", "path": "/api/contacts/first_name/1", "body": {"first_name": "Larysa"}},
+                ]},
+                headers=headers
+            )
+            assert responce.status_code == 200, responce.text
+            data = responce.json()
+            assert [item['status'] for item in data['responses']] == [201, 202]
+            assert data['committed'] is True
+            assert client.get("/api/contacts/firstname/Bohdan", headers=headers).status_code == 200
+            assert client.get("/api/contacts/1", headers=headers).json()['first_name'] == 'Larysa'
+        assert subscription.queue.qsize() == 2
+    finally:
+        broker.unsubscribe(1, subscription)
+
+
+def test_batch_invalid(client, token, monkeypatch):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        for path in ("/api/contacts/events", "/api/batch", "/api/auth/login"):
+            responce = client.post("/api/batch", json={"requests": [{"path": path}]}, headers=headers)
+            assert responce.status_code == 422, responce.text
+        monkeypatch.setattr(settings, 'batch_max_requests', 1)
+        responce = client.post("/api/batch", json={"requests": [{"path": "/api/contacts/"}] * 2}, headers=headers)
+        assert responce.status_code == 422, responce.text
+
+
+def test_batch_unauthorized(client):
+    responce = client.post("/api/batch", json={"requests": [{"path": "/api/contacts/"}]})
+    assert responce.status_code == 401, responce.text
@@ -4,10 +4,20 @@ from pathlib import Path
 path_root = Path(__file__).parent.parent
 sys.path.append(str(path_root))
 
+import asyncio
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 import pytest
+from main import app
 from src.database.models import User
 from src.services.auth import service_auth
+from src.services.cache import service_cache
+from src.services.events import HEARTBEAT, broker
+from src.services.idempotency import service_idempotency
+from src.services.local_redis import LocalRedis
+from src.services.sync import decode_cursor, encode_cursor
+from src.repository import contacts as repository_contacts
+from src.conf.config import settings
 
 
 @pytest.fixture()
@@ -64,6 +74,92 @@ def test_read_contacts(client, token):
         assert 'id' in data[0] 
 
 
+def test_read_contacts_etag(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock, patch.object(service_cache, 'r_cashe') as cache_mock:
+        r_mock.get.return_value = None
+        cache_mock.get.return_value = b'5'
+        responce = client.get(
+            "/api/contacts",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        etag = responce.headers['etag']
+        assert etag.endswith('-5"')
+        responce = client.get(
+            "/api/contacts",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+        )
+        assert responce.status_code == 304, responce.text
+        assert responce.headers['etag'] == etag
+        cache_mock.get.return_value = b'6'
+        responce = client.get(
+            "/api/contacts",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+        )
+        assert responce.status_code == 200, responce.text
+
+
+def test_read_contact_id_etag(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock, patch.object(service_cache, 'r_cashe') as cache_mock:
+        r_mock.get.return_value = None
+        cache_mock.get.return_value = b'5'
+        responce = client.get(
+            "/api/contacts/1",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": 'W/"contacts-1-5"'}
+        )
+        assert responce.status_code == 304, responce.text
+
+
+def test_read_contacts_fast_json(client, token, monkeypatch):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        expected = client.get("/api/contacts", headers={"Authorization": f"Bearer {token}"}).json()
+        monkeypatch.setattr(settings, 'fast_json_responses', True)
+        responce = client.get(
+            "/api/contacts",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        assert responce.headers['content-type'] == 'application/json'
+        assert responce.json() == expected
+        responce = client.get(
+            "/api/contacts/1",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == expected[0]
+
+
+def test_read_contacts_fields(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        responce = client.get(
+            "/api/contacts?fields=last_name,first_name",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        data = responce.json()
+        assert list(data[0]) == ['id', 'first_name', 'last_name']
+        assert data[0]['first_name'] == 'john'
+        responce = client.get(
+            "/api/contacts/1?fields=email",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == {'id': 1, 'email': 'example@example.ua'}
+
+
+def test_read_contacts_fields_unknown(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        responce = client.get(
+            "/api/contacts?fields=first_name,password",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 422, responce.text
+        assert responce.json()['detail'] == 'Unknown fields: password'
+
+
 def test_read_contacts_fail(client):
     with patch.object(service_auth, 'r_cashe') as r_mock:
         r_mock.get.return_value = None
@@ -126,6 +222,24 @@ def test_get_contact_firstname_fail(client, token):
             assert data['detail'] == 'Contact does not exist'
 
 
+def test_read_contact_by_phone(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        responce = client.get("/api/contacts/phone/380-99-999-999", headers=headers)
+        assert responce.status_code == 200, responce.text
+        data = responce.json()
+        assert data['first_name'] == 'john'
+        assert data['phone_number'] == '+38099999999'
+        responce = client.get("/api/contacts/phone/+38099999999", params={"fields": "id,phone_number"}, headers=headers)
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == {'id': data['id'], 'phone_number': '+38099999999'}
+        responce = client.get("/api/contacts/phone/+380501234567", headers=headers)
+        assert responce.status_code == 404, responce.text
+        responce = client.get("/api/contacts/phone/not-a-number", headers=headers)
+        assert responce.status_code == 422, responce.text
+
+
 def test_update_contact_first_name(client, token):
     with patch.object(service_auth, 'r_cashe') as r_mock:
         r_mock.get.return_value = None
@@ -187,4 +301,287 @@ def test_remove_contact_not_found(client, token):
         )
         assert responce.status_code == 404, responce.text
         data = responce.json()
-        assert data['detail'] == 'Contact does not exist'
\ No newline at end of file
+        assert data['detail'] == 'Contact does not exist'
+
+def test_read_changes(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        for first_name in ("Olena", "Taras"):
+            responce = client.post(
+                "/api/contacts/",
+                json={"first_name": first_name, "last_name": "Shevchenko", "email": "example@example.ua",
+                      "phone_number": "38099999999", "birth_date": "2000-10-1", "description": "hello world"},
+                headers=headers
+            )
+            assert responce.status_code == 201, responce.text
+        responce = client.get("/api/contacts/changes", params={"limit": 2}, headers=headers)
+        assert responce.status_code == 200, responce.text
+        data = responce.json()
+        assert data['has_more'] is True
+        assert [change['id'] for change in data['changes']] == [1, 2]
+        assert data['changes'][0]['deleted_at'] is not None
+        assert data['changes'][1]['deleted_at'] is None
+
+        responce = client.get("/api/contacts/changes", params={"since": data['next']}, headers=headers)
+        data = responce.json()
+        assert data['has_more'] is False
+        assert [change['first_name'] for change in data['changes']] == ['Taras']
+        since = data['next']
+
+        responce = client.get("/api/contacts/changes", params={"since": since}, headers=headers)
+        data = responce.json()
+        assert data['changes'] == [] and data['has_more'] is False
+        assert decode_cursor(data['next']) == decode_cursor(since)
+
+        client.delete("/api/contacts/2", headers=headers)
+        responce = client.get("/api/contacts/changes", params={"since": since}, headers=headers)
+        data = responce.json()
+        assert [change['id'] for change in data['changes']] == [2]
+        assert data['changes'][0]['deleted_at'] is not None
+
+
+def clock(now: datetime):
+    """
+    Patch utcnow where the change feed reads it.
+    """
+    datetime_mock = MagicMock(wraps=datetime)
+    datetime_mock.fromisoformat = datetime.fromisoformat
+    datetime_mock.utcnow.return_value = now
+    return patch('src.services.sync.datetime', datetime_mock), patch('src.routes.contacts.datetime', datetime_mock)
+
+
+def test_read_changes_of_an_idle_account(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        data = client.get("/api/contacts/changes", params={"limit": 1000}, headers=headers).json()
+        assert data['has_more'] is False
+        position = decode_cursor(data['next'])
+        # nothing changed for longer than the tombstones are kept, the client synced now and then
+        retention = timedelta(days=settings.tombstone_retention_days)
+        now = datetime.utcnow() + retention + timedelta(days=30)
+        since = encode_cursor(*position, now - retention + timedelta(days=1))
+        sync_patch, route_patch = clock(now)
+        with sync_patch, route_patch:
+            responce = client.get("/api/contacts/changes", params={"since": since}, headers=headers)
+            assert responce.status_code == 200, responce.text
+            data = responce.json()
+            assert data['changes'] == []
+            assert decode_cursor(data['next']) == position
+
+        # two days later the renewed cursor is still valid, the one that was not renewed is not
+        sync_patch, route_patch = clock(now + timedelta(days=2))
+        with sync_patch, route_patch:
+            assert client.get("/api/contacts/changes", params={"since": data['next']},
+                              headers=headers).status_code == 200
+            assert client.get("/api/contacts/changes", params={"since": since}, headers=headers).status_code == 410
+
+
+def test_read_changes_invalid_cursor(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        responce = client.get(
+            "/api/contacts/changes",
+            params={"since": "not a cursor"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert responce.status_code == 400, responce.text
+
+
+
+
+async def read_event_stream(headers: dict) -> bytes:
+    """
+    Call the events route straight through ASGI, since the test client waits for the end of a response
+    and an event stream never ends. The client disconnects after the first heartbeat.
+    """
+    chunks = []
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            assert message['status'] == 200
+        chunks.append(message.get('body', b''))
+        if message.get('body') == HEARTBEAT:
+            disconnected.set()
+
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http', 'path': '/api/contacts/events',
+             'raw_path': b'/api/contacts/events', 'root_path': '', 'query_string': b'',
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+             'client': ('testclient', 50000), 'server': ('testserver', 80)}
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    return b''.join(chunks)
+
+
+def test_read_events_replays_missed_changes(client, token, monkeypatch):
+    monkeypatch.setattr(settings, 'events_heartbeat_seconds', 0.01)
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        since = client.get("/api/contacts/changes", params={"limit": 1}, headers=headers).json()['next']
+        body = asyncio.run(read_event_stream({**headers, "Last-Event-ID": since}))
+    events = [line for line in body.decode().split('\n') if line.startswith('data: ')]
+    ids = [line[len('id: '):] for line in body.decode().split('\n') if line.startswith('id: ')]
+    assert len(events) == 2
+    # the last id renews the cursor at the position of the last replayed change
+    assert len(ids) == 3 and ids[-1] != ids[-2]
+    assert decode_cursor(ids[-1]) == decode_cursor(ids[-2])
+    assert '"type":"updated","id":3' in events[0]
+    assert '"type":"deleted","id":2' in events[1]
+    assert broker.streams == 0
+
+
+def test_read_contacts_first_page_cache(client, token, monkeypatch):
+    monkeypatch.setattr(service_cache, 'r_cashe', LocalRedis())
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        first = client.get("/api/contacts/", headers=headers)
+        assert first.status_code == 200, first.text
+        with patch.object(repository_contacts, 'get_contacts_rows') as rows_mock:
+            second = client.get("/api/contacts/", headers=headers)
+            rows_mock.assert_not_called()
+        assert second.content == first.content
+        assert second.headers['etag'] == first.headers['etag']
+        client.delete("/api/contacts/3", headers=headers)
+        third = client.get("/api/contacts/", headers=headers)
+        assert third.json() == []
+
+
+def test_read_contacts_batch(client, token, monkeypatch):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        responce = client.post(
+            "/api/contacts/",
+            json={"first_name": "Mykola", "last_name": "Lysenko", "email": "example@example.ua",
+                  "phone_number": "38099999999", "birth_date": "2000-10-1", "description": "hello world"},
+            headers=headers
+        )
+        contact_id = responce.json()['id']
+        responce = client.post("/api/contacts/batch_get", json={"ids": [contact_id, 3, 999, contact_id]},
+                               params={"fields": "first_name"}, headers=headers)
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == {'contacts': [{'id': contact_id, 'first_name': 'Mykola'}], 'missing': [3, 999]}
+
+        monkeypatch.setattr(settings, 'contacts_batch_max_ids', 2)
+        responce = client.post("/api/contacts/batch_get", json={"ids": [1, 2, 3]}, headers=headers)
+        assert responce.status_code == 422, responce.text
+        responce = client.post("/api/contacts/batch_get", json={"ids": []}, headers=headers)
+        assert responce.status_code == 422, responce.text
+
+
+def test_bulk_update_and_delete(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        ids = []
+        for first_name in ("Ivan", "Petro"):
+            responce = client.post(
+                "/api/contacts/",
+                json={"first_name": first_name, "last_name": "Franko", "email": "example@example.ua",
+                      "phone_number": "38099999999", "birth_date": "2000-10-1", "description": "hello world"},
+                headers=headers
+            )
+            ids.append(responce.json()['id'])
+        responce = client.patch("/api/contacts/bulk_update",
+                                json={"ids": ids + [999], "values": {"last_name": "Kotsiubynsky"}}, headers=headers)
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == {'affected': 2, 'ids': ids}
+        contacts = client.post("/api/contacts/batch_get", json={"ids": ids}, headers=headers).json()['contacts']
+        assert {contact['last_name'] for contact in contacts} == {'Kotsiubynsky'}
+
+        responce = client.post("/api/contacts/bulk_delete", json={"filter": {"last_name": "Kotsiubynsky"}},
+                               headers=headers)
+        assert responce.status_code == 200, responce.text
+        assert responce.json() == {'affected': 2, 'ids': ids}
+        assert client.post("/api/contacts/batch_get", json={"ids": ids}, headers=headers).json()['missing'] == ids
+        responce = client.post("/api/contacts/bulk_delete", json={"ids": ids}, headers=headers)
+        assert responce.json() == {'affected': 0, 'ids': []}
+
+
+def test_bulk_requests_invalid(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        for body in ({}, {"filter": {}}, {"ids": [1], "filter": {"last_name": "Franko"}}):
+            responce = client.post("/api/contacts/bulk_delete", json=body, headers=headers)
+            assert responce.status_code == 422, responce.text
+        for values in ({}, {"phone_number": None}):
+            responce = client.patch("/api/contacts/bulk_update", json={"ids": [1], "values": values}, headers=headers)
+            assert responce.status_code == 422, responce.text
+        responce = client.post("/api/contacts/bulk_delete", json={"filter": {"phone_number": None}}, headers=headers)
+        assert responce.status_code == 422, responce.text
+
+
+def test_create_contact_idempotency_key(client, token, monkeypatch):
+    monkeypatch.setattr(service_idempotency, 'r_cashe', LocalRedis())
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "0b6c1c1e-retry"}
+        body = {"first_name": "Marko", "last_name": "Vovchok", "email": "example@example.ua",
+                "phone_number": "38099999999", "birth_date": "2000-10-1", "description": "hello world"}
+        first = client.post("/api/contacts/", json=body, headers=headers)
+        second = client.post("/api/contacts/", json=body, headers=headers)
+        assert first.status_code == second.status_code == 201, second.text
+        assert second.json() == first.json()
+        assert second.headers['idempotent-replayed'] == 'true'
+
+
+def test_contact_with_short_international_number(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        responce = client.post(
+            "/api/contacts/",
+            json={"first_name": "Falkland", "last_name": "Islander", "email": "example@example.ua",
+                  "phone_number": "+500 12345", "birth_date": "2000-10-1", "description": "hello world"},
+            headers=headers
+        )
+        assert responce.status_code == 201, responce.text
+        contact_id = responce.json()['id']
+        assert responce.json()['phone_number'] == '+50012345'
+        responce = client.get(f"/api/contacts/{contact_id}", headers=headers)
+        assert responce.status_code == 200, responce.text
+        responce = client.get("/api/contacts/phone/+50012345", headers=headers)
+        assert responce.status_code == 200, responce.text
+        assert responce.json()['id'] == contact_id
+        client.delete(f"/api/contacts/{contact_id}", headers=headers)
+
+
+def test_read_contact_by_shared_phone(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        ids = []
+        for first_name in ("Hryhorii", "Skovoroda"):
+            responce = client.post(
+                "/api/contacts/",
+                json={"first_name": first_name, "last_name": "Shared", "email": "example@example.ua",
+                      "phone_number": "+380 44 123 45 67", "birth_date": "2000-10-1", "description": "hello world"},
+                headers=headers
+            )
+            ids.append(responce.json()['id'])
+        for params in ({}, {"fields": "id,first_name"}):
+            responce = client.get("/api/contacts/phone/+380441234567", params=params, headers=headers)
+            assert responce.status_code == 200, responce.text
+            assert responce.json()['id'] == min(ids)
+
+
+def test_read_contacts_invalid_page(client, token):
+    with patch.object(service_auth, 'r_cashe') as r_mock:
+        r_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        for params in ({"limit": -1}, {"limit": 0}, {"skip": -1}):
+            responce = client.get("/api/contacts/", params=params, headers=headers)
+            assert responce.status_code == 422, responce.text
@@ -0,0 +1,96 @@
+import sys
+import io
+import tempfile
+from pathlib import Path
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from PIL import Image
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from src.conf.config import settings
+from src.services import avatars as service_avatars
+from src.services.etag import etag_matches
+
+
+def make_image(width=640, height=480, image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class TestAvatars(unittest.IsolatedAsyncioTestCase):
+
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_patch = patch.object(settings, 'avatar_dir', self.tmp_dir.name)
+        self.dir_patch.start()
+
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.tmp_dir.cleanup()
+
+
+    def test_render_avatar(self):
+        rendered = service_avatars.render_avatar(make_image(), 250, 'WEBP')
+        with Image.open(io.BytesIO(rendered)) as img:
+            self.assertEqual(img.size, (250, 250))
+            self.assertEqual(img.format, 'WEBP')
+
+
+    def test_render_avatar_jpeg(self):
+        rendered = service_avatars.render_avatar(make_image(100, 300, 'PNG'), 250, 'JPEG')
+        with Image.open(io.BytesIO(rendered)) as img:
+            self.assertEqual(img.size, (250, 250))
+            self.assertEqual(img.format, 'JPEG')
+
+
+    async def test_store_avatar(self):
+        data = make_image()
+        filename = await service_avatars.store_avatar(data)
+        self.assertTrue(service_avatars.avatar_path(filename).is_file())
+        self.assertTrue(filename.startswith(service_avatars.avatar_digest(data)))
+
+
+    async def test_store_avatar_identical_upload(self):
+        data = make_image()
+        filename = await service_avatars.store_avatar(data)
+        with patch.object(service_avatars, 'render_avatar') as render_mock:
+            self.assertEqual(await service_avatars.store_avatar(data), filename)
+            render_mock.assert_not_called()
+
+
+    async def test_store_avatar_invalid_image(self):
+        with self.assertRaises(HTTPException) as err:
+            await service_avatars.store_avatar(b'not an image')
+        self.assertEqual(err.exception.status_code, 400)
+
+
+    async def test_store_avatar_too_large(self):
+        with patch.object(settings, 'avatar_max_bytes', 10):
+            with self.assertRaises(HTTPException) as err:
+                await service_avatars.store_avatar(make_image())
+        self.assertEqual(err.exception.status_code, 413)
+
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('W/"abc"', '"abc"'))
+        self.assertTrue(etag_matches('"x", "abc"', '"abc"'))
+        self.assertTrue(etag_matches('*', '"abc"'))
+        self.assertFalse(etag_matches('"x"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+
+    @classmethod
+    def tearDownClass(cls):
+        service_avatars.shutdown_executor()
+
+
+if __name__ == '__main__':
+    unittest.main()
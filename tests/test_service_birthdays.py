@@ -0,0 +1,138 @@
+import sys
+import asyncio
+from datetime import date, datetime
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import orjson
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, User
+from src.services import birthdays as service_birthdays
+from src.services.birthdays import birthdays_page, run_digest
+from src.services.cache import service_cache
+from src.services.local_redis import LocalRedis
+
+TODAY = date(2027, 2, 25)
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    users = [User(username='first', email='first@example.com', password='x', confirmed=True),
+             User(username='second', email='second@example.com', password='x', confirmed=True)]
+    session.add_all(users)
+    session.flush()
+
+    def contact(user, name, birth_date, deleted_at=None):
+        return Contact(first_name=name, last_name=name, email=f'{name}@example.com', phone_number='+380501234567',
+                       birth_date=birth_date, user_id=user.id, deleted_at=deleted_at)
+
+    session.add_all([
+        contact(users[0], 'leap', date(2000, 2, 29)),
+        contact(users[0], 'march', date(1990, 3, 4)),
+        contact(users[0], 'late', date(1990, 3, 5)),
+        contact(users[0], 'deleted', date(1990, 3, 1), deleted_at=datetime(2027, 1, 1)),
+        contact(users[1], 'june', date(1990, 6, 1)),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_run_digest(db, monkeypatch):
+    monkeypatch.setattr(service_cache, 'r_cashe', LocalRedis())
+    monkeypatch.setattr(settings, 'birthdays_days', 7)
+    sent = []
+
+    async def send_birthday_digest(email, username, contacts):
+        sent.append((email, [contact['first_name'] for contact in contacts]))
+
+    monkeypatch.setattr('src.services.email.send_birthday_digest', send_birthday_digest)
+
+    async def fail():
+        raise AssertionError('the digest should have stored the page')
+
+    async def run():
+        summary = await run_digest(db, TODAY, send_emails=True)
+        assert summary == {'date': '2027-02-25', 'users': 2, 'contacts': 2, 'emails': 1}
+        pages = {}
+        for user_id in (1, 2):
+            generation = await service_cache.get_generation(user_id)
+            pages[user_id] = await service_cache.read_through(user_id, generation, birthdays_page(TODAY), fail)
+        return pages
+
+    pages = asyncio.run(run())
+    assert [contact['first_name'] for contact in orjson.loads(pages[1])] == ['leap', 'march']
+    assert orjson.loads(pages[1])[0]['birth_date'] == '2000-02-29'
+    assert orjson.loads(pages[2]) == []
+    assert sent == [('first@example.com', ['leap', 'march'])]
+
+
+def test_scheduler_runs_once_a_day(db, monkeypatch):
+    monkeypatch.setattr(service_cache, 'r_cashe', LocalRedis())
+    monkeypatch.setattr('src.database.db.SessionLocal', lambda: db)
+    monkeypatch.setattr(settings, 'birthday_digest_emails', False)
+    scheduler = service_birthdays.DigestScheduler()
+
+    async def run():
+        return [await scheduler.run_once(TODAY), await scheduler.run_once(TODAY)]
+
+    first, second = asyncio.run(run())
+    assert first['users'] == 2
+    assert second is None
+
+
+@pytest.mark.parametrize('emails_before_failure, retried', [(0, True), (1, False)])
+def test_failed_run_is_retried_only_before_emails(db, monkeypatch, emails_before_failure, retried):
+    monkeypatch.setattr(service_cache, 'r_cashe', LocalRedis())
+    monkeypatch.setattr('src.database.db.SessionLocal', lambda: db)
+    monkeypatch.setattr(settings, 'birthday_digest_emails', True)
+    monkeypatch.setattr(settings, 'birthdays_days', 7)
+    db.add(Contact(first_name='soon', last_name='soon', email='soon@example.com', phone_number='+380501234567',
+                   birth_date=date(1990, 2, 27), user_id=2))
+    db.commit()
+    calls = []
+
+    async def send_birthday_digest(email, username, contacts):
+        calls.append(email)
+        if len(calls) > emails_before_failure:
+            raise RuntimeError('mail server gone')
+
+    monkeypatch.setattr('src.services.email.send_birthday_digest', send_birthday_digest)
+    scheduler = service_birthdays.DigestScheduler()
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await scheduler.run_once(TODAY)
+        monkeypatch.setattr(settings, 'birthday_digest_emails', False)
+        return await scheduler.run_once(TODAY)
+
+    assert (asyncio.run(run()) is not None) == retried
+
+
+def test_scheduler_survives_any_error(monkeypatch):
+    monkeypatch.setattr(settings, 'birthday_digest_hour', 0)
+    scheduler = service_birthdays.DigestScheduler()
+
+    async def run_once(today):
+        raise KeyError('unexpected')
+
+    monkeypatch.setattr(scheduler, 'run_once', run_once)
+
+    async def run():
+        task = asyncio.create_task(scheduler._run())
+        await asyncio.sleep(0.01)
+        # still waiting for tomorrow instead of having died with the error
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(run())
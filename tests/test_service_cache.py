@@ -0,0 +1,55 @@
+import sys
+import asyncio
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from src.services.cache import Cache
+from src.services.local_redis import LocalRedis
+
+
+def test_read_through():
+    cache = Cache()
+    cache.r_cashe = LocalRedis()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return b'[{"id":1}]'
+
+    async def run():
+        generation = await cache.get_generation(1)
+        assert await cache.read_through(1, generation, 'first_page:10:', load) == b'[{"id":1}]'
+        assert await cache.read_through(1, generation, 'first_page:10:', load) == b'[{"id":1}]'
+        assert len(loads) == 1
+        await cache.bump_generation(1)
+        await cache.read_through(1, await cache.get_generation(1), 'first_page:10:', load)
+        assert len(loads) == 2
+        await cache.read_through(1, None, 'first_page:10:', load)
+        assert len(loads) == 3
+
+    asyncio.run(run())
+
+
+def test_get_generations_write_pages():
+    cache = Cache()
+    cache.r_cashe = LocalRedis()
+
+    async def load():
+        return b'[]'
+
+    async def run():
+        first = await cache.get_generation(1)
+        generations = await cache.get_generations([1, 2])
+        assert generations[1] == first
+        assert generations[2] == await cache.get_generation(2)
+        await cache.write_pages({cache.page_key(2, generations[2], 'birthdays:2027-01-01:'): b'[{"id":7}]'}, 60)
+        assert await cache.read_through(2, generations[2], 'birthdays:2027-01-01:', load) == b'[{"id":7}]'
+
+    asyncio.run(run())
+
+
+def test_etag():
+    assert Cache.etag(1, 5) == 'W/"contacts-1-5"'
+    assert Cache.etag(1, None) is None
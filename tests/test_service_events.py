@@ -0,0 +1,129 @@
+import sys
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import orjson
+from redis.exceptions import ConnectionError
+
+from src.conf.config import settings
+from src.services.events import CLOSE, HEARTBEAT, RESYNC, Broker, Subscription, event_stream, format_event
+from src.services import events as service_events
+from src.services.sync import encode_cursor
+
+
+def contact(contact_id: int = 1):
+    return SimpleNamespace(id=contact_id, first_name='Olena', last_name='Shevchenko', email='olena@ukr.net',
+                           phone_number='+380501234567', birth_date=datetime(1990, 5, 1).date(),
+                           description='', updated_at=datetime(2026, 1, 2, 3, 4, 5, 6))
+
+
+def test_format_event():
+    event = format_event('updated', contact(7))
+    lines = event.decode().split('\n')
+    assert lines[0] == f'id: {encode_cursor(datetime(2026, 1, 2, 3, 4, 5, 6), 7)}'
+    assert lines[1] == 'event: contact'
+    data = orjson.loads(lines[2][len('data: '):])
+    assert data['type'] == 'updated' and data['id'] == 7
+    assert data['contact']['birth_date'] == '1990-05-01'
+    assert event.endswith(b'\n\n')
+    assert 'contact' not in orjson.loads(format_event('deleted', contact()).split(b'\n')[2][6:])
+
+
+def test_local_broker_delivers_to_the_users_streams():
+    async def run():
+        broker = Broker()
+        mine, other = broker.subscribe(1), broker.subscribe(2)
+        await broker.publish(1, b'event')
+        assert mine.queue.get_nowait() == b'event'
+        assert other.queue.empty()
+        broker.unsubscribe(1, mine)
+        assert broker.streams == 1
+
+    asyncio.run(run())
+
+
+def test_publish_many_keeps_the_order():
+    async def run():
+        broker = Broker()
+        subscription = broker.subscribe(1)
+        await broker.publish_many(1, [b'first', b'second'])
+        assert subscription.queue.get_nowait() == b'first'
+        assert subscription.queue.get_nowait() == b'second'
+
+    asyncio.run(run())
+
+
+def test_redis_broker_falls_back_to_local_delivery():
+    async def run():
+        broker = Broker()
+        broker.redis = AsyncMock()
+        broker.redis.publish.side_effect = ConnectionError('Connection refused')
+        subscription = broker.subscribe(1)
+        await broker.publish(1, b'event')
+        assert subscription.queue.get_nowait() == b'event'
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_gets_resync():
+    async def run():
+        subscription = Subscription(maxsize=2)
+        for i in range(3):
+            subscription.put(b'event %d' % i)
+        assert subscription.queue.get_nowait() == RESYNC
+        assert subscription.queue.empty()
+
+    asyncio.run(run())
+
+
+def test_event_stream_heartbeat_and_close(monkeypatch):
+    monkeypatch.setattr(settings, 'events_heartbeat_seconds', 0.01)
+
+    async def run():
+        broker = Broker()
+        monkeypatch.setattr(service_events, 'broker', broker)
+        subscription = broker.subscribe(1)
+        stream = event_stream(1, subscription, [b'missed'])
+        assert await anext(stream) == b'missed'
+        assert await anext(stream) == HEARTBEAT
+        await broker.stop()
+        assert await anext(stream) == CLOSE
+        assert [chunk async for chunk in stream] == []
+        assert broker.streams == 0
+
+    asyncio.run(run())
+
+
+def test_event_stream_ends_after_max_lifetime(monkeypatch):
+    monkeypatch.setattr(settings, 'events_heartbeat_seconds', 10)
+    monkeypatch.setattr(settings, 'events_stream_max_seconds', 0.02)
+
+    async def run():
+        broker = Broker()
+        monkeypatch.setattr(service_events, 'broker', broker)
+        subscription = broker.subscribe(1)
+        chunks = [chunk async for chunk in event_stream(1, subscription, [])]
+        assert chunks == [CLOSE]
+        assert broker.streams == 0
+
+    asyncio.run(asyncio.wait_for(run(), 1))
+
+
+def test_redis_broker_subscribes_with_its_own_client():
+    async def run():
+        broker = Broker()
+        client, subscriber = AsyncMock(), MagicMock()
+        subscriber.pubsub.side_effect = asyncio.CancelledError
+        await broker.start(client, subscriber)
+        await asyncio.sleep(0)
+        subscriber.pubsub.assert_called()
+        client.pubsub.assert_not_called()
+        await broker.stop()
+
+    asyncio.run(run())
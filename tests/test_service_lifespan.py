@@ -0,0 +1,116 @@
+import sys
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_limiter import FastAPILimiter
+from redis.exceptions import ConnectionError
+from sqlalchemy import create_engine
+
+from main import app
+from src.conf.config import settings
+from src.middleware.inflight import InFlightMiddleware
+from src.services import lifespan as service_lifespan
+from src.services.auth import service_auth
+from src.services.cache import service_cache
+from src.services.lifespan import AppState, app_state
+
+
+@pytest.fixture()
+def resources(monkeypatch):
+    redis_mock = AsyncMock()
+    monkeypatch.setattr(service_lifespan, 'create_redis', lambda decode_responses=False: redis_mock)
+    monkeypatch.setattr(service_lifespan, 'engine', create_engine('sqlite://'))
+    monkeypatch.setattr(settings, 'events_broker', 'local')
+    for obj, name in ((service_auth, 'r_cashe'), (service_cache, 'r_cashe'), (FastAPILimiter, 'redis'),
+                      (FastAPILimiter, 'lua_sha')):
+        monkeypatch.setattr(obj, name, getattr(obj, name))
+    state = dict(vars(app_state))
+    yield redis_mock
+    vars(app_state).update(state)
+    app_state.checks = {}
+
+
+def test_ready_after_startup(resources):
+    with TestClient(app) as client:
+        response = client.get('/ready')
+        assert response.status_code == 200, response.text
+        assert response.json()['checks'] == {'redis': True, 'rate_limiter': True, 'database': True, 'mail': True}
+        assert service_auth.r_cashe is resources
+    assert app_state.draining
+    resources.close.assert_awaited()
+
+
+def test_not_ready_without_redis(resources):
+    resources.ping.side_effect = ConnectionError('Connection refused')
+    with TestClient(app) as client:
+        response = client.get('/ready')
+        assert response.status_code == 503, response.text
+        assert response.json()['checks']['redis'] is False
+        assert client.get('/live').status_code == 200
+
+
+def test_drain():
+    state = AppState()
+
+    async def drain():
+        state.request_started()
+        assert not await state.drain(0.01)
+        asyncio.get_running_loop().call_later(0.01, state.request_finished)
+        assert await state.drain(1)
+
+    asyncio.run(drain())
+
+
+def test_draining_refuses_requests():
+    state = AppState()
+    small_app = FastAPI()
+
+    @small_app.get('/contacts')
+    def contacts():
+        return []
+
+    small_app.add_middleware(InFlightMiddleware, state=state)
+    client = TestClient(small_app)
+    assert client.get('/contacts').status_code == 200
+    assert state.in_flight == 0
+    state.draining = True
+    response = client.get('/contacts')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+
+
+def test_before_shutdown_drains_while_not_ready(resources, monkeypatch):
+    monkeypatch.setattr(settings, 'shutdown_grace_seconds', 0.05)
+    monkeypatch.setattr(settings, 'shutdown_timeout', 1.0)
+    app_state.started = True
+    app_state.checks = {'redis': True}
+
+    async def stop():
+        app_state.request_started()
+        stopping = asyncio.ensure_future(service_lifespan.before_shutdown())
+        await asyncio.sleep(0.01)
+        assert app_state.stopping and not app_state.ready
+        # requests are still served during the grace period
+        assert not app_state.draining
+        await asyncio.sleep(0.1)
+        assert app_state.draining and not stopping.done()
+        app_state.request_finished()
+        await asyncio.wait_for(stopping, 1)
+
+    asyncio.run(stop())
+
+
+def test_create_redis_waits_for_a_connection(monkeypatch):
+    monkeypatch.setattr(settings, 'web_concurrency', 0)
+    client = service_lifespan.create_redis()
+    pool = client.connection_pool
+    assert type(pool).__name__ == 'BlockingConnectionPool'
+    assert pool.max_connections == (settings.redis_max_connections - 1) // 2
+    assert pool.timeout == settings.redis_pool_timeout
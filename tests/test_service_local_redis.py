@@ -0,0 +1,62 @@
+import sys
+import asyncio
+from pathlib import Path
+import unittest
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from src.services.local_redis import LocalRedis
+
+
+class TestLocalRedis(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = LocalRedis()
+
+    async def test_set_get(self):
+        self.assertTrue(await self.redis.set('key', 'value'))
+        self.assertEqual(await self.redis.get('key'), b'value')
+        self.assertIsNone(await self.redis.get('missing'))
+
+    async def test_set_nx_xx(self):
+        self.assertIsNone(await self.redis.set('key', 1, xx=True))
+        self.assertTrue(await self.redis.set('key', 1, nx=True))
+        self.assertIsNone(await self.redis.set('key', 2, nx=True))
+        self.assertEqual(await self.redis.get('key'), b'1')
+
+    async def test_incr(self):
+        self.assertEqual(await self.redis.incr('counter'), 1)
+        await self.redis.set('counter', 41)
+        self.assertEqual(await self.redis.incr('counter'), 42)
+        self.assertEqual(await self.redis.get('counter'), b'42')
+
+    async def test_expire(self):
+        await self.redis.set('key', b'value', px=20)
+        self.assertEqual(await self.redis.ttl('key'), 0)
+        await asyncio.sleep(0.03)
+        self.assertIsNone(await self.redis.get('key'))
+        self.assertFalse(await self.redis.expire('key', 10))
+        await self.redis.set('key', b'value')
+        self.assertEqual(await self.redis.ttl('key'), -1)
+        self.assertTrue(await self.redis.expire('key', 10))
+        self.assertEqual(await self.redis.ttl('key'), 10)
+
+    async def test_delete_exists(self):
+        await self.redis.set('a', 1)
+        await self.redis.set('b', 2)
+        self.assertEqual(await self.redis.exists('a', 'b', 'c'), 2)
+        self.assertEqual(await self.redis.delete('a', 'c'), 1)
+        self.assertEqual(await self.redis.exists('a'), 0)
+
+    async def test_pipeline(self):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set('a', 1, nx=True)
+            pipe.set('a', 2, nx=True)
+            pipe.incr('a')
+            pipe.get('a')
+            self.assertEqual(await pipe.execute(), [True, None, 2, b'2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
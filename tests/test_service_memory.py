@@ -0,0 +1,95 @@
+import sys
+import tracemalloc
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.conf.config import settings
+from src.middleware.memory import MemoryMiddleware
+from src.services.memory import MemoryTracker, rss_bytes, gc_stats
+
+HEADERS = {'X-Admin-Token': 'secret'}
+
+
+@pytest.fixture()
+def tracker():
+    tracker = MemoryTracker()
+    yield tracker
+    tracker.stop()
+
+
+def test_rss_and_gc():
+    assert rss_bytes() > 0
+    stats = gc_stats()
+    assert len(stats['counts']) == 3
+    assert len(stats['generations']) == 3
+
+
+def test_rss_without_proc_and_resource(monkeypatch):
+    from src.services import memory as service_memory
+
+    def no_proc(*args, **kwargs):
+        raise OSError('no /proc')
+
+    monkeypatch.setattr('builtins.open', no_proc)
+    monkeypatch.setattr(service_memory, 'resource', None)
+    monkeypatch.setitem(sys.modules, 'psutil', None)
+    tracemalloc.start()
+    try:
+        data = [bytes(1000) for _ in range(100)]
+        assert rss_bytes() >= 100 * 1000
+    finally:
+        tracemalloc.stop()
+        del data
+
+
+def test_route_allocations(tracker):
+    app = FastAPI()
+    kept = []
+
+    @app.get('/contacts/{contact_id}')
+    def contact(contact_id: int):
+        kept.append(bytearray(1_000_000))
+        return {'id': contact_id}
+
+    app.add_middleware(MemoryMiddleware, tracker=tracker)
+    client = TestClient(app)
+    client.get('/contacts/1')
+    assert tracker.route_stats() == {}
+
+    tracker.start()
+    client.get('/contacts/1')
+    client.get('/contacts/2')
+    stats = tracker.route_stats()['GET /contacts/{contact_id}']
+    assert stats['requests'] == 2
+    assert stats['allocated_bytes_avg'] >= 1_000_000
+    assert stats['peak_bytes_max'] >= 1_000_000
+    assert any(site['size_diff_bytes'] >= 2_000_000 for site in tracker.growth(5))
+    assert tracker.top(5)[0]['size_bytes'] >= 1_000_000
+
+
+def test_admin_memory_routes(client, monkeypatch):
+    monkeypatch.setattr(settings, 'admin_token', 'secret')
+    assert client.get('/api/admin/memory').status_code == 403
+    response = client.get('/api/admin/memory', headers=HEADERS)
+    assert response.status_code == 200, response.text
+    assert response.json()['rss_bytes'] > 0
+    assert client.get('/api/admin/memory/top', headers=HEADERS).status_code == 409
+    try:
+        response = client.post('/api/admin/memory/tracemalloc/start', headers=HEADERS)
+        assert response.json()['tracemalloc']['enabled'] is True
+        client.get('/')
+        response = client.get('/api/admin/memory', headers=HEADERS)
+        assert 'GET /' in response.json()['routes']
+        response = client.get('/api/admin/memory/top', params={'growth': True}, headers=HEADERS)
+        assert response.status_code == 200, response.text
+    finally:
+        response = client.post('/api/admin/memory/tracemalloc/stop', headers=HEADERS)
+    assert response.json()['tracemalloc']['enabled'] is False
+    assert not tracemalloc.is_tracing()
+    assert 'collected' in client.post('/api/admin/memory/gc', headers=HEADERS).json()
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+
+from src.conf.config import settings
+from src.services.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = Counter('requests_total', 'Requests.', ('method',), registry=registry)
+    counter.labels('GET').inc()
+    counter.labels(method='GET').inc(2)
+    output = registry.render().decode()
+    assert '# TYPE requests_total counter' in output
+    assert 'requests_total{method="GET"} 3' in output
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0), registry=registry)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    output = registry.render().decode()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in output
+    assert 'latency_seconds_bucket{le="1"} 2' in output
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in output
+    assert 'latency_seconds_count 3' in output
+    assert 'latency_seconds_sum 5.55' in output
+
+
+def test_gauge_function():
+    registry = Registry()
+    Gauge('ratio', 'Ratio.', function=lambda: 0.5, registry=registry)
+    assert 'ratio 0.5' in registry.render().decode()
+
+
+def test_metric_needs_a_child_type():
+    with pytest.raises(TypeError):
+        Metric('plain', 'Plain.', registry=Registry())
+
+
+def test_metrics_route(client, monkeypatch):
+    monkeypatch.setattr(settings, 'admin_token', 'secret')
+    client.get('/')
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200, response.text
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="0.005"}' in response.text
+    assert 'user_cache_hit_ratio' in response.text
+    assert 'db_pool_checkout_seconds_count' in response.text
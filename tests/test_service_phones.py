@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+
+from src.services.phones import normalize_phone
+
+
+@pytest.mark.parametrize('number', ['+380501234567', '+38 (050) 123 45 67', '00380501234567', '050-123-45-67',
+                                    '0501234567', '380501234567', ' 38.050.123.45.67 '])
+def test_normalize_phone(number):
+    assert normalize_phone(number) == '+380501234567'
+
+
+def test_normalize_phone_other_country():
+    assert normalize_phone('+1 (212) 555-0100') == '+12125550100'
+    assert normalize_phone('0044 20 7946 0958') == '+442079460958'
+
+
+@pytest.mark.parametrize('number', ['050 123 45 67 ext 2', '+38050123456789012', '+1234567', '380+501234567',
+                                    '+38050123456\u00b9', '+\u0663\u0668\u0660501234567', '+'])
+def test_normalize_phone_invalid(number):
+    with pytest.raises(ValueError):
+        normalize_phone(number)
@@ -0,0 +1,58 @@
+import sys
+import asyncio
+import signal
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import uvicorn
+
+from src.services import server as service_server
+from src.services.events import CLOSE, Broker
+from src.services import lifespan as service_lifespan
+from src.services.server import GracefulServer
+
+
+async def app(scope, receive, send):
+    pass
+
+
+def test_before_shutdown_runs_before_the_server_exits(monkeypatch):
+    calls = []
+
+    async def before_shutdown():
+        calls.append(server.should_exit)
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(service_server, 'before_shutdown', before_shutdown)
+    server = GracefulServer(uvicorn.Config(app))
+
+    async def run():
+        server.handle_exit(signal.SIGTERM, None)
+        assert not server.should_exit
+        await server.on_tick(1)
+        await server._stopping
+        assert server.should_exit
+
+    asyncio.run(run())
+    assert calls == [False]
+
+
+def test_second_signal_exits_at_once(monkeypatch):
+    server = GracefulServer(uvicorn.Config(app))
+    server.handle_exit(signal.SIGTERM, None)
+    server.handle_exit(signal.SIGTERM, None)
+    assert server.should_exit
+
+
+def test_before_shutdown_closes_event_streams(monkeypatch):
+    broker = Broker()
+    monkeypatch.setattr(service_lifespan, 'broker', broker)
+
+    async def run():
+        subscription = broker.subscribe(1)
+        await service_lifespan.before_shutdown()
+        assert subscription.queue.get_nowait() == CLOSE
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+import sys
+import asyncio
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User
+from src.services.auth import Auth
+from src.services.local_redis import LocalRedis
+from src.services.singleflight import SingleFlight, should_refresh_early
+
+
+def test_concurrent_calls_share_one_load():
+    flight = SingleFlight('test')
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return len(loads)
+
+    async def run():
+        results = await asyncio.gather(*(flight.do('key', load) for _ in range(10)))
+        assert results == [1] * 10
+        assert await flight.do('key', load) == 2
+        assert flight.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight('test')
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise ValueError('database is down')
+
+    async def run():
+        results = await asyncio.gather(*(flight.do('key', load) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_the_load():
+    flight = SingleFlight('test')
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return 'user'
+
+    async def run():
+        first = asyncio.ensure_future(flight.do('key', load))
+        second = asyncio.ensure_future(flight.do('key', load))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 'user'
+
+    asyncio.run(run())
+
+
+def test_should_refresh_early():
+    now = time.time()
+    assert should_refresh_early(0.01, now - 1, now=now)
+    assert not should_refresh_early(0.001, now + 10 ** 6, now=now)
+    assert not should_refresh_early(0.01, now - 1, beta=0, now=now)
+
+
+def test_get_current_user_loads_once_for_concurrent_misses():
+    auth = Auth()
+    auth.r_cashe = LocalRedis()
+    auth.user_loads = SingleFlight('user')
+    token = asyncio.run(auth.create_access_token({'sub': 'olena@ukr.net'}))
+    calls = []
+
+    async def get_user_by_email(email, db):
+        calls.append(email)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(email=email)
+
+    async def run():
+        return await asyncio.gather(*(auth.get_current_user(token, None) for _ in range(20)))
+
+    with patch('src.services.auth.repository_auth.get_user_by_email', get_user_by_email):
+        users = asyncio.run(run())
+        assert len(calls) == 1
+        assert {user.email for user in users} == {'olena@ukr.net'}
+        asyncio.run(auth.get_current_user(token, None))
+        assert len(calls) == 1
+
+
+def test_shared_user_load_outlives_the_first_session(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/users.db')
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(User(username='olena', email='olena@ukr.net', password='x'))
+        db.commit()
+    auth = Auth()
+    auth.r_cashe = LocalRedis()
+    auth.user_loads = SingleFlight('user')
+    token = asyncio.run(auth.create_access_token({'sub': 'olena@ukr.net'}))
+
+    async def request(db):
+        try:
+            return await auth.get_current_user(token, db)
+        finally:
+            # what get_db does when the request ends
+            db.close()
+
+    async def run():
+        return await asyncio.gather(*(request(sessions()) for _ in range(5)))
+
+    users = asyncio.run(run())
+    assert len({id(user) for user in users}) == 5
+    assert {user.id for user in users} == {1}
+    engine.dispose()
@@ -0,0 +1,34 @@
+import sys
+import base64
+from datetime import datetime, timedelta
+from pathlib import Path
+
+path_root = Path(__file__).parent.parent
+sys.path.append(str(path_root))
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.sync import decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip():
+    updated_at = datetime.utcnow().replace(microsecond=123456)
+    assert decode_cursor(encode_cursor(updated_at, 42)) == (updated_at, 42)
+
+
+def test_expired_cursor():
+    with pytest.raises(HTTPException) as err:
+        decode_cursor(encode_cursor(datetime.utcnow() - timedelta(days=365), 1))
+    assert err.value.status_code == 410
+
+
+def test_cursor_of_an_idle_account():
+    last_change = datetime.utcnow() - timedelta(days=365)
+    assert decode_cursor(encode_cursor(last_change, 7, datetime.utcnow())) == (last_change, 7)
+
+
+def test_cursor_without_sync_time():
+    updated_at = datetime.utcnow().replace(microsecond=0)
+    cursor = base64.urlsafe_b64encode(f'{updated_at.isoformat()}|3'.encode()).decode()
+    assert decode_cursor(cursor) == (updated_at, 3)